@@ -1,62 +1,477 @@
-from typing import List, Optional
+from typing import List, Literal, Optional, Tuple
+from contextlib import asynccontextmanager, nullcontext
+from datetime import date
+import asyncio
+import hashlib
+import hmac
 import json
-import contextlib
-import io
+import logging
 import os
+import time
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
+from starlette.routing import Match
 import uvicorn
 from dotenv import load_dotenv
 
-from src.data_loader import load_all_content
-from src.recommender import Recommender
+from src.blurbs import Blurbs, BlurbStore, compose_paragraph
+from src.candidate_cache import CandidateCache
+from src.catalog import ItemFilter, date_to_days
+from src.catalog_store import CatalogStore
+from src.catalog_updates import parse_update
+from src.data_loader import DOMAIN_SCHEMAS
+from src.serving import ScoringBatcher, ScoringPool, default_workers, prepare_shared_catalog
+from src.recommender import Recommender, diverse_order, rerank_diverse
+from src.title_index import normalize_title
 from src.user_porfile import (
     create_multi_domain_user_profile,
-    get_user_liked_summary_multi,
+    summarize_liked_multi,
 )
-from src.llm_justifier import LLMJustifier
+from src.json_response import RawJSONResponse, dumps, json_array, json_object
+from src.llm_justifier import PARAGRAPH_ERROR, AsyncLLMJustifier, StreamInterrupted
+from src.llm_cache import LLMCache
+from src.metrics import REGISTRY, REQUEST_SECONDS, Gauge, collect_stages, timed
+from src.request_log import RequestLogger
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() not in ("0", "false", "no")
 
 
 DEFAULT_LIKED = ["Inception", "Echoes of Time", "Aurora Skies - Celestial Nights Tour"]
-DATA_DIR = "Data"
+DATA_DIR = os.getenv("DATA_DIR", "Data")
 IMAGE_URL = "https://audienceview.com/wp-content/uploads/sites/2/2023/07/82409324_10156870761928715_3719706415825158144_n.webp"
 
 
-app = FastAPI(title="AudienceView Recommender API", version="0.1.0")
+CATALOG_POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", "2"))
+CATALOG_SNAPSHOT = os.getenv("CATALOG_SNAPSHOT") or None
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB") or None
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BUDGET_MS = int(os.getenv("LLM_BUDGET_MS", "2500"))
+LLM_PROMPT_TOKENS = int(os.getenv("LLM_PROMPT_TOKENS", "2000"))
+TITLE_MATCH_THRESHOLD = float(os.getenv("TITLE_MATCH_THRESHOLD", "0.45"))
+SEMANTIC_ENGINE = _env_flag("SEMANTIC_ENGINE", "0")
+EMBEDDINGS_DIR = os.getenv("EMBEDDINGS_DIR") or None
+CATALOG_UPDATES_DIR = os.getenv("CATALOG_UPDATES_DIR") or None
+CATALOG_UPDATE_TOKEN = os.getenv("CATALOG_UPDATE_TOKEN") or None
+SCORING_PROCESSES = int(os.getenv("SCORING_PROCESSES", "0"))
+SCORING_BATCH_WINDOW_MS = float(os.getenv("SCORING_BATCH_WINDOW_MS", "0"))
+SCORING_BATCH_MAX = int(os.getenv("SCORING_BATCH_MAX", "32"))
+CANDIDATE_CACHE_SIZE = int(os.getenv("CANDIDATE_CACHE_SIZE", "4096"))
+CANDIDATE_WARM_TOP_K = int(os.getenv("CANDIDATE_WARM_TOP_K", "0"))
+CANDIDATE_WARM_SECONDS = float(os.getenv("CANDIDATE_WARM_SECONDS", "30"))
+BATCH_MAX_USERS = int(os.getenv("BATCH_MAX_USERS", "10000"))
+BATCH_LLM_GROUP_SIZE = int(os.getenv("BATCH_LLM_GROUP_SIZE", "8"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+REQUEST_LOG_DIR = os.getenv("REQUEST_LOG_DIR") or None
+REQUEST_LOG_SAMPLE = float(os.getenv("REQUEST_LOG_SAMPLE", "1.0"))
+REQUEST_LOG_MAX_MB = float(os.getenv("REQUEST_LOG_MAX_MB", "64"))
+REQUEST_LOG_BACKUPS = int(os.getenv("REQUEST_LOG_BACKUPS", "10"))
+BLURBS_DB = os.getenv("BLURBS_DB") or None
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "60"))
+# Sólo se registra el tráfico de recomendación (no /metrics, /health ni las actualizaciones)
+REQUEST_LOG_PATHS = ("/recommendations", "/titles")
+REQUEST_LOG_MAX_BODY = 1 << 20
+# GET con ETag/Cache-Control cuando la respuesta sólo depende del catálogo y de la query
+# (sin LLM, ver `_deterministic`)
+HTTP_CACHE_ROUTES = {"/recommendations/json", "/recommendations/text", "/recommendations/movies",
+                     "/recommendations/{content_type}", "/titles/autocomplete"}
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger("api")
+# httpx registra cada llamada al LLM en INFO
+logging.getLogger("httpx").setLevel(max(logging.WARNING, logging.getLogger().level))
+
+
+def _register_gauges(store: CatalogStore, cache: LLMCache, candidates: CandidateCache,
+                     request_log: Optional[RequestLogger], blurbs: Optional[Blurbs]):
+    """Métricas que se leen del estado vigente al exponer /metrics."""
+    if blurbs is not None:
+        REGISTRY.register(Gauge("recommender_blurbs_items", "Blurbs precalculados por item", lambda: len(blurbs.items)))
+        REGISTRY.register(Gauge("recommender_blurbs_genres", "Blurbs precalculados por género",
+                                lambda: len(blurbs.genres)))
+    if request_log is not None:
+        REGISTRY.register(Gauge("recommender_request_log_written", "Peticiones escritas en el log de peticiones",
+                                lambda: request_log.written))
+        REGISTRY.register(Gauge("recommender_request_log_dropped", "Peticiones descartadas por el log de peticiones",
+                                lambda: request_log.dropped))
+    for gauge in (
+        Gauge("recommender_candidate_cache_hits", "Aciertos de la caché de candidatos", lambda: candidates.hits),
+        Gauge("recommender_candidate_cache_misses", "Fallos de la caché de candidatos", lambda: candidates.misses),
+        Gauge("recommender_candidate_cache_entries", "Perfiles en la caché de candidatos", lambda: len(candidates)),
+        Gauge("recommender_llm_cache_hits", "Aciertos de la caché del LLM", lambda: cache.hits),
+        Gauge("recommender_llm_cache_misses", "Fallos de la caché del LLM", lambda: cache.misses),
+        Gauge("recommender_llm_cache_hit_ratio", "Ratio de aciertos de la caché del LLM",
+              lambda: cache.hits / (cache.hits + cache.misses) if cache.hits + cache.misses else 0.0),
+        Gauge("recommender_catalog_version", "Versión del snapshot de catálogo vigente",
+              lambda: store.current().version),
+        Gauge("recommender_catalog_items", "Items vivos en el catálogo vigente",
+              lambda: store.current().catalog.live_count),
+    ):
+        REGISTRY.register(gauge)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # El catálogo se construye una sola vez y se comparte entre peticiones
+    store = CatalogStore(DATA_DIR, poll_interval=CATALOG_POLL_SECONDS, snapshot_path=CATALOG_SNAPSHOT,
+                         image_url=IMAGE_URL, title_match_threshold=TITLE_MATCH_THRESHOLD,
+                         semantic=SEMANTIC_ENGINE, embeddings_path=EMBEDDINGS_DIR,
+                         updates_dir=CATALOG_UPDATES_DIR)
+    await asyncio.to_thread(store.load)
+    app.state.catalog_store = store
+    app.state.llm_cache = LLMCache(max_entries=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, db_path=LLM_CACHE_DB)
+    app.state.candidate_cache = CandidateCache(max_entries=CANDIDATE_CACHE_SIZE)
+    # Un único cliente asíncrono (pool HTTP con keep-alive) para toda la app
+    try:
+        app.state.justifier = AsyncLLMJustifier(
+            cache=app.state.llm_cache,
+            timeout=LLM_TIMEOUT,
+            max_concurrency=LLM_MAX_CONCURRENCY,
+            max_retries=LLM_MAX_RETRIES,
+            prompt_budget=LLM_PROMPT_TOKENS or None,
+        )
+    except ValueError as e:
+        logger.warning("LLM no disponible: %s", e)
+        app.state.justifier = None
+    # Puntuación en procesos aparte (requiere CATALOG_SNAPSHOT para compartir el catálogo)
+    app.state.scoring_pool = ScoringPool(SCORING_PROCESSES) if SCORING_PROCESSES > 0 and CATALOG_SNAPSHOT else None
+    # Micro-batching de la puntuación en este proceso (si no hay pool)
+    app.state.scoring_batcher = (ScoringBatcher(SCORING_BATCH_WINDOW_MS, SCORING_BATCH_MAX)
+                                 if SCORING_BATCH_WINDOW_MS > 0 else None)
+    app.state.request_log = (RequestLogger(REQUEST_LOG_DIR, sample_rate=REQUEST_LOG_SAMPLE,
+                                           max_bytes=int(REQUEST_LOG_MAX_MB * (1 << 20)), backups=REQUEST_LOG_BACKUPS)
+                             if REQUEST_LOG_DIR else None)
+    # Blurbs generados offline (python -m src.blurbs) para el párrafo sin LLM
+    app.state.blurbs = await asyncio.to_thread(BlurbStore.read, BLURBS_DB) if BLURBS_DB else None
+    if app.state.blurbs is not None:
+        logger.info("Blurbs cargados: %d items, %d géneros", len(app.state.blurbs.items), len(app.state.blurbs.genres))
+    # Lo que, además del catálogo y la query, determina las respuestas cacheables
+    app.state.etag_salt = "|".join([app.version, IMAGE_URL, str(os.path.getmtime(BLURBS_DB)) if BLURBS_DB else ""])
+    _register_gauges(store, app.state.llm_cache, app.state.candidate_cache, app.state.request_log, app.state.blurbs)
+    tasks = [asyncio.create_task(store.watch())]
+    if app.state.request_log is not None:
+        tasks.append(asyncio.create_task(app.state.request_log.run()))
+    if CANDIDATE_WARM_TOP_K > 0 and CANDIDATE_CACHE_SIZE > 0:
+        tasks.append(asyncio.create_task(_warm_candidates(CANDIDATE_WARM_TOP_K, CANDIDATE_WARM_SECONDS)))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Espera a las tareas para que el log de peticiones vuelque lo pendiente
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if app.state.scoring_pool is not None:
+            app.state.scoring_pool.shutdown()
+        if app.state.scoring_batcher is not None:
+            app.state.scoring_batcher.shutdown()
+        if app.state.justifier is not None:
+            await app.state.justifier.aclose()
+
+
+app = FastAPI(title="AudienceView Recommender API", version="0.1.0", lifespan=lifespan)
+
+
+async def _request_json(request: Request):
+    """Cuerpo JSON de la petición para el log (None si es grande o no es JSON)."""
+    try:
+        body = await request.body()
+        return json.loads(body) if body and len(body) <= REQUEST_LOG_MAX_BODY else None
+    except ValueError:
+        return None
+
+
+def _etag(request: Request, route: str) -> str:
+    """
+    ETag débil a partir del contenido del catálogo vigente, la ruta y la query
+    normalizada: parámetros ordenados y `liked_titles` normalizados, sin orden
+    ni duplicados (como la caché de candidatos). Sólo se usa en respuestas
+    deterministas (ver `_deterministic`).
+    """
+    snapshot = app.state.catalog_store.current()
+    parts = [snapshot.tag, app.state.etag_salt, route, request.url.path]
+    for key, value in sorted(request.query_params.multi_items(), key=lambda kv: kv[0]):
+        if key == "liked_titles":
+            value = ",".join(sorted({normalize_title(t) for t in value.split(",") if t.strip()}))
+        parts.append(f"{key}={value}")
+    digest = hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()[:24]
+    return f'W/"{digest}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # Comparación débil: se ignora el prefijo W/
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+def _deterministic(request: Request, route: str) -> bool:
+    """
+    Si la respuesta sólo depende del catálogo y de la query: el autocompletado
+    siempre; las recomendaciones sólo sin LLM, es decir con mode=fast o, en
+    /recommendations/text, con blurbs cargados y sin `mode` (ver `_use_blurbs`).
+    """
+    if route == "/titles/autocomplete":
+        return True
+    mode = request.query_params.get("mode")
+    if route == "/recommendations/text":
+        return mode == "fast" or (mode is None and app.state.blurbs is not None)
+    return mode == "fast"
+
+
+def _match_route(scope) -> Optional[str]:
+    for route in app.router.routes:
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            scope.update(child_scope)
+            return route.path
+    return None
+
+
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    """
+    ETag y Cache-Control en los GET deterministas de HTTP_CACHE_ROUTES; con `If-None-Match` coincidente, 304.
+    Las respuestas del LLM se marcan `no-store` y no se tocan las que ya traen su propio Cache-Control.
+    """
+    if request.method != "GET" or not request.url.path.startswith(REQUEST_LOG_PATHS):
+        return await call_next(request)
+    route = _match_route(request.scope)
+    if route not in HTTP_CACHE_ROUTES:
+        return await call_next(request)
+    if not _deterministic(request, route):
+        response = await call_next(request)
+        response.headers.setdefault("Cache-Control", "no-store")
+        return response
+    etag = _etag(request, route)
+    cache_control = f"public, max-age={HTTP_CACHE_MAX_AGE}"
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    response = await call_next(request)
+    if response.status_code == 200 and "cache-control" not in response.headers:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = cache_control
+    return response
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    request_log = getattr(app.state, "request_log", None)
+    if request_log is not None and not (request.url.path.startswith(REQUEST_LOG_PATHS) and request_log.sampled()):
+        request_log = None
+    if request_log is not None:
+        started_at = time.time()
+        body = await _request_json(request) if request.method == "POST" else None
+    try:
+        with collect_stages() if request_log is not None else nullcontext() as stages:
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        # Se etiqueta con la plantilla de ruta para no crear una serie por URL
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        REQUEST_SECONDS.observe(elapsed, route, str(status))
+        if request_log is not None:
+            # Con respuestas en streaming la duración llega hasta el inicio del cuerpo
+            request_log.log({
+                "ts": round(started_at, 6), "method": request.method, "path": request.url.path, "route": route,
+                "query": request.url.query, "body": body, "status": status,
+                "duration_ms": round(elapsed * 1000, 3),
+                "stages": {stage: round(seconds * 1000, 3) for stage, seconds in stages.items()},
+            })
 
 
 class RecommendRequest(BaseModel):
     liked_titles: Optional[List[str]] = None
     top_n: int = 3
     top_candidates: int = 10
+    # 'llm': el LLM elige entre los candidatos; 'fast': selección local sin LLM
+    # (en /recommendations/text, párrafo compuesto desde los blurbs precalculados)
+    mode: Literal["llm", "fast"] = "llm"
+    # Presupuesto de latencia del LLM; al agotarse se responde con la selección local
+    budget_ms: Optional[int] = None
+    # 'tags': solapamiento de géneros/keywords; 'semantic': embeddings + índice IVF
+    engine: Literal["tags", "semantic"] = "tags"
+
+
+async def _build_candidates(liked_titles: List[str], top_candidates: int, engine: str = "tags",
+                            item_filter: Optional[ItemFilter] = None):
+    with timed("catalog"):
+        snapshot = app.state.catalog_store.current()
+
+    cache = app.state.candidate_cache
+    if cache.max_entries <= 0:
+        return await _compute_candidates(snapshot, liked_titles, top_candidates, engine, item_filter)
+    key = CandidateCache.make_key(liked_titles, top_candidates, engine, item_filter)
+    cached = cache.get(snapshot.version, key)
+    if cached is not None:
+        return cached
+    result = await _compute_candidates(snapshot, liked_titles, top_candidates, engine, item_filter)
+    cache.put(snapshot.version, key, result)
+    return result
+
+
+async def _compute_candidates(snapshot, liked_titles: List[str], top_candidates: int, engine: str,
+                              item_filter: Optional[ItemFilter] = None):
+    catalog = snapshot.catalog
+    with timed("resolve"):
+        liked_indices = snapshot.title_index.resolve(liked_titles)
+    with timed("profile"):
+        user_profile = create_multi_domain_user_profile(liked_indices, catalog)
+        user_summary = summarize_liked_multi(liked_indices, catalog)
+
+    pool = app.state.scoring_pool
+    batcher = app.state.scoring_batcher
+    with timed("scoring"):
+        if engine == "semantic":
+            if snapshot.semantic is None:
+                raise HTTPException(status_code=503, detail="Motor semántico no habilitado (SEMANTIC_ENGINE=0)")
+            candidates_df = snapshot.semantic.recommend(liked_indices, user_profile, top_n=top_candidates,
+                                                        item_filter=item_filter)
+        elif pool is not None and pool.accepts(snapshot):
+            positions, scores = await pool.rank(snapshot, liked_indices, user_profile, top_candidates, item_filter)
+            candidates_df = snapshot.recommender.to_frame(positions, scores)
+        elif batcher is not None:
+            positions, scores = await batcher.rank(snapshot.recommender, liked_indices, user_profile, top_candidates,
+                                                   item_filter)
+            candidates_df = snapshot.recommender.to_frame(positions, scores)
+        else:
+            candidates_df = snapshot.recommender.recommend(liked_indices, user_profile, top_n=top_candidates,
+                                                           item_filter=item_filter)
+    return snapshot, candidates_df, user_summary, liked_indices
+
+
+async def _warm_candidates(top_k: int, interval: float):
+    """
+    Precalienta la caché de candidatos con los `top_k` perfiles más pedidos
+    (el perfil por defecto cuenta desde el arranque). Tras una recarga o una
+    actualización del catálogo vuelve a calcularlos para la versión nueva.
+    """
+    cache = app.state.candidate_cache
+    cache.seed(CandidateCache.make_key(DEFAULT_LIKED, RecommendRequest().top_candidates, "tags"))
+    while True:
+        snapshot = app.state.catalog_store.current()
+        warmed = 0
+        for key in cache.hot(top_k):
+            if cache.get(snapshot.version, key, record=False) is not None:
+                continue
+            titles, top_candidates, engine, item_filter = key
+            try:
+                result = await _compute_candidates(snapshot, list(titles), top_candidates, engine, item_filter)
+            except HTTPException:
+                continue
+            cache.put(snapshot.version, key, result)
+            warmed += 1
+            # Cede el event loop entre perfiles para no retrasar peticiones
+            await asyncio.sleep(0)
+        if warmed:
+            logger.info("Caché de candidatos precalentada: %d perfiles (versión %d)", warmed, snapshot.version)
+        await asyncio.sleep(interval)
+
+
+def _get_justifier() -> AsyncLLMJustifier:
+    justifier = app.state.justifier
+    if justifier is None:
+        raise HTTPException(status_code=503, detail="LLM no configurado (falta OPENAI_API_KEY)")
+    return justifier
+
+
+def _format_recommendations(snapshot, positions) -> List[bytes]:
+    """Payloads de los items ya serializados (una vez por item y versión del snapshot)."""
+    return [snapshot.title_index.payload_json(pos) for pos in positions]
+
+
+def _recommendations_response(recommendations: List[bytes], cacheable: bool = True) -> RawJSONResponse:
+    """`{"recommendations": [...]}` concatenando los fragmentos JSON de cada item."""
+    headers = None if cacheable else {"Cache-Control": "no-store"}
+    return RawJSONResponse(json_object(recommendations=json_array(recommendations)), headers=headers)
+
+
+def _paragraph_response(paragraph: str, cacheable: bool = True) -> RawJSONResponse:
+    headers = None if cacheable else {"Cache-Control": "no-store"}
+    return RawJSONResponse(dumps({"paragraph": paragraph}), headers=headers)
+
+
+async def _select_recommendations(snapshot, candidates_df, user_summary,
+                                  req: RecommendRequest) -> Tuple[List[bytes], bool]:
+    """
+    Elige `top_n` candidatos. En modo 'fast' (o si el LLM no responde dentro del
+    presupuesto) se usa la selección local diversificada por tipo de contenido.
+    Devuelve también si la respuesta es la definitiva para esta petición: no lo
+    es cuando se recurre a la local porque el LLM falló o no llegó a tiempo.
+    """
+    local = rerank_diverse(candidates_df, req.top_n)
+    if req.mode == "fast":
+        return _format_recommendations(snapshot, local.index), True
+
+    justifier = _get_justifier()
+    budget_ms = req.budget_ms if req.budget_ms is not None else LLM_BUDGET_MS
+    # La llamada sigue en segundo plano al agotar el presupuesto y calienta la caché
+    llm_task = asyncio.ensure_future(justifier.recommend_json(candidates_df, user_summary, top_n=req.top_n,
+                                                             fragments=snapshot.fragments))
+    try:
+        llm_json = await asyncio.wait_for(asyncio.shield(llm_task), timeout=budget_ms / 1000 if budget_ms > 0 else None)
+    except asyncio.TimeoutError:
+        return _format_recommendations(snapshot, local.index), False
+    parsed = json.loads(llm_json)
 
+    # parsed is expected to be {"recommendations": [{"id":.., "title":.., "content_type":..}, ...]}
+    recs = parsed.get("recommendations") if isinstance(parsed, dict) else parsed
+    if not recs:
+        # fallback a la selección local
+        return _format_recommendations(snapshot, local.index), False
 
-def _build_candidates(liked_titles: List[str], top_candidates: int):
-    # Silenciar prints internos del pipeline
-    silent_buffer = io.StringIO()
-    with contextlib.redirect_stdout(silent_buffer):
-        catalog_df = load_all_content(DATA_DIR)
-
-        liked_indices = catalog_df[catalog_df['title'].isin(liked_titles)].index.tolist()
-        user_profile = create_multi_domain_user_profile(liked_indices, catalog_df)
-        user_summary = get_user_liked_summary_multi(liked_indices, catalog_df)
+    with timed("mapping"):
+        return _map_llm_recommendations(snapshot, candidates_df, recs), True
 
-        recommender = Recommender()
-        recommender.load(catalog_df)
-        candidates_df = recommender.recommend(liked_indices, user_profile, top_n=top_candidates)
-    return catalog_df, candidates_df, user_summary, liked_indices
 
+def _map_llm_recommendations(snapshot, candidates_df, recs) -> List[bytes]:
+    # map ids/titles from LLM output to candidate rows via the catalog hash indexes
+    title_index = snapshot.title_index
+    positions = candidates_df.index.tolist()
+    candidate_set = set(positions)
+    by_id = {}
+    by_title = {}
+    for pos, item_id in zip(positions, candidates_df['id'].tolist()):
+        by_id.setdefault(item_id, pos)
+        by_title.setdefault(normalize_title(title_index.payload(pos)["name"]), pos)
 
-def _format_recommendations_from_df(df):
-    out = []
-    for _, row in df.iterrows():
-        out.append({
-            "name": row.get("title"),
-            "description": row.get("description") or row.get("overview") or "",
-            "image": IMAGE_URL,
-        })
-    return out
+    mapped = []
+    for r in recs:
+        if not isinstance(r, dict):
+            continue
+        pos = None
+        # try by (content_type, id) first, then id, then title
+        if r.get("id") is not None:
+            if r.get("content_type"):
+                pos = title_index.lookup(r.get("content_type"), r.get("id"))
+                if pos not in candidate_set:
+                    pos = None
+            if pos is None:
+                pos = by_id.get(r.get("id"))
+        if pos is None:
+            pos = by_title.get(normalize_title(r.get("title")))
+        if pos is not None:
+            mapped.append(title_index.payload_json(pos))
+        else:
+            # fallback to minimal
+            mapped.append(dumps({
+                "name": r.get('title') or r.get('name'),
+                "description": "",
+                "image": IMAGE_URL,
+            }))
+    return mapped
 
 
 @app.get("/health")
@@ -64,120 +479,373 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métricas en formato de texto de Prometheus (latencias por etapa, caché, tokens del LLM)."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+class CatalogUpdatesRequest(BaseModel):
+    updates: List[dict]
+
+
+@app.post("/catalog/updates")
+async def catalog_updates(req: CatalogUpdatesRequest, x_update_token: Optional[str] = Header(None)):
+    """
+    Upserts y bajas de items individuales, aplicados sin reconstruir el catálogo.
+    Cerrado por defecto: sin CATALOG_UPDATE_TOKEN configurado responde 403.
+    """
+    if not CATALOG_UPDATE_TOKEN:
+        raise HTTPException(status_code=403, detail="Actualizaciones deshabilitadas (falta CATALOG_UPDATE_TOKEN)")
+    if not hmac.compare_digest((x_update_token or "").encode("utf-8"), CATALOG_UPDATE_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Token de actualización inválido")
+    try:
+        updates = [parse_update(u) for u in req.updates]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    snapshot = await asyncio.to_thread(app.state.catalog_store.apply_updates, updates)
+    return {"applied": len(updates), "version": snapshot.version, "items": snapshot.catalog.live_count}
+
+
+@app.get("/titles/autocomplete")
+async def titles_autocomplete(q: str, limit: int = 10):
+    """Sugerencias de títulos por prefijo de palabra y, si faltan, por similitud de trigramas."""
+    snapshot = app.state.catalog_store.current()
+    catalog = snapshot.catalog
+    limit = max(1, min(limit, 50))
+    return RawJSONResponse(dumps({"suggestions": [
+        {"title": catalog.titles[pos], "content_type": catalog.content_type(pos), "id": int(catalog.ids[pos])}
+        for pos in snapshot.title_index.autocomplete(q, limit=limit)
+    ]}))
+
 
 @app.post("/recommendations/json")
 async def recommendations_json(req: RecommendRequest):
     liked = req.liked_titles or DEFAULT_LIKED
-    catalog_df, candidates_df, user_summary, _ = _build_candidates(liked, req.top_candidates)
-    if catalog_df is None or candidates_df is None or candidates_df.empty:
-        return {"recommendations": []}
+    snapshot, candidates_df, user_summary, _ = await _build_candidates(liked, req.top_candidates, req.engine)
+    if snapshot is None or candidates_df is None or candidates_df.empty:
+        return _recommendations_response([])
 
-    justifier = LLMJustifier()
-    llm_json = justifier.recommend_json(candidates_df, user_summary, top_n=req.top_n)
-    parsed = json.loads(llm_json)
+    return _recommendations_response(*await _select_recommendations(snapshot, candidates_df, user_summary, req))
 
-    # parsed is expected to be {"recommendations": [{"id":.., "title":.., "content_type":..}, ...]}
-    recs = parsed.get("recommendations") if isinstance(parsed, dict) else parsed
-    if not recs:
-        # fallback to top rows
-        return {"recommendations": _format_recommendations_from_df(candidates_df.head(req.top_n))}
 
-    # map ids/titles from LLM output to full rows when possible
-    mapped = []
-    for r in recs:
-        # try by id first
-        if isinstance(r, dict) and r.get("id") is not None:
-            row = candidates_df[candidates_df['id'] == r.get('id')]
-        else:
-            row = candidates_df[candidates_df['title'] == r.get('title')]
-        if not row.empty:
-            mapped.extend(_format_recommendations_from_df(row.head(1)))
-        else:
-            # fallback to minimal
-            mapped.append({
-                "name": r.get('title') or r.get('name'),
-                "description": "",
-                "image": IMAGE_URL,
-            })
+def _use_blurbs(req: RecommendRequest) -> bool:
+    """
+    El párrafo se compone con plantillas (sin LLM) en modo 'fast' o, si hay
+    blurbs cargados (BLURBS_DB), siempre que no se pida mode='llm' explícitamente.
+    """
+    return req.mode == "fast" or (app.state.blurbs is not None and "mode" not in req.model_fields_set)
 
-    return {"recommendations": mapped}
+
+def _compose_paragraph(candidates_df, user_summary, top_n: int) -> str:
+    with timed("compose"):
+        return compose_paragraph(candidates_df, user_summary, top_n=top_n, blurbs=app.state.blurbs)
 
 
 @app.post("/recommendations/text")
 async def recommendations_text(req: RecommendRequest):
     liked = req.liked_titles or DEFAULT_LIKED
-    catalog_df, candidates_df, user_summary, _ = _build_candidates(liked, req.top_candidates)
-    if catalog_df is None or candidates_df is None or candidates_df.empty:
-        return {"paragraph": "No se encontraron recomendaciones."}
+    snapshot, candidates_df, user_summary, _ = await _build_candidates(liked, req.top_candidates, req.engine)
+    if snapshot is None or candidates_df is None or candidates_df.empty:
+        return _paragraph_response("No se encontraron recomendaciones.")
+    if _use_blurbs(req):
+        return _paragraph_response(_compose_paragraph(candidates_df, user_summary, req.top_n))
+
+    justifier = _get_justifier()
+    paragraph = await justifier.recommend_paragraph(candidates_df, user_summary, top_n=req.top_n,
+                                                    fragments=snapshot.fragments)
+    return _paragraph_response(paragraph, cacheable=paragraph != PARAGRAPH_ERROR)
+
+
+
+def _sse(event: Optional[str], payload: dict) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
 
-    justifier = LLMJustifier()
-    paragraph = justifier.recommend_paragraph(candidates_df, user_summary, top_n=req.top_n)
-    return {"paragraph": paragraph}
+async def _paragraph_events(justifier, candidates_df, user_summary, top_n, fragments=None):
+    try:
+        async for token in justifier.stream_paragraph(candidates_df, user_summary, top_n=top_n, fragments=fragments):
+            yield _sse(None, {"token": token})
+    except StreamInterrupted:
+        # El cliente ya recibió parte del párrafo: se avisa en lugar de cerrarlo como completo
+        yield _sse("error", {"detail": PARAGRAPH_ERROR})
+        return
+    yield _sse("done", {})
 
 
+async def _single_event(paragraph: str):
+    """Párrafo ya completo (sin LLM) como un único evento."""
+    yield _sse(None, {"token": paragraph})
+    yield _sse("done", {})
+
+
+@app.post("/recommendations/text/stream")
+async def recommendations_text_stream(req: RecommendRequest):
+    """Variante de /recommendations/text que emite el párrafo como Server-Sent Events."""
+    liked = req.liked_titles or DEFAULT_LIKED
+    snapshot, candidates_df, user_summary, _ = await _build_candidates(liked, req.top_candidates, req.engine)
+    if snapshot is None or candidates_df is None or candidates_df.empty:
+        events = _single_event("No se encontraron recomendaciones.")
+    elif _use_blurbs(req):
+        events = _single_event(_compose_paragraph(candidates_df, user_summary, req.top_n))
+    else:
+        events = _paragraph_events(_get_justifier(), candidates_df, user_summary, req.top_n, snapshot.fragments)
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class BatchUser(BaseModel):
+    user_id: Optional[str] = None
+    liked_titles: List[str]
+
+
+class BatchRecommendRequest(BaseModel):
+    users: List[BatchUser]
+    top_n: int = 3
+    top_candidates: int = 10
+    # En lote el LLM es opcional: 'fast' selecciona en local
+    mode: Literal["llm", "fast"] = "fast"
+    engine: Literal["tags", "semantic"] = "tags"
+    # Usuarios por llamada al LLM (por defecto BATCH_LLM_GROUP_SIZE)
+    llm_group_size: Optional[int] = None
+
+
+def _score_batch(snapshot, liked_lists: List[List[int]], top_candidates: int, engine: str, frames: bool):
+    """
+    Candidatos de varios usuarios como listas (posiciones, scores): un producto
+    disperso por bloque con 'tags', uno a uno con 'semantic'. Con `frames` se
+    construyen además los DataFrames que necesitan los prompts del LLM.
+    """
+    with timed("batch_scoring"):
+        if engine == "semantic":
+            dfs = [snapshot.semantic.recommend(liked, None, top_n=top_candidates) for liked in liked_lists]
+            ranked = [(df.index.tolist(), df['score'].tolist()) if not df.empty else ([], []) for df in dfs]
+            return ranked, dfs
+        recommender = snapshot.recommender
+        ranked = []
+        for positions, scores in recommender.top_n_batch(liked_lists, top_candidates):
+            keep = positions >= 0
+            ranked.append((positions[keep].tolist(), scores[keep].tolist()))
+        dfs = [recommender.to_frame(positions, scores) for positions, scores in ranked] if frames else None
+        return ranked, dfs
+
+
+def _local_selection(snapshot, positions: List[int], scores: list, top_n: int) -> list:
+    """Como `rerank_diverse` pero sobre listas: evita un DataFrame por usuario en modo 'fast'."""
+    types = [snapshot.catalog.content_type(pos) for pos in positions]
+    return _format_recommendations(snapshot, [positions[k] for k in diverse_order(scores, types, top_n)])
+
+
+def _batch_line(i: int, user: BatchUser, recommendations: List[bytes], source: str) -> bytes:
+    return json_object(index=dumps(i), user_id=dumps(user.user_id), source=dumps(source),
+                       recommendations=json_array(recommendations)) + b"\n"
+
+
+async def _batch_results(snapshot, req: BatchRecommendRequest):
+    """
+    Produce una línea NDJSON por usuario según van terminando. La puntuación
+    avanza por bloques en un hilo mientras las llamadas agrupadas al LLM
+    (acotadas por BATCH_LLM_CONCURRENCY) se resuelven en paralelo, así que el
+    orden de salida no es el de entrada: cada línea lleva su `index`.
+    """
+    catalog = snapshot.catalog
+    title_index = snapshot.title_index
+    justifier = _get_justifier() if req.mode == "llm" else None
+    group_size = max(1, req.llm_group_size or BATCH_LLM_GROUP_SIZE)
+    chunk = max(1, Recommender.BATCH_CELLS // max(1, len(catalog)))
+    queue: asyncio.Queue = asyncio.Queue()
+    llm_slots = asyncio.Semaphore(max(1, BATCH_LLM_CONCURRENCY))
+
+    async def select_group(group):
+        # group: [(i, candidates_df, liked), ...]
+        try:
+            entries = [(str(i), summarize_liked_multi(liked, catalog), candidates_df)
+                       for i, candidates_df, liked in group]
+            try:
+                selected = await justifier.recommend_json_batch(entries, top_n=req.top_n, fragments=snapshot.fragments)
+            except Exception as e:
+                logger.warning("Selección por lotes del LLM fallida, se usa la local: %r", e)
+                selected = {}
+            for i, candidates_df, _ in group:
+                recs = selected.get(str(i))
+                mapped = _map_llm_recommendations(snapshot, candidates_df, recs) if recs else []
+                if mapped:
+                    queue.put_nowait(_batch_line(i, req.users[i], mapped, "llm"))
+                else:
+                    local = rerank_diverse(candidates_df, req.top_n)
+                    queue.put_nowait(_batch_line(i, req.users[i], _format_recommendations(snapshot, local.index), "local"))
+        finally:
+            llm_slots.release()
+
+    async def produce():
+        tasks = []
+        try:
+            for start in range(0, len(req.users), chunk):
+                users = req.users[start:start + chunk]
+                liked_lists = [title_index.resolve(u.liked_titles) for u in users]
+                ranked, frames = await asyncio.to_thread(_score_batch, snapshot, liked_lists, req.top_candidates,
+                                                         req.engine, justifier is not None)
+                group = []
+                for offset, ((positions, scores), liked) in enumerate(zip(ranked, liked_lists)):
+                    i = start + offset
+                    if not positions or justifier is None:
+                        queue.put_nowait(_batch_line(i, req.users[i], _local_selection(snapshot, positions, scores, req.top_n),
+                                                     "local"))
+                        continue
+                    group.append((i, frames[offset], liked))
+                    if len(group) == group_size:
+                        await llm_slots.acquire()
+                        tasks.append(asyncio.create_task(select_group(group)))
+                        group = []
+                if group:
+                    await llm_slots.acquire()
+                    tasks.append(asyncio.create_task(select_group(group)))
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            queue.put_nowait(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            line = await queue.get()
+            if line is None:
+                break
+            yield line
+        await producer
+    finally:
+        # Si el cliente se desconecta se cancela el trabajo pendiente
+        producer.cancel()
+
+
+@app.post("/recommendations/batch")
+async def recommendations_batch(req: BatchRecommendRequest):
+    """
+    Recomendaciones para muchos usuarios en una sola petición, como NDJSON (una
+    línea por usuario con `index`, `user_id`, `source` y `recommendations`).
+    """
+    if len(req.users) > BATCH_MAX_USERS:
+        raise HTTPException(status_code=413, detail=f"Máximo {BATCH_MAX_USERS} usuarios por lote")
+    snapshot = app.state.catalog_store.current()
+    if req.engine == "semantic" and snapshot.semantic is None:
+        raise HTTPException(status_code=503, detail="Motor semántico no habilitado (SEMANTIC_ENGINE=0)")
+    if req.mode == "llm":
+        _get_justifier()
+    return StreamingResponse(_batch_results(snapshot, req), media_type="application/x-ndjson",
+                             headers={"X-Accel-Buffering": "no"})
+
 
 @app.get("/recommendations/json")
-async def recommendations_json_get(liked_titles: Optional[str] = None, top_n: int = 3, top_candidates: int = 10):
+async def recommendations_json_get(liked_titles: Optional[str] = None, top_n: int = 3, top_candidates: int = 10,
+                                   mode: Literal["llm", "fast"] = "llm", budget_ms: Optional[int] = None,
+                                   engine: Literal["tags", "semantic"] = "tags"):
     """GET endpoint que acepta liked_titles coma-separadas"""
     liked = DEFAULT_LIKED
     if liked_titles:
         liked = [t.strip() for t in liked_titles.split(",") if t.strip()]
-    req = RecommendRequest(liked_titles=liked, top_n=top_n, top_candidates=top_candidates)
+    req = RecommendRequest(liked_titles=liked, top_n=top_n, top_candidates=top_candidates,
+                           mode=mode, budget_ms=budget_ms, engine=engine)
     return await recommendations_json(req)
 
 
 @app.get("/recommendations/text")
-async def recommendations_text_get(liked_titles: Optional[str] = None, top_n: int = 3, top_candidates: int = 10):
+async def recommendations_text_get(liked_titles: Optional[str] = None, top_n: int = 3, top_candidates: int = 10,
+                                   engine: Literal["tags", "semantic"] = "tags",
+                                   mode: Optional[Literal["llm", "fast"]] = None):
     """GET endpoint que acepta liked_titles coma-separadas"""
     liked = DEFAULT_LIKED
     if liked_titles:
         liked = [t.strip() for t in liked_titles.split(",") if t.strip()]
-    req = RecommendRequest(liked_titles=liked, top_n=top_n, top_candidates=top_candidates)
+    req = RecommendRequest(liked_titles=liked, top_n=top_n, top_candidates=top_candidates, engine=engine,
+                           **({"mode": mode} if mode else {}))
     return await recommendations_text(req)
 
 
-@app.post("/recommendations/movies")
-async def recommendations_movies(req: RecommendRequest):
+@app.get("/recommendations/text/stream")
+async def recommendations_text_stream_get(liked_titles: Optional[str] = None, top_n: int = 3, top_candidates: int = 10,
+                                          engine: Literal["tags", "semantic"] = "tags",
+                                          mode: Optional[Literal["llm", "fast"]] = None):
+    """GET endpoint que acepta liked_titles coma-separadas"""
+    liked = DEFAULT_LIKED
+    if liked_titles:
+        liked = [t.strip() for t in liked_titles.split(",") if t.strip()]
+    req = RecommendRequest(liked_titles=liked, top_n=top_n, top_candidates=top_candidates, engine=engine,
+                           **({"mode": mode} if mode else {}))
+    return await recommendations_text_stream(req)
+
+
+# Dominio por content_type o por nombre de su fichero de origen ('concert' o 'concerts')
+CONTENT_TYPES = {name: schema.content_type for schema in DOMAIN_SCHEMAS
+                 for name in (schema.content_type, schema.source)}
+
+
+class DomainRecommendRequest(RecommendRequest):
+    # Predicados que se evalúan al puntuar la partición del dominio
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    # Sólo items con entradas o stock (los que no tienen ese dato pasan)
+    available: bool = False
+
+
+def _item_filter(content_type: str, req: DomainRecommendRequest) -> ItemFilter:
+    resolved = CONTENT_TYPES.get(content_type)
+    if resolved is None:
+        raise HTTPException(status_code=404, detail=f"Tipo de contenido desconocido: {content_type}")
+    return ItemFilter(
+        content_type=resolved,
+        date_from=date_to_days(req.date_from) if req.date_from else None,
+        date_to=date_to_days(req.date_to) if req.date_to else None,
+        available=req.available,
+    )
+
+
+async def _recommend_domain(content_type: str, req: DomainRecommendRequest):
+    """
+    Recomendaciones de un solo dominio: el filtro se aplica al generar los
+    candidatos, así que `top_candidates` son todos de ese dominio y cumplen los
+    predicados (en lugar de puntuar el catálogo entero y filtrar después).
+    """
+    item_filter = _item_filter(content_type, req)
     liked = req.liked_titles or DEFAULT_LIKED
-    catalog_df, candidates_df, user_summary, _ = _build_candidates(liked, req.top_candidates)
-    # Filtrar solo movies
-    movie_candidates = candidates_df[candidates_df['content_type'] == 'movie']
+    snapshot, candidates_df, user_summary, _ = await _build_candidates(liked, req.top_candidates, req.engine,
+                                                                      item_filter)
+    if candidates_df is None or candidates_df.empty:
+        return _recommendations_response([])
 
-    if movie_candidates.empty:
-        return {"recommendations": []}
+    return _recommendations_response(*await _select_recommendations(snapshot, candidates_df, user_summary, req))
 
-    justifier = LLMJustifier()
-    llm_json = justifier.recommend_json(movie_candidates, user_summary, top_n=req.top_n)
-    parsed = json.loads(llm_json)
-    recs = parsed.get("recommendations") if isinstance(parsed, dict) else parsed
-    if not recs:
-        return {"recommendations": _format_recommendations_from_df(movie_candidates.head(req.top_n))}
 
-    mapped = []
-    for r in recs:
-        if isinstance(r, dict) and r.get("id") is not None:
-            row = movie_candidates[movie_candidates['id'] == r.get('id')]
-        else:
-            row = movie_candidates[movie_candidates['title'] == r.get('title')]
-        if not row.empty:
-            mapped.extend(_format_recommendations_from_df(row.head(1)))
-        else:
-            mapped.append({
-                "name": r.get('title') or r.get('name'),
-                "description": "",
-                "image": IMAGE_URL,
-            })
+@app.get("/recommendations/movies")
+async def recommendations_movies_get(liked_titles: Optional[str] = None, top_n: int = 3, top_candidates: int = 15,
+                                     mode: Literal["llm", "fast"] = "llm", budget_ms: Optional[int] = None,
+                                     engine: Literal["tags", "semantic"] = "tags"):
+    return await recommendations_domain_get("movie", liked_titles, top_n, top_candidates, mode, budget_ms, engine)
 
-    return {"recommendations": mapped}
 
+@app.post("/recommendations/{content_type}")
+async def recommendations_domain(content_type: str, req: DomainRecommendRequest):
+    return await _recommend_domain(content_type, req)
 
-@app.get("/recommendations/movies")
-async def recommendations_movies_get(liked_titles: Optional[str] = None, top_n: int = 3, top_candidates: int = 15):
+
+@app.get("/recommendations/{content_type}")
+async def recommendations_domain_get(content_type: str, liked_titles: Optional[str] = None, top_n: int = 3,
+                                     top_candidates: int = 10, mode: Literal["llm", "fast"] = "llm",
+                                     budget_ms: Optional[int] = None, engine: Literal["tags", "semantic"] = "tags",
+                                     date_from: Optional[date] = None, date_to: Optional[date] = None,
+                                     available: bool = False):
+    """GET endpoint que acepta liked_titles coma-separadas"""
     liked = DEFAULT_LIKED
     if liked_titles:
         liked = [t.strip() for t in liked_titles.split(",") if t.strip()]
-    req = RecommendRequest(liked_titles=liked, top_n=top_n, top_candidates=top_candidates)
-    return await recommendations_movies(req)
+    req = DomainRecommendRequest(liked_titles=liked, top_n=top_n, top_candidates=top_candidates, mode=mode,
+                                 budget_ms=budget_ms, engine=engine, date_from=date_from, date_to=date_to,
+                                 available=available)
+    return await _recommend_domain(content_type, req)
 
 #    uvicorn main:app --reload --host 0.0.0.0 --port 8000
 
@@ -192,7 +860,8 @@ if __name__ == "__main__":
         Optional env vars:
             - HOST (default 0.0.0.0)
             - PORT (default 8443)
-            - RELOAD (default true)
+            - RELOAD (default true; se ignora con WORKERS > 1)
+            - WORKERS (default 1; "auto" = un worker por CPU)
         """
         load_dotenv()
         host = os.getenv("HOST", "0.0.0.0")
@@ -207,12 +876,26 @@ if __name__ == "__main__":
                         "Consulta README.md para generar un certificado auto-firmado."
                 )
 
-        print(f"Iniciando API en https://{host}:{port} …")
+        workers_env = os.getenv("WORKERS", "1")
+        workers = default_workers() if workers_env == "auto" else int(workers_env)
+        if workers > 1:
+                # Prefork: el catálogo se compila una vez aquí y los workers lo abren con mmap
+                reload = False
+                snapshot_path = os.getenv("CATALOG_SNAPSHOT") or os.path.join(DATA_DIR, "catalog.snap")
+                os.environ["CATALOG_SNAPSHOT"] = snapshot_path
+                semantic = _env_flag("SEMANTIC_ENGINE", "0")
+                embeddings_path = os.getenv("EMBEDDINGS_DIR") or (os.path.join(DATA_DIR, "embeddings") if semantic else None)
+                if embeddings_path:
+                        os.environ["EMBEDDINGS_DIR"] = embeddings_path
+                prepare_shared_catalog(DATA_DIR, snapshot_path, semantic=semantic, embeddings_path=embeddings_path)
+
+        logger.info("Iniciando API en https://%s:%d con %d worker(s) …", host, port, workers)
         uvicorn.run(
                 "api:app",
                 host=host,
                 port=port,
                 reload=reload,
+                workers=workers,
                 ssl_certfile=certfile,
                 ssl_keyfile=keyfile,
         )
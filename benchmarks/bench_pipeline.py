@@ -0,0 +1,160 @@
+"""
+Benchmark del pipeline de recomendación por etapas y por motor de puntuación.
+
+Mide sobre un catálogo (el de un directorio o uno sintético generado al vuelo):
+  - carga (`load_catalog`), escritura y apertura del snapshot binario, y el
+    arranque completo de un worker desde el snapshot (`CatalogStore.load`)
+  - construcción del índice invertido, las matrices dispersas, el índice de
+    títulos y los embeddings
+  - por consulta: resolución de títulos, perfil, `recommend` de cada motor
+    ('index', 'sparse', 'semantic'), también restringido a un dominio
+    (`--content-type`), construcción de los prompts del LLM y del párrafo
+    compuesto sin LLM a partir de blurbs
+  - `top_n_batch` (usuarios/s)
+
+Uso:
+    python -m benchmarks.bench_pipeline --items 1000000 --queries 500 --json benchmarks/results.jsonl
+    python -m benchmarks.bench_pipeline --data Data --memory
+"""
+import os
+import argparse
+import tempfile
+from typing import List
+
+import numpy as np
+
+from src.blurbs import compose_paragraph
+from src.binary_snapshot import open_snapshot, write_snapshot
+from src.catalog import ItemFilter
+from src.catalog_store import CatalogStore
+from src.data_loader import load_catalog
+from src.embeddings import EmbeddingRecommender
+from src.llm_justifier import _PromptBuilder
+from src.prompt_fragments import PromptFragments
+from src.recommender import Recommender, SparseTermMatrix, TermIndex
+from src.title_index import TitleIndex
+from src.user_porfile import create_multi_domain_user_profile, get_user_liked_summary_multi, summarize_liked_multi
+
+from benchmarks.harness import Bench, write_results
+from benchmarks.synthetic_catalog import generate
+
+
+ENGINES = ('index', 'sparse', 'semantic')
+
+
+def sample_users(catalog, n_users: int, rng: np.random.Generator, max_liked: int = 5) -> List[List[int]]:
+    """Conjuntos de items gustados (1..max_liked) entre las filas vivas del catálogo."""
+    live = np.flatnonzero(~catalog.deleted) if catalog.deleted is not None else np.arange(len(catalog))
+    sizes = rng.integers(1, max_liked + 1, size=n_users)
+    return [rng.choice(live, size=int(k), replace=False).tolist() for k in sizes]
+
+
+def run(catalog_dir: str, queries: int, batch_users: int, top_candidates: int, top_n: int,
+        engines: List[str], memory: bool, seed: int = 0, content_type: str = 'movie') -> List[dict]:
+    bench = Bench(memory=memory)
+    catalog = bench.once('load_catalog', lambda: load_catalog(catalog_dir), items=len)
+    n = len(catalog)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snap_path = os.path.join(tmp, 'catalog.snap')
+        index = bench.once('index_build', lambda: TermIndex(catalog), items=n)
+        sources = CatalogStore(catalog_dir).scan_mtimes()
+        bench.once('snapshot_write', lambda: write_snapshot(catalog, snap_path, sources=sources, index=index), items=n)
+        bench.results[-1]['bytes'] = os.path.getsize(snap_path)
+        bench.once('snapshot_open', lambda: open_snapshot(snap_path), items=n)
+        # Arranque de un worker: snapshot vigente -> catálogo, índices y título listos
+        bench.once('snapshot_startup', lambda: CatalogStore(catalog_dir, snapshot_path=snap_path).load(), items=n)
+
+    title_index = bench.once('title_index_build', lambda: TitleIndex(catalog), items=n)
+    recommenders = {}
+    if 'index' in engines:
+        recommenders['index'] = Recommender('index')
+        recommenders['index'].load(catalog, index=index)
+    if 'sparse' in engines:
+        bench.once('sparse_build', lambda: SparseTermMatrix(catalog), items=n)
+        recommenders['sparse'] = Recommender('sparse')
+        recommenders['sparse'].load(catalog)
+    if 'semantic' in engines:
+        semantic = EmbeddingRecommender()
+        bench.once('embeddings_build', lambda: semantic.load(catalog), items=n)
+        recommenders['semantic'] = semantic
+
+    rng = np.random.default_rng(seed)
+    users = sample_users(catalog, queries, rng)
+    titles = [catalog.titles.take(liked) for liked in users]
+    profiles = [create_multi_domain_user_profile(liked, catalog) for liked in users]
+
+    bench.repeat('resolve_titles', title_index.resolve, titles)
+    bench.repeat('user_profile', lambda liked: create_multi_domain_user_profile(liked, catalog), users)
+    bench.repeat('user_summary', lambda liked: get_user_liked_summary_multi(liked, catalog), users)
+    for name, recommender in recommenders.items():
+        bench.repeat(f'recommend[{name}]',
+                     lambda i, r=recommender: r.recommend(users[i], profiles[i], top_n=top_candidates),
+                     list(range(len(users))), engine=name)
+    item_filter = ItemFilter(content_type)
+    for name, recommender in recommenders.items():
+        bench.repeat(f'recommend[{name}:{content_type}]',
+                     lambda i, r=recommender: r.recommend(users[i], profiles[i], top_n=top_candidates,
+                                                          item_filter=item_filter),
+                     list(range(len(users))), engine=name, content_type=content_type)
+
+    if 'sparse' in engines or 'index' in engines:
+        batch_recommender = recommenders.get('sparse') or recommenders['index']
+        all_users = sample_users(catalog, batch_users, rng)
+        chunk = max(1, min(len(all_users), Recommender.BATCH_CELLS // max(1, n)))
+        chunks = [all_users[i:i + chunk] for i in range(0, len(all_users), chunk)]
+        bench.repeat('top_n_batch', lambda users_chunk: list(batch_recommender.top_n_batch(users_chunk, top_n)),
+                     chunks, units_per_call=chunk, users=len(all_users))
+
+    # Prompts del LLM sobre los candidatos reales de cada consulta
+    candidates = [recommenders.get('index', next(iter(recommenders.values())))
+                  .recommend(users[i], profiles[i], top_n=top_candidates) for i in range(len(users))]
+    summaries = [get_user_liked_summary_multi(liked, catalog) for liked in users]
+    builder = _PromptBuilder()
+    cases = list(range(len(users)))
+    bench.repeat('prompt[json]', lambda i: builder._build_prompt_for_json(candidates[i], summaries[i], top_n), cases)
+    bench.repeat('prompt[paragraph]',
+                 lambda i: builder._build_prompt_for_paragraph(candidates[i], summaries[i], top_n), cases)
+    fragments = PromptFragments(catalog)
+    bench.repeat('prompt[json+fragments]',
+                 lambda i: builder._build_prompt_for_json(candidates[i], summaries[i], top_n, fragments), cases)
+    bench.repeat('prompt[justify]', lambda i: builder._build_prompt(candidates[i].head(top_n), summaries[i]), cases)
+    liked_summaries = [summarize_liked_multi(liked, catalog) for liked in users]
+    bench.repeat('paragraph[compose]', lambda i: compose_paragraph(candidates[i], liked_summaries[i], top_n), cases)
+    return bench.results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark por etapas del pipeline de recomendación.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--data", help="directorio con los ficheros de dominio")
+    source.add_argument("--items", type=int, help="genera un catálogo sintético de este tamaño")
+    parser.add_argument("--queries", type=int, default=200, help="consultas por etapa (por defecto 200)")
+    parser.add_argument("--batch-users", type=int, default=2000, help="usuarios para top_n_batch")
+    parser.add_argument("--top-candidates", type=int, default=10)
+    parser.add_argument("--top-n", type=int, default=3)
+    parser.add_argument("--engines", default=','.join(ENGINES), help="motores separados por comas")
+    parser.add_argument("--content-type", default="movie", help="dominio de las etapas recommend[motor:dominio]")
+    parser.add_argument("--memory", action="store_true", help="memoria pico por etapa con tracemalloc")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="fichero JSONL al que añadir los resultados")
+    args = parser.parse_args()
+
+    engines = [e.strip() for e in args.engines.split(',') if e.strip()]
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"motores desconocidos: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as generated:
+        data_dir = args.data
+        if data_dir is None:
+            generate(args.items, generated, seed=args.seed)
+            data_dir = generated
+        results = run(data_dir, args.queries, args.batch_users, args.top_candidates, args.top_n,
+                      engines, args.memory, seed=args.seed, content_type=args.content_type)
+
+    if args.json:
+        write_results(args.json, 'pipeline', results, data=args.data, items=args.items, queries=args.queries,
+                      batch_users=args.batch_users, top_candidates=args.top_candidates, top_n=args.top_n,
+                      engines=engines, memory=args.memory, seed=args.seed, content_type=args.content_type)
+        print(f"Resultados añadidos a {args.json}")
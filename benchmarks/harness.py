@@ -0,0 +1,144 @@
+"""
+Utilidades comunes de los benchmarks: medición de latencias, memoria pico y
+resultados en JSON para poder comparar ejecuciones a lo largo del tiempo.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import subprocess
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99, media y máximo en milisegundos."""
+    if not samples:
+        return {}
+    ms = np.asarray(samples) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'mean_ms': round(float(ms.mean()), 3),
+        'max_ms': round(float(ms.max()), 3),
+    }
+
+
+def max_rss_mb() -> float:
+    """Pico de memoria residente del proceso (ru_maxrss está en KiB en Linux)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def peak_traced_mb(fn: Callable[[], object]) -> float:
+    """Memoria pico asignada (Python y numpy) durante una llamada a `fn`."""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    try:
+        fn()
+        return round((tracemalloc.get_traced_memory()[1] - base) / (1024 * 1024), 3)
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+class Bench:
+    """
+    Acumula los resultados de cada etapa. Las latencias se miden sin tracemalloc
+    (su sobrecoste las distorsiona); con `memory=True` cada etapa se repite una
+    vez más bajo tracemalloc para obtener su memoria pico.
+    """
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.results: List[dict] = []
+
+    def once(self, stage: str, fn: Callable[[], object], items=None, **extra):
+        """
+        Etapa que se ejecuta una sola vez (carga, construcción de índices). Devuelve
+        el resultado de `fn`. `items` es un número o una función del resultado (p. ej. `len`).
+        """
+        start = time.perf_counter()
+        value = fn()
+        elapsed = time.perf_counter() - start
+        if callable(items):
+            items = items(value)
+        result = {'stage': stage, 'seconds': round(elapsed, 4), 'max_rss_mb': max_rss_mb(), **extra}
+        if items:
+            result['items'] = items
+            result['items_per_s'] = round(items / elapsed, 1) if elapsed else None
+        if self.memory:
+            result['peak_traced_mb'] = peak_traced_mb(fn)
+        self._add(result)
+        return value
+
+    def repeat(self, stage: str, fn: Callable[[object], object], inputs: List[object],
+               units_per_call: int = 1, **extra):
+        """Etapa de consulta: una llamada por entrada; reporta percentiles y throughput."""
+        samples = []
+        start = time.perf_counter()
+        for arg in inputs:
+            t0 = time.perf_counter()
+            fn(arg)
+            samples.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+        result = {'stage': stage, 'calls': len(inputs), **percentiles(samples),
+                  'throughput_per_s': round(len(inputs) * units_per_call / elapsed, 1) if elapsed else None,
+                  'max_rss_mb': max_rss_mb(), **extra}
+        if self.memory and inputs:
+            result['peak_traced_mb'] = peak_traced_mb(lambda: fn(inputs[0]))
+        self._add(result)
+
+    def _add(self, result: dict):
+        self.results.append(result)
+        print(format_result(result), flush=True)
+
+
+def format_result(result: dict) -> str:
+    parts = [f"{result['stage']:<28}"]
+    if 'p50_ms' in result:
+        parts.append(f"p50 {result['p50_ms']:>9.3f} ms  p95 {result['p95_ms']:>9.3f} ms  "
+                     f"p99 {result['p99_ms']:>9.3f} ms  {result['throughput_per_s']:>10.1f}/s")
+    elif 'seconds' in result:
+        parts.append(f"{result['seconds']:>9.3f} s")
+        if result.get('items_per_s'):
+            parts.append(f"{result['items_per_s']:>12.1f} items/s")
+    if 'peak_traced_mb' in result:
+        parts.append(f"peak {result['peak_traced_mb']:.3f} MB")
+    parts.append(f"rss {result['max_rss_mb']:.0f} MB")
+    return '  '.join(parts)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def write_results(path: str, benchmark: str, results: List[dict], **params) -> dict:
+    """Añade una línea JSON por ejecución a `path` (histórico para seguir la evolución)."""
+    record = {
+        'benchmark': benchmark,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'params': params,
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    return record
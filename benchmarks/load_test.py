@@ -0,0 +1,249 @@
+"""
+Prueba de carga end-to-end de la API con un LLM simulado en local.
+
+La app se ejecuta en el mismo proceso (ASGI, con su lifespan) sobre el catálogo
+indicado, y el cliente de OpenAI se sustituye por un `httpx.MockTransport` que
+responde con la latencia configurada: se mide el coste del servidor
+(resolución, puntuación, prompts, mapeo, serialización) sin red ni coste de API.
+
+Uso:
+    python -m benchmarks.load_test --items 200000 --requests 2000 --concurrency 32 --llm-latency-ms 300
+    python -m benchmarks.load_test --data Data --mix json:1,fast:1 --json benchmarks/results.jsonl
+"""
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+import httpx
+from openai import AsyncOpenAI
+
+from benchmarks.harness import percentiles, max_rss_mb, write_results
+from benchmarks.synthetic_catalog import generate
+
+
+CANDIDATE_LINE = re.compile(r"^- id: (?P<id>[^;]*); title: (?P<title>[^;]*); type: (?P<type>[^;]*);", re.M)
+TOP_N = re.compile(r"exactamente (\d+)")
+
+
+class StubLLM:
+    """
+    Sustituto local de la API de chat completions: elige los primeros candidatos
+    del prompt (JSON) o escribe un párrafo, en modo normal o streaming, tras una
+    latencia aleatoria alrededor de `latency_ms`.
+    """
+
+    def __init__(self, latency_ms: float = 200.0, jitter: float = 0.3, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def _reply(self, body: dict) -> str:
+        system, prompt = body['messages'][0]['content'], body['messages'][-1]['content']
+        match = TOP_N.search(system) or TOP_N.search(prompt)
+        top_n = int(match.group(1)) if match else 3
+        if 'JSON' in system:
+            recs = [{"id": int(m['id']) if m['id'].strip().isdigit() else m['id'], "title": m['title'],
+                     "content_type": m['type']} for m in CANDIDATE_LINE.finditer(prompt)][:top_n]
+            return json.dumps({"recommendations": recs}, ensure_ascii=False)
+        return "Estas recomendaciones encajan con tus gustos por sus géneros y temas en común. " * 4
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        body = json.loads(request.content)
+        delay = self.latency_ms * max(0.0, self.rng.gauss(1.0, self.jitter)) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+        content = self._reply(body)
+        usage = {"prompt_tokens": len(body['messages'][-1]['content']) // 4,
+                 "completion_tokens": len(content) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if body.get('stream'):
+            chunks = [content[i:i + 24] for i in range(0, len(content), 24)]
+            events = [{"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": body['model'],
+                       "choices": [{"index": 0, "delta": {"content": c}, "finish_reason": None}]} for c in chunks]
+            events.append({"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": body['model'],
+                           "choices": [], "usage": usage})
+            data = ''.join(f"data: {json.dumps(e)}\n\n" for e in events) + "data: [DONE]\n\n"
+            return httpx.Response(200, content=data.encode('utf-8'), headers={'content-type': 'text/event-stream'})
+        return httpx.Response(200, json={
+            "id": "stub", "object": "chat.completion", "created": 0, "model": body['model'],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+
+# Escenario -> (método, ruta, parámetros extra)
+SCENARIOS = {
+    'json': ('GET', '/recommendations/json', {'mode': 'llm'}),
+    'fast': ('GET', '/recommendations/json', {'mode': 'fast'}),
+    'semantic': ('GET', '/recommendations/json', {'mode': 'fast', 'engine': 'semantic'}),
+    'movies': ('GET', '/recommendations/movies', {'mode': 'fast'}),
+    'concerts': ('GET', '/recommendations/concerts', {'mode': 'fast', 'available': 'true'}),
+    'text': ('GET', '/recommendations/text', {}),
+    'stream': ('GET', '/recommendations/text/stream', {}),
+    'autocomplete': ('GET', '/titles/autocomplete', {}),
+}
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.strip().partition(':')
+        if name not in SCENARIOS:
+            raise ValueError(f"Escenario desconocido: {name}. Opciones: {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def stage_means(metrics_text: str) -> Dict[str, dict]:
+    """Media y número de observaciones de `recommender_stage_seconds` por etapa."""
+    sums, counts = {}, {}
+    for line in metrics_text.splitlines():
+        m = re.match(r'recommender_stage_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)', line)
+        if m:
+            (sums if m.group(1) == 'sum' else counts)[m.group(2)] = float(m.group(3))
+    return {stage: {'count': int(counts[stage]), 'mean_ms': round(sums.get(stage, 0) / counts[stage] * 1000, 3)}
+            for stage in counts if counts[stage]}
+
+
+@asynccontextmanager
+async def stubbed_app(data_dir: str, stub: StubLLM, timeout: float = 60):
+    """
+    La API en este proceso (con su lifespan) sobre `data_dir` y con el LLM
+    simulado por `stub`. Produce (módulo `api`, cliente HTTP contra la app).
+    """
+    # La configuración de la app se lee al importar el módulo
+    os.environ['DATA_DIR'] = data_dir
+    os.environ.setdefault('OPENAI_API_KEY', 'stub')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Las pruebas no deben acabar en el log de peticiones
+    os.environ['REQUEST_LOG_DIR'] = ''
+    import api
+
+    async with api.app.router.lifespan_context(api.app):
+        justifier = api.app.state.justifier
+        await justifier.client.close()
+        justifier.client = AsyncOpenAI(api_key='stub', http_client=httpx.AsyncClient(transport=stub.transport()),
+                                       max_retries=0)
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=timeout) as client:
+            yield api, client
+
+
+async def run(data_dir: str, n_requests: int, concurrency: int, mix: Dict[str, float], llm_latency_ms: float,
+              liked_per_request: int = 3, seed: int = 0) -> dict:
+    stub = StubLLM(llm_latency_ms, seed=seed)
+    rng = random.Random(seed)
+    latencies: Dict[str, List[float]] = {name: [] for name in mix}
+    errors: Dict[str, int] = {name: 0 for name in mix}
+
+    async with stubbed_app(data_dir, stub) as (api, client):
+        catalog = api.app.state.catalog_store.current().catalog
+        if 'semantic' in mix and api.app.state.catalog_store.current().semantic is None:
+            raise SystemExit("El escenario 'semantic' necesita SEMANTIC_ENGINE=1")
+
+        names, weights = list(mix), list(mix.values())
+        plan = rng.choices(names, weights=weights, k=n_requests)
+        queue: asyncio.Queue = asyncio.Queue()
+        for name in plan:
+            liked = [catalog.titles[rng.randrange(len(catalog))] for _ in range(liked_per_request)]
+            queue.put_nowait((name, liked))
+
+        async def worker():
+            while True:
+                try:
+                    name, liked = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                method, path, extra = SCENARIOS[name]
+                if name == 'autocomplete':
+                    params = {'q': liked[0][:4]}
+                else:
+                    params = {'liked_titles': ','.join(t.replace(',', ' ') for t in liked), **extra}
+                t0 = time.perf_counter()
+                try:
+                    resp = await client.request(method, path, params=params)
+                    await resp.aread()
+                    ok = resp.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                latencies[name].append(time.perf_counter() - t0)
+                if not ok:
+                    errors[name] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        metrics_text = (await client.get('/metrics')).text
+
+    all_samples = [s for samples in latencies.values() for s in samples]
+    return {
+        'requests': n_requests,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(n_requests / elapsed, 1),
+        **percentiles(all_samples),
+        'errors': sum(errors.values()),
+        'llm_calls': stub.calls,
+        'max_rss_mb': max_rss_mb(),
+        'scenarios': {name: {'requests': len(latencies[name]), 'errors': errors[name], **percentiles(latencies[name])}
+                      for name in mix},
+        'stages': stage_means(metrics_text),
+    }
+
+
+def print_report(report: dict):
+    print(f"{report['requests']} peticiones en {report['seconds']} s: {report['throughput_rps']} req/s, "
+          f"{report['errors']} errores, {report['llm_calls']} llamadas al LLM, rss {report['max_rss_mb']:.0f} MB")
+    print(f"  total         p50 {report['p50_ms']:>9.3f} ms  p95 {report['p95_ms']:>9.3f} ms  "
+          f"p99 {report['p99_ms']:>9.3f} ms")
+    for name, s in report['scenarios'].items():
+        if s['requests']:
+            print(f"  {name:<13} p50 {s['p50_ms']:>9.3f} ms  p95 {s['p95_ms']:>9.3f} ms  "
+                  f"p99 {s['p99_ms']:>9.3f} ms  ({s['requests']} peticiones, {s['errors']} errores)")
+    print("  etapas (media):")
+    for stage, s in sorted(report['stages'].items()):
+        print(f"    {stage:<11} {s['mean_ms']:>9.3f} ms  x{s['count']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga end-to-end con LLM simulado.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--data", help="directorio con los ficheros de dominio")
+    source.add_argument("--items", type=int, help="genera un catálogo sintético de este tamaño")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", default="json:4,fast:3,text:2,stream:1",
+                        help=f"escenarios con peso, p. ej. json:2,fast:1 ({', '.join(SCENARIOS)})")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="latencia media del LLM simulado")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="fichero JSONL al que añadir los resultados")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with tempfile.TemporaryDirectory() as generated:
+        data_dir = args.data
+        if data_dir is None:
+            generate(args.items, generated, seed=args.seed)
+            data_dir = generated
+        report = asyncio.run(run(data_dir, args.requests, args.concurrency, mix, args.llm_latency_ms, seed=args.seed))
+
+    print_report(report)
+    if args.json:
+        write_results(args.json, 'load_test', [report], data=args.data, items=args.items, requests=args.requests,
+                      concurrency=args.concurrency, mix=mix, llm_latency_ms=args.llm_latency_ms, seed=args.seed)
+        print(f"Resultados añadidos a {args.json}")
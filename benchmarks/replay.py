@@ -0,0 +1,166 @@
+"""
+Reproduce tráfico real registrado por el log de peticiones de la API
+(`REQUEST_LOG_DIR`) contra una instancia local con el LLM simulado.
+
+Cada registro guarda método, ruta, query, cuerpo JSON e instante de la
+petición original, así que se reproducen las mismas formas de tráfico
+(títulos gustados, `top_n`, `top_candidates`, motores, ráfagas):
+  - `--speed 1`: al ritmo original (lazo abierto; `--speed 4` lo acelera x4)
+  - `--speed 0`: lo más rápido posible con `--concurrency` clientes
+
+El informe compara, por ruta, las latencias de la reproducción con las
+registradas y añade las medias por etapa de /metrics. Para que los títulos
+resuelvan igual conviene usar los mismos datos (`--data`) que en producción.
+
+Uso:
+    python -m benchmarks.replay logs/ --data Data
+    python -m benchmarks.replay logs/requests-20250101-120000-1-0001.jsonl --data Data --speed 4
+    python -m benchmarks.replay logs/ --data Data --speed 0 --concurrency 32 --json benchmarks/results.jsonl
+"""
+import time
+import asyncio
+import argparse
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from benchmarks.harness import percentiles, max_rss_mb, write_results
+from benchmarks.load_test import StubLLM, stage_means, stubbed_app
+from src.request_log import read_records
+
+
+def load_requests(paths: List[str], routes: Optional[List[str]] = None, limit: Optional[int] = None) -> List[dict]:
+    """Registros reproducibles (con ruta y método) en orden temporal."""
+    records = [r for r in read_records(paths) if r.get('path') and r.get('method') and 'ts' in r
+               and (not routes or r.get('route') in routes or r['path'] in routes)]
+    records.sort(key=lambda r: r['ts'])
+    return records[:limit] if limit else records
+
+
+async def replay(data_dir: str, records: List[dict], speed: float, concurrency: int, llm_latency_ms: float,
+                 seed: int = 0) -> dict:
+    stub = StubLLM(llm_latency_ms, seed=seed)
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    status_changed: Dict[str, int] = {}
+    lag: List[float] = []
+
+    async with stubbed_app(data_dir, stub) as (api, client):
+        slots = asyncio.Semaphore(max(1, concurrency))
+
+        async def send(record: dict):
+            route = record.get('route') or record['path']
+            url = record['path'] + (f"?{record['query']}" if record.get('query') else '')
+            t0 = time.perf_counter()
+            try:
+                resp = await client.request(record['method'], url, json=record.get('body'))
+                await resp.aread()
+                status = resp.status_code
+            except httpx.HTTPError:
+                status = None
+            latencies.setdefault(route, []).append(time.perf_counter() - t0)
+            if status is None or status >= 500:
+                errors[route] = errors.get(route, 0) + 1
+            if status != record.get('status'):
+                status_changed[route] = status_changed.get(route, 0) + 1
+
+        async def limited(record: dict):
+            async with slots:
+                await send(record)
+
+        start = time.perf_counter()
+        if speed > 0:
+            # Lazo abierto: cada petición sale en su instante original (escalado)
+            t_first = records[0]['ts'] if records else 0.0
+            tasks = []
+            for record in records:
+                due = start + (record['ts'] - t_first) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    lag.append(-delay)
+                tasks.append(asyncio.create_task(limited(record)))
+            await asyncio.gather(*tasks)
+        else:
+            queue = iter(records)
+
+            async def worker():
+                for record in queue:
+                    await send(record)
+
+            await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        elapsed = time.perf_counter() - start
+        metrics_text = (await client.get('/metrics')).text
+
+    original: Dict[str, List[float]] = {}
+    for record in records:
+        if record.get('duration_ms') is not None:
+            original.setdefault(record.get('route') or record['path'], []).append(record['duration_ms'] / 1000)
+    span = records[-1]['ts'] - records[0]['ts'] if len(records) > 1 else 0.0
+    all_samples = [s for samples in latencies.values() for s in samples]
+    return {
+        'requests': len(records),
+        'seconds': round(elapsed, 3),
+        'original_seconds': round(span, 3),
+        'throughput_rps': round(len(records) / elapsed, 1) if elapsed else None,
+        **percentiles(all_samples),
+        'errors': sum(errors.values()),
+        'status_changed': sum(status_changed.values()),
+        'schedule_lag_p95_ms': round(float(np.percentile(lag, 95)) * 1000, 3) if lag else 0.0,
+        'llm_calls': stub.calls,
+        'max_rss_mb': max_rss_mb(),
+        'routes': {route: {'requests': len(samples), 'errors': errors.get(route, 0),
+                           'status_changed': status_changed.get(route, 0), **percentiles(samples),
+                           'original': percentiles(original.get(route, []))}
+                   for route, samples in latencies.items()},
+        'stages': stage_means(metrics_text),
+    }
+
+
+def print_report(report: dict):
+    print(f"{report['requests']} peticiones en {report['seconds']} s (originales: {report['original_seconds']} s): "
+          f"{report['throughput_rps']} req/s, {report['errors']} errores, {report['status_changed']} con otro status, "
+          f"{report['llm_calls']} llamadas al LLM, rss {report['max_rss_mb']:.0f} MB")
+    if 'p50_ms' in report:
+        print(f"  total  p50 {report['p50_ms']:.3f} ms  p95 {report['p95_ms']:.3f} ms  p99 {report['p99_ms']:.3f} ms"
+              f"  (retraso de programación p95 {report['schedule_lag_p95_ms']:.3f} ms)")
+    for route, s in sorted(report['routes'].items()):
+        line = (f"  {route:<36} p50 {s['p50_ms']:>9.3f} ms  p95 {s['p95_ms']:>9.3f} ms  p99 {s['p99_ms']:>9.3f} ms"
+                f"  ({s['requests']} peticiones, {s['errors']} errores)")
+        if s['original']:
+            line += f"  original p50 {s['original']['p50_ms']:.3f} ms  p95 {s['original']['p95_ms']:.3f} ms"
+        print(line)
+    print("  etapas (media):")
+    for stage, s in sorted(report['stages'].items()):
+        print(f"    {stage:<13} {s['mean_ms']:>9.3f} ms  x{s['count']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reproduce el log de peticiones contra la API con LLM simulado.")
+    parser.add_argument("logs", nargs="+", help="ficheros o directorios del log de peticiones")
+    parser.add_argument("--data", default="Data", help="directorio con los ficheros de dominio")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="factor sobre el ritmo original (2 = el doble de rápido; 0 = sin esperas)")
+    parser.add_argument("--concurrency", type=int, default=256,
+                        help="peticiones en curso como máximo (clientes con --speed 0)")
+    parser.add_argument("--routes", help="rutas a reproducir separadas por comas, p. ej. /recommendations/json")
+    parser.add_argument("--limit", type=int, help="reproduce sólo las primeras N peticiones")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="latencia media del LLM simulado")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="fichero JSONL al que añadir los resultados")
+    args = parser.parse_args()
+
+    routes = [r.strip() for r in args.routes.split(',') if r.strip()] if args.routes else None
+    records = load_requests(args.logs, routes, args.limit)
+    if not records:
+        parser.error("no hay peticiones que reproducir en los logs indicados")
+
+    report = asyncio.run(replay(args.data, records, args.speed, args.concurrency, args.llm_latency_ms, seed=args.seed))
+    print_report(report)
+    if args.json:
+        write_results(args.json, 'replay', [report], logs=args.logs, data=args.data, speed=args.speed,
+                      concurrency=args.concurrency, routes=routes, limit=args.limit,
+                      llm_latency_ms=args.llm_latency_ms, seed=args.seed)
+        print(f"Resultados añadidos a {args.json}")
@@ -0,0 +1,223 @@
+"""
+Generador de catálogos sintéticos con los cinco esquemas de dominio de `Data/`.
+
+Distribuciones pensadas para parecerse a un catálogo real:
+  - géneros por dominio con popularidad tipo Zipf (pocos géneros muy frecuentes)
+  - vocabulario de keywords que crece de forma sublineal con el catálogo (ley de
+    Heaps) y se reparte por géneros: items del mismo género comparten keywords
+  - títulos combinando palabras (con algunas colisiones) y descripciones de
+    longitud variable
+
+Uso:
+    python -m benchmarks.synthetic_catalog --items 1000000 -o /tmp/catalog_1m
+"""
+import os
+import json
+import zlib
+import argparse
+from typing import Callable, Dict, Iterator, List
+
+import numpy as np
+
+
+DOMAIN_SHARES = {
+    'movies': 0.30,
+    'songs': 0.35,
+    'merch': 0.10,
+    'theater_events': 0.10,
+    'concerts': 0.15,
+}
+
+GENRES = {
+    'movies': ["Drama", "Comedy", "Action", "Thriller", "Science Fiction", "Adventure", "Romance", "Crime",
+               "Horror", "Animation", "Fantasy", "Documentary", "Mystery", "Family", "War", "History", "Music",
+               "Western"],
+    'music': ["Pop", "Rock", "Electronic", "Hip Hop", "Indie", "Jazz", "Ambient", "Synthwave", "Folk", "Metal",
+              "Classical", "R&B", "Reggaeton", "Flamenco", "Blues", "Soul", "Punk", "Latin"],
+    'merch': ["Apparel", "Accessories", "Posters", "Vinyl", "Collectibles", "Books", "Homeware", "Stickers"],
+    'theater': ["Drama", "Comedia", "Musical", "Danza", "Ópera", "Infantil", "Monólogo", "Tragedia",
+                "Improvisación", "Cabaret"],
+}
+
+WORDS = ["night", "shadow", "light", "river", "city", "dream", "echo", "fire", "storm", "silent", "golden",
+         "broken", "wild", "last", "secret", "crystal", "neon", "lost", "hidden", "eternal", "paper", "iron",
+         "velvet", "summer", "winter", "north", "ocean", "desert", "mirror", "garden", "signal", "orbit",
+         "ghost", "heart", "machine", "road", "sky", "stone", "glass", "memory", "luna", "sombra", "reloj",
+         "camino", "sueño", "fuego", "cielo", "noche", "viento", "mar"]
+FILLER = ["una", "historia", "sobre", "the", "story", "of", "a", "journey", "through", "con", "en", "y", "que",
+          "unexpected", "friendship", "city", "family", "secret", "music", "love", "time", "power", "world",
+          "young", "old", "between", "after", "before", "nuevo", "viejo", "amor", "tiempo", "memoria", "vida"]
+CITIES = [("Madrid", "Spain"), ("Barcelona", "Spain"), ("Valencia", "Spain"), ("Sevilla", "Spain"),
+          ("Bilbao", "Spain"), ("Lisboa", "Portugal"), ("Paris", "France"), ("Berlin", "Germany"),
+          ("London", "UK"), ("Ciudad de México", "Mexico"), ("Buenos Aires", "Argentina")]
+VENUES = ["Palacio de Deportes", "Teatro Central", "Auditorio Marina", "Sala Apolo", "Arena Norte",
+          "Teatro Real", "Pabellón Urbano", "Sala Riviera"]
+
+
+class Vocabulary:
+    """Keywords sintéticas ordenadas por popularidad (rank 0 = la más frecuente)."""
+
+    def __init__(self, n_items: int, rng: np.random.Generator):
+        # Ley de Heaps: V = K * n^beta
+        self.size = max(200, int(40 * n_items ** 0.55))
+        syllables = ["ka", "lo", "mi", "tra", "ven", "sol", "ri", "do", "nu", "pe", "zar", "el", "ta", "mon", "qui"]
+        self.terms = []
+        seen = set()
+        while len(self.terms) < self.size:
+            term = ''.join(rng.choice(syllables, size=int(rng.integers(2, 5))))
+            if term not in seen:
+                seen.add(term)
+                self.terms.append(term)
+
+
+class Sampler:
+    """Muestreo vectorizado de géneros y keywords correlacionados por género."""
+
+    def __init__(self, vocab: Vocabulary, rng: np.random.Generator, zipf_s: float = 1.15):
+        self.vocab = vocab
+        self.rng = rng
+        self.zipf_s = zipf_s
+
+    def zipf_ranks(self, size: int, n: int) -> np.ndarray:
+        # Zipf truncada a [0, n)
+        ranks = self.rng.zipf(self.zipf_s, size=size * 2) - 1
+        ranks = ranks[ranks < n]
+        while len(ranks) < size:
+            more = self.rng.zipf(self.zipf_s, size=size) - 1
+            ranks = np.concatenate([ranks, more[more < n]])
+        return ranks[:size]
+
+    def genres(self, pool: List[str], count: int, per_item: int) -> List[List[str]]:
+        k = self.rng.integers(1, per_item + 1, size=count)
+        ranks = self.zipf_ranks(int(k.sum()), len(pool))
+        out, i = [], 0
+        for n in k.tolist():
+            out.append(list(dict.fromkeys(pool[r] for r in ranks[i:i + n].tolist())))
+            i += n
+        return out
+
+    def keywords(self, genre_lists: List[List[str]], low: int = 2, high: int = 7) -> List[List[str]]:
+        terms, size = self.vocab.terms, self.vocab.size
+        k = self.rng.integers(low, high + 1, size=len(genre_lists))
+        ranks = self.zipf_ranks(int(k.sum()), size)
+        out, i = [], 0
+        for genres, n in zip(genre_lists, k.tolist()):
+            # Cada género desplaza el ranking: keywords populares distintas por género
+            shift = (zlib.crc32(genres[0].encode()) % 97) * (size // 97) if genres else 0
+            out.append(list(dict.fromkeys(terms[(r + shift) % size] for r in ranks[i:i + n].tolist())))
+            i += n
+        return out
+
+
+def _title(rng: np.random.Generator, words: int) -> str:
+    return ' '.join(w.capitalize() for w in rng.choice(WORDS, size=words))
+
+
+def _text(rng: np.random.Generator, low: int, high: int) -> str:
+    return ' '.join(rng.choice(FILLER, size=int(rng.integers(low, high)))).capitalize() + '.'
+
+
+def _date(rng: np.random.Generator) -> str:
+    return f"2025-{int(rng.integers(1, 13)):02d}-{int(rng.integers(1, 29)):02d}"
+
+
+def movies(count: int, sampler: Sampler, rng: np.random.Generator) -> Iterator[dict]:
+    genres = sampler.genres(GENRES['movies'], count, 3)
+    for i, (g, kw) in enumerate(zip(genres, sampler.keywords(genres))):
+        yield {"id": i + 1, "title": _title(rng, int(rng.integers(1, 4))), "overview": _text(rng, 15, 45),
+               "genres": g, "keywords": kw}
+
+
+def songs(count: int, sampler: Sampler, rng: np.random.Generator) -> Iterator[dict]:
+    genres = sampler.genres(GENRES['music'], count, 2)
+    for i, (g, kw) in enumerate(zip(genres, sampler.keywords(genres, 2, 5))):
+        yield {"id": i + 1, "title": _title(rng, int(rng.integers(1, 4))), "artist": _title(rng, 2),
+               "album": _title(rng, 2), "genres": g, "year": int(rng.integers(1960, 2026)),
+               "duration_sec": int(rng.integers(120, 420)), "keywords": kw}
+
+
+def merch(count: int, sampler: Sampler, rng: np.random.Generator) -> Iterator[dict]:
+    genres = sampler.genres(GENRES['merch'], count, 1)
+    for i, (g, kw) in enumerate(zip(genres, sampler.keywords(genres, 2, 4))):
+        stock = int(rng.integers(0, 500))
+        yield {"id": i + 1, "name": f"{_title(rng, 2)} {g[0]}", "category": g[0], "description": _text(rng, 8, 20),
+               "price": round(float(rng.uniform(5, 120)), 2), "currency": "EUR", "keywords": kw, "stock": stock}
+
+
+def theater_events(count: int, sampler: Sampler, rng: np.random.Generator) -> Iterator[dict]:
+    genres = sampler.genres(GENRES['theater'], count, 1)
+    for i, (g, kw) in enumerate(zip(genres, sampler.keywords(genres))):
+        city, _ = CITIES[int(rng.integers(len(CITIES)))]
+        yield {"id": i + 1, "title": _title(rng, int(rng.integers(2, 5))), "description": _text(rng, 12, 35),
+               "genre": g[0], "date": _date(rng), "venue": VENUES[int(rng.integers(len(VENUES)))], "city": city,
+               "duration_min": int(rng.integers(60, 180)), "cast": [_title(rng, 2) for _ in range(3)],
+               "keywords": kw}
+
+
+def concerts(count: int, sampler: Sampler, rng: np.random.Generator) -> Iterator[dict]:
+    genres = sampler.genres(GENRES['music'], count, 2)
+    for i, (g, kw) in enumerate(zip(genres, sampler.keywords(genres, 2, 5))):
+        city, country = CITIES[int(rng.integers(len(CITIES)))]
+        price_min = int(rng.integers(15, 60))
+        yield {"id": i + 1, "artist": _title(rng, 2), "tour_name": f"{_title(rng, 2)} Tour", "date": _date(rng),
+               "venue": VENUES[int(rng.integers(len(VENUES)))], "city": city, "country": country, "genres": g,
+               "supporting_acts": [_title(rng, 2)],
+               "tickets": {"available": int(rng.integers(0, 20000)), "price_min": price_min,
+                           "price_max": price_min + int(rng.integers(10, 120)), "currency": "EUR"},
+               "keywords": kw}
+
+
+GENERATORS: Dict[str, Callable[[int, Sampler, np.random.Generator], Iterator[dict]]] = {
+    'movies': movies,
+    'songs': songs,
+    'merch': merch,
+    'theater_events': theater_events,
+    'concerts': concerts,
+}
+
+
+def generate(n_items: int, output_dir: str, fmt: str = 'jsonl', seed: int = 0) -> Dict[str, int]:
+    """
+    Escribe los cinco ficheros de dominio en `output_dir` (`.jsonl` o `.json`) con
+    `n_items` items en total. Devuelve cuántos items tiene cada dominio.
+    Se escribe en streaming: la memoria no depende del tamaño del catálogo.
+    """
+    if fmt not in ('json', 'jsonl'):
+        raise ValueError("fmt debe ser 'json' o 'jsonl'")
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    sampler = Sampler(Vocabulary(n_items, rng), rng)
+    counts = {}
+    for source, share in DOMAIN_SHARES.items():
+        count = max(1, int(n_items * share))
+        counts[source] = count
+        # Un formato por dominio: se elimina el del otro formato si existía
+        for ext in ('json', 'jsonl'):
+            stale = os.path.join(output_dir, f"{source}.{ext}")
+            if ext != fmt and os.path.exists(stale):
+                os.remove(stale)
+        path = os.path.join(output_dir, f"{source}.{fmt}")
+        with open(path, 'w', encoding='utf-8') as f:
+            if fmt == 'json':
+                f.write('[\n')
+            for i, record in enumerate(GENERATORS[source](count, sampler, rng)):
+                line = json.dumps(record, ensure_ascii=False)
+                if fmt == 'json':
+                    f.write((',\n' if i else '') + line)
+                else:
+                    f.write(line + '\n')
+            if fmt == 'json':
+                f.write('\n]\n')
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera un catálogo sintético con los cinco esquemas de dominio.")
+    parser.add_argument("--items", type=int, default=10000, help="items totales (por defecto 10000)")
+    parser.add_argument("-o", "--output", required=True, help="directorio de salida")
+    parser.add_argument("--format", choices=("json", "jsonl"), default="jsonl")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    counts = generate(args.items, args.output, fmt=args.format, seed=args.seed)
+    print(f"Catálogo sintético en {args.output}: " + ', '.join(f"{k}={v}" for k, v in counts.items()))
@@ -0,0 +1,169 @@
+import os
+import json
+import mmap
+import time
+import argparse
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.catalog import Catalog, StringColumn, TermColumn, Vocabulary
+from src.recommender import TermIndex
+from src.title_index import TitleIndex
+
+
+# Formato: MAGIC | longitud de cabecera (uint64) | cabecera JSON | arrays alineados a ALIGNMENT bytes
+MAGIC = b'AVSNAP\x00\x01'
+FORMAT_VERSION = 4
+ALIGNMENT = 64
+
+
+@dataclass
+class SnapshotFile:
+    """Catálogo e índices abiertos desde un snapshot binario (arrays sobre `mmap`)."""
+    catalog: Catalog
+    index: TermIndex
+    # Arrays de `TitleIndex.to_arrays` (se le pasan a `TitleIndex.from_arrays`)
+    title_arrays: Dict[str, np.ndarray]
+    sources: Dict[str, float]
+    built_at: float
+    path: str
+
+
+def _catalog_arrays(catalog: Catalog, index: TermIndex) -> Dict[str, np.ndarray]:
+    vocab = StringColumn.from_strings(catalog.vocab.terms)
+    vocab_hashes, vocab_order = catalog.vocab.hashed_order()
+    arrays = {
+        'ids': np.asarray(catalog.ids),
+        'titles.data': catalog.titles.data,
+        'titles.offsets': catalog.titles.offsets,
+        'descriptions.data': catalog.descriptions.data,
+        'descriptions.offsets': catalog.descriptions.offsets,
+        'content_types.codes': np.asarray(catalog.content_types.codes, dtype=np.int8),
+        'genres.offsets': catalog.genres.offsets,
+        'genres.values': catalog.genres.values,
+        'keywords.offsets': catalog.keywords.offsets,
+        'keywords.values': catalog.keywords.values,
+        'dates': np.asarray(catalog.dates),
+        'available': np.asarray(catalog.available),
+        'vocab.data': vocab.data,
+        'vocab.offsets': vocab.offsets,
+        'vocab.hashes': vocab_hashes,
+        'vocab.order': vocab_order,
+        'index.genre_offsets': index.genre_offsets,
+        'index.genre_postings': index.genre_postings,
+        'index.keyword_offsets': index.keyword_offsets,
+        'index.keyword_postings': index.keyword_postings,
+    }
+    arrays.update({f'title_index.{name}': arr for name, arr in TitleIndex.build_arrays(catalog).items()})
+    return arrays
+
+
+def write_snapshot(catalog: Catalog, path: str, sources: Optional[Dict[str, float]] = None,
+                   index: Optional[TermIndex] = None) -> str:
+    """Escribe el catálogo (columnas, vocabulario, índice invertido e índice de títulos) en un fichero binario."""
+    index = index or TermIndex(catalog)
+    arrays = _catalog_arrays(catalog, index)
+    header = {
+        'format_version': FORMAT_VERSION,
+        'n_items': len(catalog),
+        'built_at': time.time(),
+        'sources': sources or {},
+        'content_types': [str(c) for c in catalog.content_types.categories],
+        'arrays': {},
+    }
+    # Dos pasadas: la cabecera se calcula con offsets relativos al inicio de los datos
+    offset = 0
+    for name, arr in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        header['arrays'][name] = {'dtype': arr.dtype.str, 'offset': offset, 'length': int(len(arr))}
+        offset += arr.nbytes
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(8, 'little'))
+        f.write(header_bytes)
+        for name, arr in arrays.items():
+            f.seek(data_start + header['arrays'][name]['offset'])
+            f.write(np.ascontiguousarray(arr).data)
+        f.truncate(data_start + offset)
+    # Se renombra al final: los lectores nunca ven un fichero a medias
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_header(path: str) -> dict:
+    """Lee sólo la cabecera (para comprobar versión y frescura sin mapear datos)."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} no es un snapshot de catálogo")
+        size = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(size).decode('utf-8'))
+    if header.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"{path}: versión de formato no soportada {header.get('format_version')}")
+    header['data_start'] = -(-(len(MAGIC) + 8 + size) // ALIGNMENT) * ALIGNMENT
+    return header
+
+
+def open_snapshot(path: str) -> SnapshotFile:
+    """
+    Abre un snapshot con `mmap` de sólo lectura: los arrays son vistas sin copia que los procesos comparten
+    y no se reconstruye ningún índice.
+    """
+    header = read_header(path)
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def array(name: str) -> np.ndarray:
+        spec = header['arrays'][name]
+        return np.frombuffer(mm, dtype=np.dtype(spec['dtype']), count=spec['length'],
+                             offset=header['data_start'] + spec['offset'])
+
+    vocab = StringColumn(array('vocab.data'), array('vocab.offsets'))
+    catalog = Catalog(
+        ids=array('ids'),
+        titles=StringColumn(array('titles.data'), array('titles.offsets')),
+        content_types=pd.Categorical.from_codes(array('content_types.codes'), categories=header['content_types']),
+        descriptions=StringColumn(array('descriptions.data'), array('descriptions.offsets')),
+        genres=TermColumn(array('genres.offsets'), array('genres.values')),
+        keywords=TermColumn(array('keywords.offsets'), array('keywords.values')),
+        vocab=Vocabulary.from_column(vocab, array('vocab.hashes'), array('vocab.order')),
+        dates=array('dates'),
+        available=array('available'),
+    )
+    index = TermIndex.from_arrays(
+        array('index.genre_offsets'), array('index.genre_postings'),
+        array('index.keyword_offsets'), array('index.keyword_postings'),
+    )
+    title_arrays = {name[len('title_index.'):]: array(name) for name in header['arrays']
+                    if name.startswith('title_index.')}
+    return SnapshotFile(catalog=catalog, index=index, title_arrays=title_arrays, sources=header['sources'],
+                        built_at=header['built_at'], path=path)
+
+
+def is_fresh(path: str, sources: Dict[str, float]) -> bool:
+    """True si el snapshot existe, es de este formato y se generó con estos mtimes."""
+    try:
+        return read_header(path)['sources'] == sources
+    except (OSError, ValueError):
+        return False
+
+
+if __name__ == "__main__":
+    from src.catalog_store import CatalogStore
+    from src.data_loader import load_catalog
+
+    parser = argparse.ArgumentParser(description="Compila Data/*.json en un snapshot binario del catálogo.")
+    parser.add_argument("data_dir", nargs="?", default="Data")
+    parser.add_argument("-o", "--output", default=None, help="ruta del snapshot (por defecto <data_dir>/catalog.snap)")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(args.data_dir, "catalog.snap")
+    sources = CatalogStore(args.data_dir).scan_mtimes()
+    write_snapshot(load_catalog(args.data_dir), output, sources=sources)
+    print(f"Snapshot escrito en {output}")
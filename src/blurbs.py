@@ -0,0 +1,359 @@
+"""
+Justificaciones precalculadas ("blurbs") para servir /recommendations/text sin
+llamar al LLM en la petición.
+
+- Un trabajo offline (`python -m src.blurbs`) genera una frase corta de "por qué
+  te gustaría" por item del catálogo y por grupo (tipo de contenido, género), con
+  concurrencia acotada y límite de peticiones por segundo, y las guarda en SQLite.
+  Es reanudable: sólo pide lo que aún no está en la base.
+- En la petición, `compose_paragraph` arma el párrafo con plantillas a partir de
+  esos blurbs y de los géneros/keywords del usuario que casan con cada item.
+
+Uso:
+    python -m src.blurbs Data -o Data/blurbs.db --concurrency 8 --rate 5
+    python -m src.blurbs Data -o /tmp/blurbs.db --stub
+"""
+import os
+import re
+import time
+import asyncio
+import logging
+import sqlite3
+import argparse
+from dataclasses import dataclass
+from itertools import islice
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from src.catalog import Catalog
+from src.recommender import diverse_order
+from src.user_porfile import LikedSummary
+
+logger = logging.getLogger(__name__)
+
+ITEM = 'item'
+GENRE = 'genre'
+MAX_BLURB_CHARS = 240
+
+TYPE_LABELS = {
+    'movie': 'película',
+    'song': 'canción',
+    'merch': 'producto',
+    'theater_event': 'obra de teatro',
+    'concert': 'concierto',
+}
+
+SYSTEM_MSG = (
+    "Eres un experto en contenido cultural (cine, música, eventos y productos). "
+    "Escribe UNA sola frase en español (máximo 25 palabras) que explique por qué le gustaría "
+    "a alguien. Sin comillas, sin nombrar el título y sin preámbulos."
+)
+
+Chat = Callable[[str, str], Awaitable[str]]
+
+
+def item_key(content_type: str, item_id) -> str:
+    return f"{content_type}:{item_id}"
+
+
+def genre_key(content_type: str, genre: str) -> str:
+    return f"{content_type}:{genre.lower()}"
+
+
+def clean_blurb(text: str) -> str:
+    """Una línea, sin comillas envolventes y recortada por palabras a `MAX_BLURB_CHARS`."""
+    text = ' '.join((text or '').split()).strip('"\'«» ')
+    if len(text) > MAX_BLURB_CHARS:
+        text = text[:MAX_BLURB_CHARS].rsplit(' ', 1)[0].rstrip(',;:') + '…'
+    return text
+
+
+@dataclass(frozen=True)
+class Blurbs:
+    """Blurbs en memoria para servir: {clave de item: texto} y {clave de género: texto}."""
+    items: Dict[str, str]
+    genres: Dict[str, str]
+
+    def item(self, content_type: str, item_id) -> Optional[str]:
+        return self.items.get(item_key(content_type, item_id))
+
+    def genre(self, content_type: str, genre: str) -> Optional[str]:
+        return self.genres.get(genre_key(content_type, genre))
+
+    def __len__(self) -> int:
+        return len(self.items) + len(self.genres)
+
+
+class BlurbStore:
+    """Base SQLite de blurbs, una fila por (tipo, clave)."""
+
+    def __init__(self, db_path: str):
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS blurbs (kind TEXT NOT NULL, key TEXT NOT NULL, text TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (kind, key))"
+        )
+        self._db.commit()
+
+    def keys(self, kind: str) -> Set[str]:
+        return {row[0] for row in self._db.execute("SELECT key FROM blurbs WHERE kind = ?", (kind,))}
+
+    def put_many(self, rows: Iterable[Tuple[str, str, str]]):
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO blurbs (kind, key, text, created_at) VALUES (?, ?, ?, ?)",
+            [(kind, key, text, now) for kind, key, text in rows],
+        )
+        self._db.commit()
+
+    def load(self) -> Blurbs:
+        items, genres = {}, {}
+        for kind, key, text in self._db.execute("SELECT kind, key, text FROM blurbs"):
+            (items if kind == ITEM else genres)[key] = text
+        return Blurbs(items, genres)
+
+    def close(self):
+        self._db.close()
+
+    @classmethod
+    def read(cls, db_path: str) -> Blurbs:
+        """Carga todos los blurbs de `db_path` en memoria y cierra la base."""
+        store = cls(db_path)
+        try:
+            return store.load()
+        finally:
+            store.close()
+
+
+@dataclass(frozen=True)
+class BlurbTask:
+    kind: str
+    key: str
+    prompt: str
+
+
+def item_tasks(catalog: Catalog) -> Iterator[BlurbTask]:
+    """Un prompt por item vivo del catálogo."""
+    for pos in range(len(catalog)):
+        if not catalog.is_live(pos):
+            continue
+        content_type = catalog.content_type(pos)
+        prompt = (
+            f"Título: {catalog.titles[pos]}\n"
+            f"Tipo: {TYPE_LABELS.get(content_type, content_type)}\n"
+            f"Géneros: {', '.join(catalog.genres_of(pos))}\n"
+            f"Temas: {', '.join(catalog.keywords_of(pos))}\n"
+            f"Descripción: {catalog.descriptions[pos]}"
+        )
+        yield BlurbTask(ITEM, item_key(content_type, int(catalog.ids[pos])), prompt)
+
+
+def genre_tasks(catalog: Catalog, examples: int = 5) -> Iterator[BlurbTask]:
+    """Un prompt por (tipo de contenido, género), con algunos títulos de ejemplo."""
+    groups: Dict[Tuple[str, str], List[str]] = {}
+    for pos in range(len(catalog)):
+        if not catalog.is_live(pos):
+            continue
+        content_type = catalog.content_type(pos)
+        for genre in catalog.genres_of(pos):
+            titles = groups.setdefault((content_type, genre), [])
+            if len(titles) < examples:
+                titles.append(catalog.titles[pos])
+    for (content_type, genre), titles in groups.items():
+        prompt = (
+            f"Género: {genre}\n"
+            f"Tipo: {TYPE_LABELS.get(content_type, content_type)}\n"
+            f"Ejemplos: {', '.join(titles)}"
+        )
+        yield BlurbTask(GENRE, genre_key(content_type, genre), prompt)
+
+
+class RateLimiter:
+    """Token bucket asíncrono: como mucho `rate` adquisiciones por segundo (ráfagas de `burst`)."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def generate_blurbs(tasks: Iterable[BlurbTask], store: BlurbStore, chat: Chat, concurrency: int = 8,
+                          rate: Optional[float] = None, commit_every: int = 50,
+                          limit: Optional[int] = None) -> Dict[str, int]:
+    """
+    Genera los blurbs que falten en `store` con `concurrency` llamadas en curso y como mucho `rate` por segundo.
+    Guarda cada `commit_every`, así que relanzar el trabajo continúa donde se quedó.
+    """
+    done = {ITEM: store.keys(ITEM), GENRE: store.keys(GENRE)}
+    stats = {'generated': 0, 'failed': 0, 'skipped': 0}
+
+    def missing() -> Iterator[BlurbTask]:
+        # Perezoso: con catálogos grandes no se materializan todos los prompts
+        for task in tasks:
+            if task.key in done[task.kind]:
+                stats['skipped'] += 1
+            else:
+                yield task
+
+    limiter = RateLimiter(rate, burst=concurrency) if rate else None
+    results: List[Tuple[str, str, str]] = []
+    queue = islice(missing(), limit)
+    started = time.perf_counter()
+
+    def commit():
+        if results:
+            store.put_many(results)
+            results.clear()
+
+    async def worker():
+        for task in queue:
+            if limiter is not None:
+                await limiter.acquire()
+            text = clean_blurb(await chat(SYSTEM_MSG, task.prompt))
+            if not text:
+                stats['failed'] += 1
+                continue
+            results.append((task.kind, task.key, text))
+            stats['generated'] += 1
+            if len(results) >= commit_every:
+                commit()
+                logger.info("Blurbs: %d generados, %d fallidos (%.1f/s)", stats['generated'], stats['failed'],
+                            stats['generated'] / (time.perf_counter() - started))
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    finally:
+        commit()
+    return stats
+
+
+_PROMPT_FIELD = re.compile(r'^(Título|Tipo|Géneros|Temas|Género|Ejemplos): (.*)$', re.MULTILINE)
+
+
+async def stub_chat(system_msg: str, prompt: str) -> str:
+    """Generador local y determinista con la misma interfaz que el LLM (pruebas, demos)."""
+    fields = dict(_PROMPT_FIELD.findall(prompt))
+    if 'Género' in fields:
+        return (f"Lo mejor de {fields['Género'].lower()} en formato {fields.get('Tipo', 'variado')}, "
+                f"en la línea de {fields.get('Ejemplos', 'los clásicos del género')}.")
+    genres = fields.get('Géneros', '').lower() or 'su estilo'
+    topics = fields.get('Temas', '')
+    return f"Combina {genres}" + (f" con temas como {topics}" if topics else "") + "."
+
+
+def _join(terms: List[str]) -> str:
+    return terms[0] if len(terms) == 1 else f"{', '.join(terms[:-1])} y {terms[-1]}"
+
+
+def _first_sentence(text: str) -> str:
+    text = ' '.join((text or '').split())
+    match = re.match(r'(.+?[.!?])(\s|$)', text)
+    return clean_blurb(match.group(1) if match else text)
+
+
+def _opening(user_summary: LikedSummary, max_terms: int) -> str:
+    genres = [g.lower() for g in user_summary.genres[:max_terms]]
+    keywords = user_summary.keywords[:max_terms]
+    if genres and keywords:
+        return f"Como te gustan {_join(genres)} y temas como {_join(keywords)}, te proponemos:"
+    if genres or keywords:
+        return f"Por tu interés en {_join(genres or keywords)}, te proponemos:"
+    return "Te proponemos:"
+
+
+def compose_paragraph(candidates_df: pd.DataFrame, user_summary: LikedSummary, top_n: int = 3,
+                      blurbs: Optional[Blurbs] = None, max_terms: int = 3) -> str:
+    """
+    Párrafo sin LLM: elige `top_n` candidatos con la selección local diversificada
+    y, para cada uno, usa su blurb, el del género del usuario que mejor casa (o
+    cualquiera de los suyos) o la primera frase de su descripción, añadiendo los
+    géneros/keywords del usuario que comparte.
+    """
+    if candidates_df.empty:
+        return "No hay recomendaciones disponibles."
+    genre_rank = {g: i for i, g in enumerate(user_summary.genres)}
+    keyword_rank = {k: i for i, k in enumerate(user_summary.keywords)}
+    sentences = [_opening(user_summary, max_terms)]
+    columns = {name: candidates_df[name].tolist()
+               for name in ('id', 'title', 'content_type', 'score', 'genres', 'keywords', 'description')}
+    for i in diverse_order(columns['score'], columns['content_type'], top_n):
+        content_type, item_genres = columns['content_type'][i], columns['genres'][i]
+        genres = sorted((g for g in item_genres if g in genre_rank), key=genre_rank.get)
+        keywords = sorted((k for k in columns['keywords'][i] if k in keyword_rank), key=keyword_rank.get)
+        text = None
+        if blurbs is not None:
+            text = blurbs.item(content_type, columns['id'][i])
+            for genre in genres + item_genres:
+                if text:
+                    break
+                text = blurbs.genre(content_type, genre)
+        text = text or _first_sentence(columns['description'][i])
+        sentence = f"«{columns['title'][i]}» ({TYPE_LABELS.get(content_type, content_type)})"
+        sentence += f": {text}" if text else "."
+        if not sentence.endswith(('.', '!', '?', '…')):
+            sentence += '.'
+        matched = [g.lower() for g in genres[:2]] + keywords[:2]
+        if matched:
+            sentence += f" Encaja con tu gusto por {_join(matched)}."
+        sentences.append(sentence)
+    return ' '.join(sentences)
+
+
+if __name__ == "__main__":
+    from src.data_loader import load_catalog
+
+    parser = argparse.ArgumentParser(description="Genera los blurbs por item y por género del catálogo.")
+    parser.add_argument("data_dir", nargs="?", default="Data")
+    parser.add_argument("-o", "--output", default=None, help="base SQLite (por defecto <data_dir>/blurbs.db)")
+    parser.add_argument("--kinds", default=f"{GENRE},{ITEM}", help="qué generar: item, genre o ambos")
+    parser.add_argument("--concurrency", type=int, default=8, help="llamadas al LLM en curso como máximo")
+    parser.add_argument("--rate", type=float, default=None, help="llamadas por segundo como máximo")
+    parser.add_argument("--limit", type=int, default=None, help="genera como mucho N blurbs en esta ejecución")
+    parser.add_argument("--stub", action="store_true", help="usa el generador local en lugar del LLM")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    kinds = {k.strip() for k in args.kinds.split(',') if k.strip()}
+    unknown = kinds - {ITEM, GENRE}
+    if unknown:
+        parser.error(f"tipos desconocidos: {', '.join(sorted(unknown))}")
+
+    async def main():
+        catalog = load_catalog(args.data_dir)
+        tasks: List[Iterable[BlurbTask]] = []
+        if GENRE in kinds:
+            tasks.append(genre_tasks(catalog))
+        if ITEM in kinds:
+            tasks.append(item_tasks(catalog))
+        justifier = None
+        if args.stub:
+            chat = stub_chat
+        else:
+            from src.llm_justifier import AsyncLLMJustifier
+            justifier = AsyncLLMJustifier(max_concurrency=args.concurrency)
+            chat = justifier.complete
+        store = BlurbStore(args.output or os.path.join(args.data_dir, "blurbs.db"))
+        try:
+            return await generate_blurbs((t for group in tasks for t in group), store, chat,
+                                         concurrency=args.concurrency, rate=args.rate, limit=args.limit)
+        finally:
+            store.close()
+            if justifier is not None:
+                await justifier.aclose()
+
+    stats = asyncio.run(main())
+    print(f"{stats['generated']} blurbs generados, {stats['failed']} fallidos, {stats['skipped']} ya existentes")
@@ -0,0 +1,81 @@
+import threading
+from collections import Counter, OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+from src.catalog import ItemFilter
+from src.title_index import normalize_title
+
+
+CandidateKey = Tuple[Tuple[str, ...], int, str, Optional[ItemFilter]]
+
+
+class CandidateCache:
+    """
+    Caché LRU de candidatos por perfil (títulos, `top_candidates`, motor y filtro) ligada a una versión de catálogo.
+    Cuenta la frecuencia de cada perfil para el precalentador; los resultados se comparten y no deben modificarse.
+    """
+
+    def __init__(self, max_entries: int = 4096, max_tracked: int = 100_000):
+        self.max_entries = max_entries
+        self.max_tracked = max_tracked
+        self._entries: "OrderedDict[CandidateKey, tuple]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._frequency: Counter = Counter()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(liked_titles: Iterable[str], top_candidates: int, engine: str,
+                 item_filter: Optional[ItemFilter] = None) -> CandidateKey:
+        titles = tuple(sorted({normalize_title(t) for t in liked_titles} - {''}))
+        return titles, int(top_candidates), engine, item_filter
+
+    def _advance(self, version: int) -> bool:
+        """Pasa a `version` si es más reciente (descarta las entradas); False si `version` ya es antigua."""
+        if self._version is None or version > self._version:
+            self._entries.clear()
+            self._version = version
+        return version == self._version
+
+    def get(self, version: int, key: CandidateKey, record: bool = True) -> Optional[tuple]:
+        """Resultado cacheado para `key` en `version`; con `record` cuenta la petición."""
+        with self._lock:
+            value = self._entries.get(key) if self._advance(version) else None
+            if value is not None:
+                self._entries.move_to_end(key)
+            if record:
+                self._count(key)
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return value
+
+    def put(self, version: int, key: CandidateKey, value: tuple):
+        with self._lock:
+            # Un resultado calculado sobre una versión ya sustituida no se guarda
+            if not self._advance(version):
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _count(self, key: CandidateKey):
+        self._frequency[key] += 1
+        if len(self._frequency) > self.max_tracked:
+            self._frequency = Counter({k: c // 2 for k, c in self._frequency.most_common(self.max_tracked // 2) if c > 1})
+
+    def seed(self, key: CandidateKey, count: int = 1):
+        """Marca un perfil como frecuente de antemano (p. ej. el perfil por defecto)."""
+        with self._lock:
+            self._frequency[key] += count
+
+    def hot(self, top_k: int) -> List[CandidateKey]:
+        """Los `top_k` perfiles más pedidos."""
+        with self._lock:
+            return [key for key, _ in self._frequency.most_common(top_k)]
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,707 @@
+import hashlib
+from array import array
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class StringColumn:
+    """
+    Columna de cadenas UTF-8 concatenadas en un único buffer de bytes más un
+    array de offsets (int64, longitud n + 1). Evita un objeto `str` por item.
+    """
+
+    __slots__ = ('data', 'offsets')
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, pos: int) -> str:
+        start, end = self.offsets[pos], self.offsets[pos + 1]
+        return self.data[start:end].tobytes().decode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        for pos in range(len(self)):
+            yield self[pos]
+
+    def take(self, positions: Iterable[int]) -> List[str]:
+        return [self[pos] for pos in positions]
+
+    def find(self, values: Iterable[str]) -> np.ndarray:
+        """Posiciones cuyo valor está en `values` (comparación exacta)."""
+        wanted = {v.encode('utf-8') for v in values if isinstance(v, str)}
+        if not wanted or len(self) == 0:
+            return np.empty(0, dtype=np.int64)
+        # Prefiltro vectorizado por longitud en bytes antes de comparar contenido
+        lengths = np.diff(self.offsets)
+        candidates = np.flatnonzero(np.isin(lengths, [len(w) for w in wanted]))
+        found = [pos for pos in candidates.tolist()
+                 if self.data[self.offsets[pos]:self.offsets[pos + 1]].tobytes() in wanted]
+        return np.asarray(found, dtype=np.int64)
+
+    @classmethod
+    def from_strings(cls, values: Iterable[str]) -> 'StringColumn':
+        builder = StringColumnBuilder()
+        for value in values:
+            builder.append(value)
+        return builder.build()
+
+
+class StringColumnBuilder:
+    """Acumula cadenas en un bytearray para construir un `StringColumn`."""
+
+    def __init__(self):
+        self._data = bytearray()
+        self._offsets = array('q', [0])
+
+    def append(self, value: Optional[str]):
+        if value is not None:
+            self._data += str(value).encode('utf-8')
+        self._offsets.append(len(self._data))
+
+    def truncate(self, size: int):
+        del self._offsets[size + 1:]
+        del self._data[self._offsets[-1]:]
+
+    def build(self) -> StringColumn:
+        return StringColumn(
+            np.frombuffer(bytes(self._data), dtype=np.uint8),
+            np.frombuffer(self._offsets, dtype=np.int64).copy(),
+        )
+
+
+class TermColumn:
+    """
+    Listas de términos en formato CSR: `offsets` (n + 1) y `values` (ids de la
+    `Vocabulary`), deduplicadas por fila y en el orden de origen.
+
+    """
+
+    __slots__ = ('offsets', 'values')
+
+    def __init__(self, offsets: np.ndarray, values: np.ndarray):
+        self.offsets = offsets
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def row(self, pos: int) -> np.ndarray:
+        return self.values[self.offsets[pos]:self.offsets[pos + 1]]
+
+    def rows(self, positions: Iterable[int]) -> np.ndarray:
+        """Ids de término de varias filas concatenados."""
+        positions = list(positions)
+        if not positions:
+            return np.empty(0, dtype=self.values.dtype)
+        return np.concatenate([self.row(pos) for pos in positions])
+
+    def entries(self, start: int = 0, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(fila, id de término) de cada término de las filas `start:` (o de `rows`, ordenadas)."""
+        if rows is None:
+            values = self.values[self.offsets[start]:]
+            row_ids = np.repeat(np.arange(start, len(self), dtype=np.int32), np.diff(self.offsets[start:]))
+            return row_ids, values
+        # Términos de las filas elegidas: inicio de cada fila + desplazamiento dentro de ella
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        row_ids = np.repeat(rows.astype(np.int32), lengths)
+        within = np.arange(len(row_ids)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return row_ids, self.values[np.repeat(starts, lengths) + within]
+
+
+class TermColumnBuilder:
+    def __init__(self):
+        self._values = array('i')
+        self._offsets = array('q', [0])
+
+    def append(self, term_ids: Iterable[int]):
+        self._values.extend(dict.fromkeys(term_ids))
+        self._offsets.append(len(self._values))
+
+    def truncate(self, size: int):
+        del self._offsets[size + 1:]
+        del self._values[self._offsets[-1]:]
+
+    def build(self) -> TermColumn:
+        return TermColumn(
+            np.frombuffer(self._offsets, dtype=np.int64).copy(),
+            np.frombuffer(self._values, dtype=np.int32).copy(),
+        )
+
+
+class SegmentedArray:
+    """
+    Array 1-D de sólo lectura sobre dos segmentos (base + delta) sin concatenarlos;
+    `np.asarray` lo materializa.
+
+    """
+
+    __slots__ = ('base', 'delta')
+
+    def __init__(self, base: np.ndarray, delta: np.ndarray):
+        self.base = base
+        self.delta = delta
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.delta)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.base.dtype
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        arr = np.concatenate([self.base, self.delta])
+        return arr if dtype is None else arr.astype(dtype, copy=False)
+
+    def __getitem__(self, index):
+        n_base = len(self.base)
+        if isinstance(index, (int, np.integer)):
+            pos = int(index) + (len(self) if index < 0 else 0)
+            return self.base[pos] if pos < n_base else self.delta[pos - n_base]
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1 and start >= n_base:
+                return self.delta[start - n_base:stop - n_base]
+            if step == 1 and stop <= n_base:
+                return self.base[start:stop]
+            return np.asarray(self)[index]
+        index = np.asarray(index)
+        if index.dtype == bool:
+            return np.concatenate([self.base[index[:n_base]], self.delta[index[n_base:]]])
+        index = index.astype(np.int64, copy=False)
+        out = np.empty(index.shape, dtype=self.dtype)
+        in_base = index < n_base
+        out[in_base] = self.base[index[in_base]]
+        out[~in_base] = self.delta[index[~in_base] - n_base]
+        return out
+
+    def __eq__(self, other) -> np.ndarray:
+        return np.concatenate([self.base == other, self.delta == other])
+
+    def __ne__(self, other) -> np.ndarray:
+        return np.concatenate([self.base != other, self.delta != other])
+
+    __hash__ = None
+
+
+class SegmentedStringColumn:
+    """`StringColumn` de dos segmentos (base + delta); `data`/`offsets` lo materializan."""
+
+    __slots__ = ('base', 'delta')
+
+    def __init__(self, base: StringColumn, delta: StringColumn):
+        self.base = base
+        self.delta = delta
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.delta)
+
+    def __getitem__(self, pos: int) -> str:
+        n_base = len(self.base)
+        return self.base[pos] if pos < n_base else self.delta[pos - n_base]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.base
+        yield from self.delta
+
+    def take(self, positions: Iterable[int]) -> List[str]:
+        return [self[pos] for pos in positions]
+
+    def find(self, values: Iterable[str]) -> np.ndarray:
+        values = list(values)
+        return np.concatenate([self.base.find(values), self.delta.find(values) + len(self.base)])
+
+    @property
+    def data(self) -> np.ndarray:
+        return _concat_strings(self.base, self.delta).data
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return _concat_strings(self.base, self.delta).offsets
+
+
+class SegmentedTermColumn:
+    """`TermColumn` de dos segmentos (base + delta); `offsets`/`values` lo materializan."""
+
+    __slots__ = ('base', 'delta')
+
+    def __init__(self, base: TermColumn, delta: TermColumn):
+        self.base = base
+        self.delta = delta
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.delta)
+
+    def row(self, pos: int) -> np.ndarray:
+        n_base = len(self.base)
+        return self.base.row(pos) if pos < n_base else self.delta.row(pos - n_base)
+
+    def rows(self, positions: Iterable[int]) -> np.ndarray:
+        positions = list(positions)
+        if not positions:
+            return np.empty(0, dtype=np.int32)
+        return np.concatenate([self.row(pos) for pos in positions])
+
+    def entries(self, start: int = 0, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        n_base = len(self.base)
+        if rows is None:
+            parts = [self.base.entries(start)] if start < n_base else []
+            delta_rows, values = self.delta.entries(max(start - n_base, 0))
+        else:
+            parts = [self.base.entries(rows=rows[rows < n_base])]
+            delta_rows, values = self.delta.entries(rows=rows[rows >= n_base] - n_base)
+        parts.append((delta_rows + np.int32(n_base), values))
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return _concat_terms(self.base, self.delta).offsets
+
+    @property
+    def values(self) -> np.ndarray:
+        return _concat_terms(self.base, self.delta).values
+
+
+@dataclass(frozen=True)
+class SegmentedCategorical:
+    """Lo que el catálogo usa de `pd.Categorical` (`codes`, `categories`) con códigos segmentados."""
+    codes: SegmentedArray
+    categories: List[str]
+
+
+def stable_hash(text: str) -> int:
+    """Hash de 63 bits estable entre procesos y reinicios (para índices persistidos)."""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little') >> 1
+
+
+class Vocabulary:
+    """
+    Internado de términos (géneros y keywords) a ids enteros, opcionalmente sobre
+    una base inmutable (`from_column`, `extension()`) con los términos nuevos aparte.
+
+    """
+
+    def __init__(self, terms: Optional[List[str]] = None):
+        self._base: Optional[StringColumn] = None
+        self._base_hashes = self._base_order = None
+        self._root: Optional[Vocabulary] = None
+        self._n_base = 0
+        self._terms: List[str] = list(terms or [])
+        self._ids: Dict[str, int] = {t: i for i, t in enumerate(self._terms)}
+
+    @classmethod
+    def from_column(cls, terms: StringColumn, hashes: np.ndarray, order: np.ndarray) -> 'Vocabulary':
+        """Vocabulario sobre `terms`; `hashes` son los `stable_hash` ordenados y `order` sus ids."""
+        vocab = cls()
+        vocab._base, vocab._base_hashes, vocab._base_order = terms, hashes, order
+        vocab._n_base = len(terms)
+        return vocab
+
+    def extension(self) -> 'Vocabulary':
+        """
+        Vocabulario que puede internar términos nuevos sin modificar este: comparte
+        su raíz y copia sólo los términos añadidos sobre ella (no todo el vocabulario).
+        """
+        vocab = Vocabulary()
+        vocab._root = self._root or self
+        vocab._n_base = len(vocab._root)
+        if self._root is not None:
+            vocab._terms = list(self._terms)
+            vocab._ids = dict(self._ids)
+        return vocab
+
+    def __len__(self) -> int:
+        return self._n_base + len(self._terms)
+
+    @property
+    def terms(self) -> List[str]:
+        """Todos los términos en orden de id (materializa la base)."""
+        if self._root is not None:
+            return self._root.terms + self._terms
+        return (list(self._base) if self._base is not None else []) + self._terms
+
+    def hashed_order(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(hashes ordenados, ids en ese orden), el índice que usa `from_column`."""
+        hashes = np.fromiter((stable_hash(t) for t in self.terms), dtype=np.int64, count=len(self))
+        order = np.argsort(hashes, kind='stable')
+        return hashes[order], order.astype(np.int32)
+
+    def _base_ids(self, terms: List[str]) -> List[Optional[int]]:
+        """Ids en la base de `terms` (None si no están), con una búsqueda vectorizada."""
+        if not self._n_base or not terms:
+            return [None] * len(terms)
+        if self._root is not None:
+            return self._root._ids_of(terms)
+        hashes = np.fromiter((stable_hash(t) for t in terms), dtype=np.int64, count=len(terms))
+        base_hashes, base_order, base = self._base_hashes, self._base_order, self._base
+        ids: List[Optional[int]] = []
+        for term, h, i in zip(terms, hashes.tolist(), np.searchsorted(base_hashes, hashes).tolist()):
+            term_id = None
+            # Colisiones de hash: se comparan los términos con el mismo hash
+            while i < len(base_hashes) and base_hashes[i] == h:
+                if base[base_order[i]] == term:
+                    term_id = int(base_order[i])
+                    break
+                i += 1
+            ids.append(term_id)
+        return ids
+
+    def _ids_of(self, terms: List[str]) -> List[Optional[int]]:
+        """Ids de `terms` en todo el vocabulario (None si no están)."""
+        ids = [self._ids.get(term) for term in terms]
+        missing = [i for i, term_id in enumerate(ids) if term_id is None]
+        for i, term_id in zip(missing, self._base_ids([terms[i] for i in missing])):
+            ids[i] = term_id
+        return ids
+
+    def _get(self, term: str) -> Optional[int]:
+        term_id = self._ids.get(term)
+        if term_id is None:
+            term_id = self._base_ids([term])[0]
+        return term_id
+
+    def intern(self, term: str) -> int:
+        term_id = self._get(term)
+        if term_id is None:
+            term_id = len(self)
+            self._ids[term] = term_id
+            self._terms.append(term)
+        return term_id
+
+    def lookup(self, terms: Iterable[str]) -> np.ndarray:
+        """Ids de los términos conocidos (los desconocidos se ignoran)."""
+        found, missing = set(), []
+        for term in terms:
+            term_id = self._ids.get(term)
+            if term_id is not None:
+                found.add(term_id)
+            else:
+                missing.append(term)
+        found.update(term_id for term_id in self._base_ids(missing) if term_id is not None)
+        return np.fromiter(sorted(found), dtype=np.int32, count=len(found))
+
+    def _term(self, term_id: int) -> str:
+        if term_id >= self._n_base:
+            return self._terms[term_id - self._n_base]
+        return self._root._term(term_id) if self._root is not None else self._base[term_id]
+
+    def decode(self, term_ids: Iterable[int]) -> List[str]:
+        return [self._term(i) for i in term_ids]
+
+
+# Atributos numéricos opcionales por item
+NO_DATE = np.iinfo(np.int32).min
+UNKNOWN_AVAILABILITY = -1
+_EPOCH = date(1970, 1, 1)
+
+
+def date_to_days(value: date) -> int:
+    """Fecha como días desde 1970-01-01 (la representación de `Catalog.dates`)."""
+    return (value - _EPOCH).days
+
+
+class Catalog:
+    """
+    Catálogo unificado en columnas compactas; las posiciones (0..n-1) son el índice
+    de fila de todo el pipeline. Las bajas conservan su posición hasta `compact()`.
+
+    """
+
+    COLUMNS = ['id', 'title', 'content_type', 'genres', 'keywords', 'description']
+
+    def __init__(self, ids: np.ndarray, titles: StringColumn, content_types: pd.Categorical,
+                 descriptions: StringColumn, genres: TermColumn, keywords: TermColumn,
+                 vocab: Vocabulary, deleted_positions: Optional[np.ndarray] = None,
+                 dates: Optional[np.ndarray] = None, available: Optional[np.ndarray] = None):
+        self.ids = ids
+        self.titles = titles
+        self.content_types = content_types
+        self.descriptions = descriptions
+        self.genres = genres
+        self.keywords = keywords
+        self.vocab = vocab
+        # Bajas de actualizaciones incrementales (ordenadas): no se recomiendan ni resuelven
+        self.deleted_positions = deleted_positions if deleted_positions is not None else np.empty(0, dtype=np.int64)
+        # Para filtrar al puntuar: días desde 1970-01-01 y entradas o stock disponibles
+        self.dates = dates if dates is not None else np.full(len(ids), NO_DATE, dtype=np.int32)
+        self.available = available if available is not None else np.full(len(ids), UNKNOWN_AVAILABILITY, dtype=np.int32)
+        # (base, delta) si las columnas son segmentadas (ver `extend`)
+        self.segments: Optional[Tuple[Catalog, Catalog]] = None
+        self._deleted: Optional[np.ndarray] = None
+        self._partitions: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0
+
+    @property
+    def live_count(self) -> int:
+        return len(self) - len(self.deleted_positions)
+
+    @property
+    def deleted(self) -> Optional[np.ndarray]:
+        """Máscara de bajas (None si no hay); se calcula la primera vez que se pide."""
+        if not len(self.deleted_positions):
+            return None
+        if self._deleted is None:
+            deleted = np.zeros(len(self), dtype=bool)
+            deleted[self.deleted_positions] = True
+            self._deleted = deleted
+        return self._deleted
+
+    def is_live(self, pos: int) -> bool:
+        deleted = self.deleted_positions
+        i = np.searchsorted(deleted, pos)
+        return i == len(deleted) or deleted[i] != pos
+
+    def content_type(self, pos: int) -> str:
+        return self.content_types.categories[self.content_types.codes[pos]]
+
+    def partition(self, content_type: str) -> np.ndarray:
+        """
+        Posiciones (ordenadas) de un dominio. Se calcula una vez por versión de
+        catálogo; un content_type desconocido da una partición vacía.
+        """
+        positions = self._partitions.get(content_type)
+        if positions is None and self.segments is not None:
+            base, delta = self.segments
+            positions = np.concatenate([base.partition(content_type), delta.partition(content_type) + len(base)])
+            self._partitions[content_type] = positions
+        elif positions is None:
+            categories = list(self.content_types.categories)
+            if content_type in categories:
+                positions = np.flatnonzero(self.content_types.codes == categories.index(content_type))
+            else:
+                positions = np.empty(0, dtype=np.int64)
+            self._partitions[content_type] = positions
+        return positions
+
+    def genres_of(self, pos: int) -> List[str]:
+        return self.vocab.decode(self.genres.row(pos))
+
+    def keywords_of(self, pos: int) -> List[str]:
+        return self.vocab.decode(self.keywords.row(pos))
+
+    def find_titles(self, titles: Iterable[str]) -> List[int]:
+        """Posiciones (en orden de catálogo) cuyo título coincide exactamente."""
+        return self.titles.find(titles).tolist()
+
+    def to_frame(self, positions: Optional[Sequence[int]] = None) -> pd.DataFrame:
+        """
+        Filas como DataFrame con listas de términos (esquema clásico), indexado por
+        posición. Pensado para subconjuntos pequeños (candidatos, favoritos).
+
+        """
+        if positions is None:
+            positions = range(len(self))
+        positions = [int(p) for p in positions]
+        return pd.DataFrame({
+            'id': self.ids[positions] if positions else np.empty(0, dtype=self.ids.dtype),
+            'title': self.titles.take(positions),
+            'content_type': [self.content_type(p) for p in positions],
+            'genres': [self.genres_of(p) for p in positions],
+            'keywords': [self.keywords_of(p) for p in positions],
+            'description': self.descriptions.take(positions),
+        }, index=pd.Index(positions, dtype='int64'), columns=self.COLUMNS)
+
+    def builder(self) -> 'CatalogBuilder':
+        """Constructor de filas nuevas compatible con este catálogo (mismos ids de término y tipos)."""
+        builder = CatalogBuilder(vocab=self.vocab.extension())
+        for category in self.content_types.categories:
+            builder.add_content_type(category)
+        return builder
+
+    def extend(self, delta: 'Catalog', deleted_positions: np.ndarray) -> 'Catalog':
+        """
+        Copy-on-write: catálogo con las filas de `delta` (de `builder()`) al final y las
+        bajas `deleted_positions`. Comparte las columnas base; el delta se copia.
+
+        """
+        base, previous = self.segments or (self, None)
+        if previous is not None:
+            delta = previous._concat(delta)
+        codes = SegmentedArray(np.asarray(base.content_types.codes, dtype=np.int8),
+                               np.asarray(delta.content_types.codes, dtype=np.int8))
+        catalog = Catalog(
+            ids=SegmentedArray(base.ids, delta.ids),
+            titles=SegmentedStringColumn(base.titles, delta.titles),
+            content_types=SegmentedCategorical(codes, list(delta.content_types.categories)),
+            descriptions=SegmentedStringColumn(base.descriptions, delta.descriptions),
+            genres=SegmentedTermColumn(base.genres, delta.genres),
+            keywords=SegmentedTermColumn(base.keywords, delta.keywords),
+            vocab=delta.vocab,
+            deleted_positions=deleted_positions,
+            dates=SegmentedArray(base.dates, delta.dates),
+            available=SegmentedArray(base.available, delta.available),
+        )
+        catalog.segments = (base, delta)
+        return catalog
+
+    def _concat(self, delta: 'Catalog') -> 'Catalog':
+        """Catálogo plano con las filas de este y las de `delta` (de `builder()`) a continuación."""
+        codes = np.concatenate([self.content_types.codes, delta.content_types.codes]).astype(np.int8)
+        return Catalog(
+            ids=np.concatenate([self.ids, delta.ids]),
+            titles=_concat_strings(self.titles, delta.titles),
+            content_types=pd.Categorical.from_codes(codes, categories=delta.content_types.categories),
+            descriptions=_concat_strings(self.descriptions, delta.descriptions),
+            genres=_concat_terms(self.genres, delta.genres),
+            keywords=_concat_terms(self.keywords, delta.keywords),
+            vocab=delta.vocab,
+            dates=np.concatenate([self.dates, delta.dates]),
+            available=np.concatenate([self.available, delta.available]),
+        )
+
+    def compact(self) -> 'Catalog':
+        """Catálogo sin las filas dadas de baja (posiciones renumeradas)."""
+        if self.deleted is None and self.segments is None:
+            return self
+        builder = CatalogBuilder()
+        live = np.setdiff1d(np.arange(len(self)), self.deleted_positions, assume_unique=True)
+        for pos in live.tolist():
+            builder.append(int(self.ids[pos]), self.titles[pos], self.content_type(pos),
+                           self.genres_of(pos), self.keywords_of(pos), self.descriptions[pos],
+                           int(self.dates[pos]), int(self.available[pos]))
+        return builder.build()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'Catalog':
+        """Convierte un DataFrame con el esquema clásico (listas de términos)."""
+        builder = CatalogBuilder()
+        for row in zip(*(df[c] for c in cls.COLUMNS)):
+            builder.append(*row)
+        return builder.build()
+
+
+@dataclass(frozen=True)
+class ItemFilter:
+    """
+    Restricciones (dominio, fechas, disponibilidad) que se evalúan al puntuar, antes
+    del top-N. Hashable: forma parte de la clave de la caché de candidatos.
+
+    """
+    # Sólo ese dominio: los motores puntúan su partición
+    content_type: Optional[str] = None
+    # Días desde 1970-01-01 (`date_to_days`); los items sin fecha no pasan
+    date_from: Optional[int] = None
+    date_to: Optional[int] = None
+    # Descarta items agotados; los que no tienen ese dato (películas, canciones) pasan
+    available: bool = False
+
+    @property
+    def has_predicates(self) -> bool:
+        return self.date_from is not None or self.date_to is not None or self.available
+
+    def mask(self, catalog: 'Catalog', positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Máscara booleana de las `positions` (todas si es None) que cumplen el filtro."""
+        index = slice(None) if positions is None else positions
+        keep = np.ones(len(catalog) if positions is None else len(positions), dtype=bool)
+        if self.content_type is not None:
+            categories = list(catalog.content_types.categories)
+            if self.content_type not in categories:
+                return np.zeros_like(keep)
+            keep &= catalog.content_types.codes[index] == categories.index(self.content_type)
+        if self.date_from is not None or self.date_to is not None:
+            dates = catalog.dates[index]
+            keep &= dates != NO_DATE
+            if self.date_from is not None:
+                keep &= dates >= self.date_from
+            if self.date_to is not None:
+                keep &= dates <= self.date_to
+        if self.available:
+            keep &= catalog.available[index] != 0
+        return keep
+
+
+def _concat_strings(a: StringColumn, b: StringColumn) -> StringColumn:
+    return StringColumn(np.concatenate([a.data, b.data]),
+                        np.concatenate([a.offsets, b.offsets[1:] + a.offsets[-1]]))
+
+
+def _concat_terms(a: TermColumn, b: TermColumn) -> TermColumn:
+    return TermColumn(np.concatenate([a.offsets, b.offsets[1:] + a.offsets[-1]]),
+                      np.concatenate([a.values, b.values]).astype(np.int32))
+
+
+def _as_int_id(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def _as_terms(value) -> List[str]:
+    if isinstance(value, list):
+        return [t for t in value if isinstance(t, str)]
+    if isinstance(value, str):
+        return [value]
+    return []
+
+
+class CatalogBuilder:
+    """Construye un `Catalog` fila a fila sin materializar objetos por item."""
+
+    def __init__(self, vocab: Optional[Vocabulary] = None):
+        self.vocab = vocab or Vocabulary()
+        self._ids = array('q')
+        self._titles = StringColumnBuilder()
+        self._content_codes = array('b')
+        self._content_categories: Dict[str, int] = {}
+        self._descriptions = StringColumnBuilder()
+        self._genres = TermColumnBuilder()
+        self._keywords = TermColumnBuilder()
+        self._dates = array('i')
+        self._available = array('i')
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add_content_type(self, content_type: str) -> int:
+        return self._content_categories.setdefault(content_type, len(self._content_categories))
+
+    def append(self, item_id, title, content_type: str, genres, keywords, description,
+               date: Optional[int] = None, available: Optional[int] = None):
+        intern = self.vocab.intern
+        self._ids.append(_as_int_id(item_id))
+        self._titles.append(title)
+        self._content_codes.append(self.add_content_type(content_type))
+        self._genres.append(intern(t) for t in _as_terms(genres))
+        self._keywords.append(intern(t) for t in _as_terms(keywords))
+        self._descriptions.append(description if isinstance(description, str) else '')
+        self._dates.append(NO_DATE if date is None else date)
+        self._available.append(UNKNOWN_AVAILABILITY if available is None else available)
+
+    def truncate(self, size: int):
+        """Descarta las filas a partir de `size` (p. ej. un fichero que falló a mitad)."""
+        del self._ids[size:]
+        del self._content_codes[size:]
+        del self._dates[size:]
+        del self._available[size:]
+        for column in (self._titles, self._descriptions, self._genres, self._keywords):
+            column.truncate(size)
+
+    def build(self) -> Catalog:
+        categories = sorted(self._content_categories, key=self._content_categories.get)
+        codes = np.frombuffer(self._content_codes, dtype=np.int8).copy()
+        return Catalog(
+            ids=np.frombuffer(self._ids, dtype=np.int64).copy(),
+            titles=self._titles.build(),
+            content_types=pd.Categorical.from_codes(codes, categories=categories),
+            descriptions=self._descriptions.build(),
+            genres=self._genres.build(),
+            keywords=self._keywords.build(),
+            vocab=self.vocab,
+            dates=np.frombuffer(self._dates, dtype=np.int32).copy(),
+            available=np.frombuffer(self._available, dtype=np.int32).copy(),
+        )
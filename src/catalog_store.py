@@ -0,0 +1,244 @@
+import hashlib
+import logging
+import os
+import time
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from src.binary_snapshot import SnapshotFile, is_fresh, open_snapshot, write_snapshot
+from src.catalog import Catalog
+from src.catalog_updates import CatalogUpdate, UpdateFeed, apply_updates
+from src.data_loader import SOURCE_EXTENSIONS, load_catalog
+from src.embeddings import EmbeddingRecommender
+from src.prompt_fragments import PromptFragments
+from src.recommender import Recommender, TermIndex
+from src.title_index import TitleIndex
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Versión inmutable del catálogo unificado; una recarga crea otra y sustituye la referencia sin tocar esta."""
+    version: int
+    catalog: Catalog
+    recommender: Recommender
+    title_index: TitleIndex
+    mtimes: Dict[str, float]
+    loaded_at: float
+    semantic: Optional[EmbeddingRecommender] = None
+    # Filas cubiertas por los índices base; las posteriores son el delta incremental
+    base_size: int = 0
+    # (ruta, built_at) del snapshot binario si este catálogo es exactamente ese fichero
+    source_file: Optional[Tuple[str, float]] = None
+    # Líneas de candidato de los prompts del LLM, calculadas una vez por item y versión
+    fragments: Optional[PromptFragments] = None
+    # Identidad del contenido: igual en todos los workers y reinicios mientras no cambien
+    # los ficheros ni las actualizaciones aplicadas (`version` es un contador por proceso)
+    tag: str = ''
+
+    @property
+    def delta_size(self) -> int:
+        return len(self.catalog) - self.base_size
+
+
+class CatalogStore:
+    """
+    Mantiene el snapshot vigente del catálogo y lo recarga cuando cambian los mtimes de `data_dir`.
+    Opcionalmente lo comparte vía snapshot binario, añade el motor semántico y aplica actualizaciones incrementales.
+    """
+
+    COMPACT_MIN_ROWS = 1024
+    COMPACT_FRACTION = 0.1
+
+    def __init__(self, data_dir: str = 'Data', poll_interval: float = 2.0, snapshot_path: Optional[str] = None,
+                 image_url: str = '', title_match_threshold: float = 0.45, semantic: bool = False,
+                 embeddings_path: Optional[str] = None, updates_dir: Optional[str] = None):
+        self.data_dir = data_dir
+        self.image_url = image_url
+        self.title_match_threshold = title_match_threshold
+        self.poll_interval = poll_interval
+        self.snapshot_path = snapshot_path
+        self.semantic = semantic
+        self.embeddings_path = embeddings_path
+        self.feed = UpdateFeed(updates_dir) if updates_dir else None
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._reload_lock = threading.Lock()
+
+    def scan_mtimes(self) -> Dict[str, float]:
+        mtimes = {}
+        if not os.path.isdir(self.data_dir):
+            return mtimes
+        for name in sorted(os.listdir(self.data_dir)):
+            if name.endswith(SOURCE_EXTENSIONS):
+                path = os.path.join(self.data_dir, name)
+                try:
+                    mtimes[name] = os.stat(path).st_mtime
+                except FileNotFoundError:
+                    continue
+        return mtimes
+
+    def _load_catalog(self, mtimes: Dict[str, float], strict: bool = False) -> Tuple[Catalog, Optional[SnapshotFile]]:
+        if self.snapshot_path:
+            try:
+                if not is_fresh(self.snapshot_path, mtimes):
+                    write_snapshot(load_catalog(self.data_dir, strict), self.snapshot_path, sources=mtimes)
+                snapshot_file = open_snapshot(self.snapshot_path)
+                return snapshot_file.catalog, snapshot_file
+            except Exception as e:
+                logger.warning("No se pudo usar el snapshot binario %s: %s", self.snapshot_path, e)
+        return load_catalog(self.data_dir, strict), None
+
+    def _build(self, mtimes: Dict[str, float], catalog: Optional[Catalog] = None, tag: Optional[str] = None,
+               semantic: Optional[EmbeddingRecommender] = None, strict: bool = False) -> CatalogSnapshot:
+        version = self._snapshot.version + 1 if self._snapshot else 1
+        snapshot_file = None
+        from_sources = catalog is None
+        if from_sources:
+            catalog, snapshot_file = self._load_catalog(mtimes, strict)
+        recommender = Recommender()
+        recommender.load(catalog, index=snapshot_file.index if snapshot_file else None)
+        if self.semantic and semantic is None:
+            semantic = EmbeddingRecommender()
+            # Un catálogo compactado ya no corresponde a los ficheros: no se persiste
+            semantic.load(catalog, path=self.embeddings_path if from_sources else None, sources=mtimes)
+        if snapshot_file is not None:
+            title_index = TitleIndex.from_arrays(catalog, snapshot_file.title_arrays, image_url=self.image_url,
+                                                 match_threshold=self.title_match_threshold)
+        else:
+            title_index = TitleIndex(catalog, image_url=self.image_url, match_threshold=self.title_match_threshold)
+        return CatalogSnapshot(
+            version=version,
+            catalog=catalog,
+            recommender=recommender,
+            title_index=title_index,
+            mtimes=mtimes,
+            loaded_at=time.time(),
+            semantic=semantic,
+            base_size=len(catalog),
+            source_file=(snapshot_file.path, snapshot_file.built_at) if snapshot_file else None,
+            fragments=PromptFragments(catalog),
+            tag=tag or _content_tag(repr(sorted(mtimes.items()))),
+        )
+
+    def load(self) -> CatalogSnapshot:
+        """Construye el snapshot inicial (se llama una vez al arrancar la app)."""
+        with self._reload_lock:
+            self._snapshot = self._build(self.scan_mtimes())
+            return self._snapshot
+
+    def current(self) -> CatalogSnapshot:
+        """Devuelve el snapshot vigente; nunca recarga en el camino de la petición."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.load()
+        return snapshot
+
+    def refresh(self) -> bool:
+        """
+        Recarga el catálogo si algún fichero cambió. Devuelve True si hubo swap.
+        Si un fichero no se puede leer (p. ej. a medio escribir) lanza la excepción
+        y se conserva el snapshot vigente; la recarga se reintenta en el siguiente ciclo.
+        """
+        with self._reload_lock:
+            mtimes = self.scan_mtimes()
+            if self._snapshot is not None and mtimes == self._snapshot.mtimes:
+                return False
+            new_snapshot = self._build(mtimes, strict=self._snapshot is not None)
+            # Asignación de referencia: atómica para los lectores
+            self._snapshot = new_snapshot
+            # El feed de actualizaciones se reaplica sobre el catálogo recién cargado
+            if self.feed is not None:
+                self.feed.reset()
+            logger.info("Catálogo recargado (versión %d).", new_snapshot.version)
+            return True
+
+    def apply_updates(self, updates: Iterable[CatalogUpdate]) -> CatalogSnapshot:
+        """
+        Aplica upserts/bajas sin reconstruir el catálogo: la nueva versión comparte
+        los índices base del snapshot vigente y sólo indexa las filas del delta.
+        Las peticiones en curso siguen leyendo su snapshot sin cambios.
+        """
+        updates = list(updates)
+        with self._reload_lock:
+            snapshot = self._snapshot or self._build(self.scan_mtimes())
+            if not updates:
+                return snapshot
+            catalog = apply_updates(snapshot.catalog, snapshot.title_index, updates)
+            start = snapshot.base_size
+            self._snapshot = CatalogSnapshot(
+                version=snapshot.version + 1,
+                catalog=catalog,
+                recommender=snapshot.recommender.with_catalog(catalog, start),
+                title_index=snapshot.title_index.with_catalog(catalog, start),
+                mtimes=snapshot.mtimes,
+                loaded_at=time.time(),
+                semantic=snapshot.semantic.with_catalog(catalog) if snapshot.semantic else None,
+                base_size=start,
+                fragments=snapshot.fragments.with_catalog(catalog, len(snapshot.catalog)) if snapshot.fragments else None,
+                tag=_content_tag(snapshot.tag, repr(updates)),
+            )
+            return self._snapshot
+
+    def needs_compaction(self) -> bool:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return False
+        return snapshot.delta_size > max(self.COMPACT_MIN_ROWS, int(snapshot.base_size * self.COMPACT_FRACTION))
+
+    def compact(self) -> bool:
+        """Reconstruye los índices completos sin bajas cuando el delta ha crecido."""
+        with self._reload_lock:
+            snapshot = self._snapshot
+            if snapshot is None or (snapshot.delta_size == 0 and snapshot.catalog.deleted is None):
+                return False
+            catalog = snapshot.catalog.compact()
+            semantic = None
+            if snapshot.semantic is not None:
+                # Los vectores ya calculados se reutilizan; sólo se reconstruye el índice IVF
+                live = np.flatnonzero(~snapshot.catalog.deleted) if snapshot.catalog.deleted is not None \
+                    else np.arange(len(snapshot.catalog))
+                semantic = snapshot.semantic.compacted(catalog, live)
+            # Compactar no cambia el contenido: se conserva el tag
+            self._snapshot = self._build(snapshot.mtimes, catalog=catalog, tag=snapshot.tag, semantic=semantic)
+            logger.info("Catálogo compactado (versión %d, %d items).", self._snapshot.version, len(self._snapshot.catalog))
+            return True
+
+    def poll_updates(self) -> int:
+        """Aplica las líneas nuevas del feed de actualizaciones. Devuelve cuántas había."""
+        if self.feed is None:
+            return 0
+        updates = self.feed.poll()
+        if updates:
+            self.apply_updates(updates)
+        return len(updates)
+
+    async def watch(self):
+        """
+        Bucle de hot reload cada `poll_interval` segundos: recarga si cambian los
+        ficheros base, aplica el feed de actualizaciones y compacta si hace falta.
+        """
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.exception("No se pudo recargar el catálogo: %s", e)
+            try:
+                await asyncio.to_thread(self.poll_updates)
+                if self.needs_compaction():
+                    await asyncio.to_thread(self.compact)
+            except Exception as e:
+                logger.exception("No se pudieron aplicar las actualizaciones del catálogo: %s", e)
+
+
+def _content_tag(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()[:16]
@@ -0,0 +1,138 @@
+import logging
+import os
+import json
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.catalog import Catalog
+from src.data_loader import DOMAIN_SCHEMAS, DomainSchema
+from src.title_index import TitleIndex
+
+logger = logging.getLogger(__name__)
+
+
+OPS = ('upsert', 'delete')
+SCHEMAS_BY_TYPE: Dict[str, DomainSchema] = {schema.content_type: schema for schema in DOMAIN_SCHEMAS}
+
+
+@dataclass(frozen=True)
+class CatalogUpdate:
+    """
+    Cambio sobre un único item, identificado por (content_type, id).
+    - upsert: `record` es el registro con el formato del fichero de origen del dominio
+    - delete: sólo necesita el id
+    """
+    op: str
+    content_type: str
+    item_id: int
+    record: Optional[dict] = None
+
+    @property
+    def key(self) -> Tuple[str, int]:
+        return self.content_type, self.item_id
+
+
+def parse_update(obj) -> CatalogUpdate:
+    """
+    Valida una actualización en JSON, p. ej.:
+      {"op": "upsert", "content_type": "concert", "record": {"id": 7, "artist": ...}}
+      {"op": "delete", "content_type": "merch", "id": 5}
+    Lanza ValueError si no es válida.
+    """
+    if not isinstance(obj, dict):
+        raise ValueError("La actualización debe ser un objeto JSON")
+    op = obj.get('op')
+    if op not in OPS:
+        raise ValueError(f"Operación desconocida: {op}. Opciones: {', '.join(OPS)}")
+    content_type = obj.get('content_type')
+    schema = SCHEMAS_BY_TYPE.get(content_type)
+    if schema is None:
+        raise ValueError(f"content_type desconocido: {content_type}")
+    record = obj.get('record')
+    if op == 'upsert':
+        if not isinstance(record, dict):
+            raise ValueError("Un upsert necesita 'record' con el registro completo")
+        item_id = schema.fields['id'](record)
+    else:
+        item_id = obj.get('id', record.get('id') if isinstance(record, dict) else None)
+    try:
+        item_id = int(item_id)
+    except (TypeError, ValueError):
+        raise ValueError(f"id inválido: {item_id!r}")
+    return CatalogUpdate(op, content_type, item_id, record if op == 'upsert' else None)
+
+
+def apply_updates(catalog: Catalog, title_index: TitleIndex, updates: Iterable[CatalogUpdate]) -> Catalog:
+    """
+    Aplica un lote de actualizaciones con copy-on-write y devuelve el nuevo catálogo.
+    Las versiones anteriores se dan de baja y los upserts se añaden al final; dentro del lote gana la última.
+    """
+    latest: Dict[Tuple[str, int], CatalogUpdate] = {}
+    for update in updates:
+        latest.pop(update.key, None)
+        latest[update.key] = update
+
+    deleted = []
+    builder = catalog.builder()
+    for (content_type, item_id), update in latest.items():
+        pos = title_index.lookup(content_type, item_id)
+        if pos is not None:
+            deleted.append(pos)
+        if update.op == 'upsert':
+            schema = SCHEMAS_BY_TYPE[content_type]
+            f, record = schema.fields, update.record
+            builder.append(item_id, f['title'](record), content_type,
+                           f['genres'](record), f['keywords'](record), f['description'](record),
+                           *schema.attributes(record))
+    deleted_positions = np.union1d(catalog.deleted_positions, np.asarray(deleted, dtype=np.int64))
+    return catalog.extend(builder.build(), deleted_positions)
+
+
+class UpdateFeed:
+    """
+    Lee ficheros `.jsonl` de actualizaciones de un directorio como un `tail -f`:
+    recuerda el offset leído de cada fichero y sólo consume líneas completas.
+    Si un fichero se trunca o se rota, se vuelve a leer desde el principio.
+    """
+
+    def __init__(self, updates_dir: str):
+        self.updates_dir = updates_dir
+        self._offsets: Dict[str, int] = {}
+
+    def reset(self):
+        """Vuelve a leer todo (p. ej. tras recargar el catálogo desde los ficheros base)."""
+        self._offsets.clear()
+
+    def poll(self) -> List[CatalogUpdate]:
+        updates = []
+        if not os.path.isdir(self.updates_dir):
+            return updates
+        for name in sorted(os.listdir(self.updates_dir)):
+            if not name.endswith('.jsonl'):
+                continue
+            path = os.path.join(self.updates_dir, name)
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                continue
+            offset = self._offsets.get(name, 0)
+            if size < offset:
+                offset = 0
+            if size == offset:
+                continue
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                data = f.read(size - offset)
+            end = data.rfind(b'\n') + 1
+            self._offsets[name] = offset + end
+            for line in data[:end].splitlines():
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    updates.append(parse_update(json.loads(line)))
+                except ValueError as e:
+                    logger.warning("Actualización ignorada en %s: %s", name, e)
+        return updates
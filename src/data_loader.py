@@ -1,7 +1,15 @@
+import logging
 import os
 import json
+import string
 import pandas as pd
-from typing import List, Dict
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.catalog import Catalog, CatalogBuilder, date_to_days
+
+logger = logging.getLogger(__name__)
 
 def load_movies_from_json(filepath: str) -> pd.DataFrame:
     """
@@ -17,130 +25,263 @@ def load_movies_from_json(filepath: str) -> pd.DataFrame:
         with open(filepath, 'r', encoding='utf-8') as f:
             data = json.load(f)
         df = pd.DataFrame(data)
-        print(f"Cargados {len(df)} películas desde {filepath}")
+        logger.info("Cargados %d películas desde %s", len(df), filepath)
         return df
     except FileNotFoundError:
-        print(f"Error: El archivo no se encontró en {filepath}")
+        logger.error("El archivo no se encontró en %s", filepath)
         return pd.DataFrame()
     except Exception as e:
-        print(f"Ocurrió un error al cargar o procesar el archivo JSON: {e}")
+        logger.error("Ocurrió un error al cargar o procesar el archivo JSON: %s", e)
         return pd.DataFrame()
 
 
 def _ensure_list(x):
     if isinstance(x, list):
         return x
-    if pd.isna(x) or x is None:
+    if x is None or (isinstance(x, float) and pd.isna(x)):
         return []
     return [x]
 
 
-def load_all_content(data_dir: str = 'Data') -> pd.DataFrame:
+def _text(x) -> str:
+    if x is None or (isinstance(x, float) and pd.isna(x)):
+        return ''
+    return str(x)
+
+
+# --- Mapeo declarativo de campos -------------------------------------------------
+# Cada campo del esquema unificado se describe con una función record -> valor.
+
+def field(name: str, default=None) -> Callable[[dict], object]:
+    """Copia el campo `name` del registro de origen."""
+    return lambda r: r.get(name, default)
+
+
+def text(name: str) -> Callable[[dict], str]:
+    """Campo de texto; nulos y ausentes se normalizan a ''."""
+    return lambda r: _text(r.get(name))
+
+
+def template(fmt: str, strip: str = None) -> Callable[[dict], str]:
+    """Compone un texto a partir de varios campos, p. ej. '{artist} - {tour_name}'."""
+    names = [n for _, n, _, _ in string.Formatter().parse(fmt) if n]
+    return lambda r: fmt.format(**{n: _text(r.get(n)) for n in names}).strip(strip)
+
+
+def term_list(name: str) -> Callable[[dict], List[str]]:
+    """Lista de términos (géneros/keywords); escalares se envuelven en lista."""
+    return lambda r: _ensure_list(r.get(name) or [])
+
+
+def single_term(name: str) -> Callable[[dict], List[str]]:
+    """Un único término de texto convertido en lista, p. ej. merch `genres = [category]`."""
+    def get(r):
+        value = r.get(name)
+        return [value] if isinstance(value, str) and value else []
+    return get
+
+
+def event_date(name: str) -> Callable[[dict], Optional[int]]:
+    """Fecha ISO (YYYY-MM-DD) como días desde 1970-01-01; None si falta o no es válida."""
+    def get(r):
+        value = r.get(name)
+        try:
+            return date_to_days(date.fromisoformat(value[:10]))
+        except (TypeError, ValueError):
+            return None
+    return get
+
+
+def quantity(path: str) -> Callable[[dict], Optional[int]]:
+    """Entero no negativo en un campo, admite anidados con puntos: 'tickets.available'."""
+    names = path.split('.')
+
+    def get(r):
+        value = r
+        for name in names:
+            value = value.get(name) if isinstance(value, dict) else None
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        return max(0, int(value))
+    return get
+
+
+@dataclass(frozen=True)
+class DomainSchema:
     """
-    Carga y normaliza películas, canciones, merch, eventos teatrales y conciertos
-    en un único DataFrame con esquema estándar:
-    [id, title, content_type, genres(list), keywords(list), description(str)]
+    Fichero de origen y mapeo de sus campos al esquema unificado. `date` y
+    `available` son opcionales: sólo los dominios con eventos o stock los tienen.
     """
-    items = []
+    source: str
+    content_type: str
+    fields: Dict[str, Callable[[dict], object]]
 
-    # Movies
-    movies_path = os.path.join(data_dir, 'movies.json')
-    if os.path.exists(movies_path):
-        try:
-            df = pd.read_json(movies_path)
-            for _, r in df.iterrows():
-                items.append({
-                    'id': r.get('id'),
-                    'title': r.get('title'),
-                    'content_type': 'movie',
-                    'genres': r.get('genres', []) or [],
-                    'keywords': r.get('keywords', []) or [],
-                    'description': r.get('overview', '')
-                })
-        except Exception as e:
-            print(f"No se pudo cargar movies: {e}")
+    def attributes(self, record: dict) -> Tuple[Optional[int], Optional[int]]:
+        """(fecha, disponibilidad) del registro para `CatalogBuilder.append`."""
+        get_date, get_available = self.fields.get('date'), self.fields.get('available')
+        return (get_date(record) if get_date else None,
+                get_available(record) if get_available else None)
 
-    # Songs
-    songs_path = os.path.join(data_dir, 'songs.json')
-    if os.path.exists(songs_path):
-        try:
-            df = pd.read_json(songs_path)
-            for _, r in df.iterrows():
-                desc = f"{r.get('artist', '')} - {r.get('album', '')} ({r.get('year', '')}). {r.get('title', '')}"
-                items.append({
-                    'id': r.get('id'),
-                    'title': r.get('title'),
-                    'content_type': 'song',
-                    'genres': r.get('genres', []) or [],
-                    'keywords': r.get('keywords', []) or [],
-                    'description': desc.strip()
-                })
-        except Exception as e:
-            print(f"No se pudo cargar songs: {e}")
 
-    # Merch
-    merch_path = os.path.join(data_dir, 'merch.json')
-    if os.path.exists(merch_path):
-        try:
-            df = pd.read_json(merch_path)
-            for _, r in df.iterrows():
-                category = r.get('category')
-                items.append({
-                    'id': r.get('id'),
-                    'title': r.get('name'),
-                    'content_type': 'merch',
-                    'genres': [category] if isinstance(category, str) and category else [],
-                    'keywords': r.get('keywords', []) or [],
-                    'description': r.get('description', '')
-                })
-        except Exception as e:
-            print(f"No se pudo cargar merch: {e}")
+DOMAIN_SCHEMAS: List[DomainSchema] = [
+    DomainSchema('movies', 'movie', {
+        'id': field('id'),
+        'title': field('title'),
+        'genres': term_list('genres'),
+        'keywords': term_list('keywords'),
+        'description': text('overview'),
+    }),
+    DomainSchema('songs', 'song', {
+        'id': field('id'),
+        'title': field('title'),
+        'genres': term_list('genres'),
+        'keywords': term_list('keywords'),
+        'description': template('{artist} - {album} ({year}). {title}', strip=' '),
+    }),
+    DomainSchema('merch', 'merch', {
+        'id': field('id'),
+        'title': field('name'),
+        'genres': single_term('category'),
+        'keywords': term_list('keywords'),
+        'description': text('description'),
+        'available': quantity('stock'),
+    }),
+    DomainSchema('theater_events', 'theater_event', {
+        'id': field('id'),
+        'title': field('title'),
+        'genres': single_term('genre'),
+        'keywords': term_list('keywords'),
+        'description': text('description'),
+        'date': event_date('date'),
+    }),
+    DomainSchema('concerts', 'concert', {
+        'id': field('id'),
+        'title': template('{artist} - {tour_name}', strip=' -'),
+        'genres': term_list('genres'),
+        'keywords': term_list('keywords'),
+        'description': template('{artist} en {venue}, {city} ({date}).', strip=' '),
+        'date': event_date('date'),
+        'available': quantity('tickets.available'),
+    }),
+]
+
+SOURCE_EXTENSIONS = ('.json', '.jsonl')
+READ_CHUNK_SIZE = 1 << 20
+
+
+def domain_source_path(data_dir: str, schema: DomainSchema) -> Optional[str]:
+    """Ruta del fichero de un dominio: `<source>.json` (array) o `<source>.jsonl`."""
+    for ext in SOURCE_EXTENSIONS:
+        path = os.path.join(data_dir, schema.source + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def iter_json_records(filepath: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[dict]:
+    """Itera los registros de un `.jsonl` o de un array `.json` sin cargar el fichero entero en memoria."""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        if filepath.endswith('.jsonl'):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+            return
+
+        decoder = json.JSONDecoder()
+        buf = f.read(chunk_size)
+        eof = not buf
+        pos = 0
+
+        def skip(chars: str):
+            nonlocal pos
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+
+        # Saltar hasta la apertura del array
+        while True:
+            skip(' \t\r\n\ufeff')
+            if pos < len(buf) or eof:
+                break
+            buf, pos = f.read(chunk_size), 0
+            eof = not buf
+        if pos >= len(buf) or buf[pos] != '[':
+            raise ValueError(f"{filepath}: se esperaba un array JSON")
+        pos += 1
+
+        while True:
+            skip(' \t\r\n,')
+            if pos < len(buf) and buf[pos] == ']':
+                return
+            try:
+                if pos >= len(buf):
+                    raise json.JSONDecodeError("buffer agotado", buf, pos)
+                obj, end = decoder.raw_decode(buf, pos)
+                # Un escalar al final del buffer podría estar truncado
+                if end == len(buf) and not eof:
+                    raise json.JSONDecodeError("posible valor truncado", buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            yield obj
+            pos = end
 
-    # Theater events
-    theater_path = os.path.join(data_dir, 'theater_events.json')
-    if os.path.exists(theater_path):
-        try:
-            df = pd.read_json(theater_path)
-            for _, r in df.iterrows():
-                genre = r.get('genre')
-                items.append({
-                    'id': r.get('id'),
-                    'title': r.get('title'),
-                    'content_type': 'theater_event',
-                    'genres': [genre] if isinstance(genre, str) and genre else [],
-                    'keywords': r.get('keywords', []) or [],
-                    'description': r.get('description', '')
-                })
-        except Exception as e:
-            print(f"No se pudo cargar theater_events: {e}")
 
-    # Concerts
-    concerts_path = os.path.join(data_dir, 'concerts.json')
-    if os.path.exists(concerts_path):
+def load_domain(filepath: str, schema: DomainSchema, builder: CatalogBuilder) -> int:
+    """Añade los registros de un dominio directamente al constructor del catálogo."""
+    f = schema.fields
+    get_id, get_title, get_genres = f['id'], f['title'], f['genres']
+    get_keywords, get_description = f['keywords'], f['description']
+    attributes = schema.attributes
+    append = builder.append
+    count = 0
+    for record in iter_json_records(filepath):
+        if not isinstance(record, dict):
+            continue
+        append(get_id(record), get_title(record), schema.content_type,
+               get_genres(record), get_keywords(record), get_description(record), *attributes(record))
+        count += 1
+    return count
+
+
+def load_catalog(data_dir: str = 'Data', strict: bool = False) -> Catalog:
+    """
+    Carga los dominios de `DOMAIN_SCHEMAS` en un `Catalog` compacto leyendo cada fichero en streaming.
+    Con `strict`, un fichero que no se puede leer aborta la carga en lugar de omitirse.
+    """
+    builder = CatalogBuilder()
+
+    for schema in DOMAIN_SCHEMAS:
+        path = domain_source_path(data_dir, schema)
+        if path is None:
+            continue
+        # Si el fichero falla a mitad, se descartan sus filas parciales
+        size = len(builder)
         try:
-            df = pd.read_json(concerts_path)
-            for _, r in df.iterrows():
-                title = f"{r.get('artist', '')} - {r.get('tour_name', '')}".strip(' -')
-                desc = f"{r.get('artist', '')} en {r.get('venue', '')}, {r.get('city', '')} ({r.get('date', '')})."
-                items.append({
-                    'id': r.get('id'),
-                    'title': title,
-                    'content_type': 'concert',
-                    'genres': r.get('genres', []) or [],
-                    'keywords': r.get('keywords', []) or [],
-                    'description': desc.strip()
-                })
+            load_domain(path, schema, builder)
         except Exception as e:
-            print(f"No se pudo cargar concerts: {e}")
+            if strict:
+                raise
+            builder.truncate(size)
+            logger.warning("No se pudo cargar %s: %s", schema.source, e)
 
-    catalog = pd.DataFrame(items)
+    catalog = builder.build()
     if not catalog.empty:
-        # Normalizar columnas faltantes a listas/cadenas
-        catalog['genres'] = catalog['genres'].apply(_ensure_list)
-        catalog['keywords'] = catalog['keywords'].apply(_ensure_list)
-        catalog['description'] = catalog['description'].fillna('')
-        print(f"Catálogo unificado cargado: {len(catalog)} items de múltiples dominios.")
+        logger.info("Catálogo unificado cargado: %d items de múltiples dominios.", len(catalog))
     else:
-        print("No se encontraron items en el catálogo unificado.")
+        logger.warning("No se encontraron items en el catálogo unificado.")
 
     return catalog
+
+
+def load_all_content(data_dir: str = 'Data') -> pd.DataFrame:
+    """
+    Carga y normaliza películas, canciones, merch, eventos teatrales y conciertos
+    en un único DataFrame con esquema estándar:
+    [id, title, content_type, genres(list), keywords(list), description(str)]
+    """
+    return load_catalog(data_dir).to_frame()
@@ -0,0 +1,301 @@
+import logging
+import os
+import re
+import json
+import math
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from src.catalog import Catalog, ItemFilter
+from src.prepocesing import catalog_feature_soup
+from src.title_index import normalize_title
+from src.user_porfile import create_user_profile
+
+logger = logging.getLogger(__name__)
+
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Unigramas y bigramas de palabras sobre el texto normalizado (sin acentos, casefold)."""
+    words = _TOKEN_RE.findall(normalize_title(text))
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class HashingTfidfVectorizer:
+    """
+    Vectorizador local: TF-IDF sobre n-gramas con feature hashing (crc32, estable entre procesos) a `dim` dimensiones.
+    Las frecuencias documentales también van con hashing, así `transform` embebe items nuevos sin el vocabulario.
+    """
+
+    DF_DIM = 1 << 20
+
+    def __init__(self, dim: int = 256, df_dim: int = DF_DIM):
+        self.dim = dim
+        self.df_dim = df_dim
+        self.df = np.zeros(df_dim, dtype=np.int32)
+        self.n_docs = 0
+
+    def _bucket(self, token: str) -> Tuple[int, float]:
+        h = zlib.crc32(token.encode('utf-8'))
+        return h % self.dim, (1.0 if (h >> 16) & 1 else -1.0)
+
+    def fit_transform(self, docs: Iterable[str]) -> np.ndarray:
+        counts: List[Counter] = [Counter(tokenize(doc)) for doc in docs]
+        df = Counter(token for c in counts for token in c)
+        self.df = np.zeros(self.df_dim, dtype=np.int32)
+        hashes = np.fromiter((zlib.crc32(token.encode('utf-8')) % self.df_dim for token in df),
+                             dtype=np.int64, count=len(df))
+        np.add.at(self.df, hashes, np.fromiter(df.values(), dtype=np.int32, count=len(df)))
+        self.n_docs = len(counts)
+        return self._vectorize(counts)
+
+    def transform(self, docs: Iterable[str]) -> np.ndarray:
+        """Embebe documentos nuevos con las frecuencias del ajuste (no las modifica)."""
+        return self._vectorize([Counter(tokenize(doc)) for doc in docs])
+
+    def _idf(self, token: str) -> float:
+        freq = int(self.df[zlib.crc32(token.encode('utf-8')) % self.df_dim])
+        return math.log((1 + self.n_docs) / (1 + freq)) + 1.0
+
+    def _vectorize(self, counts: List[Counter]) -> np.ndarray:
+        tokens = {token for c in counts for token in c}
+        buckets = {token: self._bucket(token) for token in tokens}
+        idf = {token: self._idf(token) for token in tokens}
+
+        indptr, indices, data = [0], [], []
+        for c in counts:
+            for token, tf in c.items():
+                bucket, sign = buckets[token]
+                indices.append(bucket)
+                data.append(sign * (1.0 + math.log(tf)) * idf[token])
+            indptr.append(len(indices))
+        matrix = sp.csr_matrix(
+            (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(counts), self.dim),
+        )
+        vectors = matrix.toarray().astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+class IVFIndex:
+    """
+    Índice ANN tipo IVF: k-means esférico sobre los vectores (producto escalar),
+    cada item se asigna a su centroide y la búsqueda sólo recorre las `nprobe`
+    listas más cercanas a la consulta, así que es sublineal en el catálogo.
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, ids: np.ndarray):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: Optional[int] = None, iterations: int = 10,
+              sample_size: int = 64, seed: int = 0, chunk: int = 65536) -> 'IVFIndex':
+        n = len(vectors)
+        nlist = max(1, min(nlist or int(math.sqrt(n)), n, 4096)) if n else 1
+        rng = np.random.default_rng(seed)
+        if n == 0:
+            return cls(np.zeros((1, vectors.shape[1]), dtype=np.float32), np.zeros(2, dtype=np.int64),
+                       np.empty(0, dtype=np.int32))
+        train = vectors[rng.choice(n, size=min(n, nlist * sample_size), replace=False)]
+        centroids = train[rng.choice(len(train), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, train)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Centroides vacíos conservan su posición anterior
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids).astype(np.float32)
+
+        assign = np.concatenate([
+            np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1) for start in range(0, n, chunk)
+        ])
+        order = np.argsort(assign, kind='stable').astype(np.int32)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+        return cls(centroids, offsets, order)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = min(nprobe, self.nlist)
+        sims = self.centroids @ query
+        probe = np.argpartition(-sims, nprobe - 1)[:nprobe] if nprobe < self.nlist else np.arange(self.nlist)
+        return np.concatenate([self.ids[self.offsets[c]:self.offsets[c + 1]] for c in probe])
+
+
+class EmbeddingRecommender:
+    """
+    Recomendador semántico offline: embeddings TF-IDF con hashing sobre la
+    'feature soup' de cada item (matriz float32), perfil de usuario como media de
+    los embeddings gustados (`create_user_profile`) y búsqueda top-k en un índice IVF.
+    Misma interfaz que `Recommender` para poder elegir motor por petición.
+    """
+
+    FORMAT_VERSION = 2
+
+    def __init__(self, dim: int = 256, nprobe: int = 8):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.catalog = None
+        self.vectors = None
+        self.index = None
+        self.vectorizer = HashingTfidfVectorizer(dim)
+        # Filas añadidas por actualizaciones incrementales: se embeben al llegar y
+        # se recorren enteras en cada búsqueda (no están en el índice IVF)
+        self.delta_vectors = np.empty((0, dim), dtype=np.float32)
+        logger.debug("Recomendador semántico inicializado")
+
+    def load(self, catalog: Catalog, path: Optional[str] = None, sources: Optional[Dict[str, float]] = None):
+        """
+        Calcula (o reabre desde `path`, si coincide con `sources`) los embeddings
+        y el índice IVF del catálogo. Con `path` el resultado se persiste.
+        """
+        self.catalog = catalog
+        self.delta_vectors = np.empty((0, self.dim), dtype=np.float32)
+        if path and self._open(path, catalog, sources):
+            logger.info("Embeddings cargados desde %s: %d items.", path, len(catalog))
+            return
+        self.vectorizer = HashingTfidfVectorizer(self.dim)
+        self.vectors = self.vectorizer.fit_transform(catalog_feature_soup(catalog))
+        self.index = IVFIndex.build(self.vectors)
+        if path:
+            self.save(path, sources)
+        logger.info("Embeddings calculados: %d items, %d listas IVF.", len(catalog), self.index.nlist)
+
+    def with_catalog(self, catalog: Catalog) -> 'EmbeddingRecommender':
+        """
+        Mismos vectores e índice sobre una versión actualizada incrementalmente del
+        catálogo: respeta las bajas y embebe sólo las filas que aún no tienen vector
+        (con el IDF del ajuste base), que pasan al delta.
+        """
+        recommender = EmbeddingRecommender.__new__(EmbeddingRecommender)
+        recommender.__dict__.update(self.__dict__)
+        recommender.catalog = catalog
+        covered = len(self.vectors) + len(self.delta_vectors)
+        if len(catalog) > covered:
+            new = self.vectorizer.transform(catalog_feature_soup(catalog, start=covered))
+            recommender.delta_vectors = np.concatenate([self.delta_vectors, new])
+        return recommender
+
+    def compacted(self, catalog: Catalog, live: np.ndarray) -> 'EmbeddingRecommender':
+        """
+        Recomendador para `catalog`, la compactación del catálogo actual (sus filas
+        son las posiciones `live`): reutiliza los vectores, sin volver a embeber, y
+        sólo reconstruye el índice IVF.
+        """
+        recommender = EmbeddingRecommender(self.dim, self.nprobe)
+        recommender.catalog = catalog
+        recommender.vectorizer = self.vectorizer
+        recommender.vectors = self._vectors_at(live)
+        recommender.index = IVFIndex.build(recommender.vectors)
+        return recommender
+
+    def _vectors_at(self, positions: np.ndarray) -> np.ndarray:
+        positions = np.asarray(positions, dtype=np.int64)
+        n_base = len(self.vectors)
+        if not len(self.delta_vectors) or (len(positions) and positions.max() < n_base):
+            return np.asarray(self.vectors[positions])
+        in_base = positions < n_base
+        out = np.empty((len(positions), self.dim), dtype=np.float32)
+        out[in_base] = self.vectors[positions[in_base]]
+        out[~in_base] = self.delta_vectors[positions[~in_base] - n_base]
+        return out
+
+    def save(self, path: str, sources: Optional[Dict[str, float]] = None):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'vectors.npy'), self.vectors)
+        np.save(os.path.join(path, 'df.npy'), self.vectorizer.df)
+        np.savez(os.path.join(path, 'ivf.npz'), centroids=self.index.centroids,
+                 offsets=self.index.offsets, ids=self.index.ids)
+        meta = {'format_version': self.FORMAT_VERSION, 'dim': self.dim,
+                'n_items': len(self.vectors), 'n_docs': self.vectorizer.n_docs, 'sources': sources or {}}
+        # meta.json se escribe al final: su presencia marca el conjunto como completo
+        with open(os.path.join(path, 'meta.json.tmp'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(os.path.join(path, 'meta.json.tmp'), os.path.join(path, 'meta.json'))
+
+    def _open(self, path: str, catalog: Catalog, sources: Optional[Dict[str, float]]) -> bool:
+        try:
+            with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if (meta.get('format_version') != self.FORMAT_VERSION or meta.get('dim') != self.dim
+                or meta.get('n_items') != len(catalog) or meta.get('sources') != (sources or {})):
+            return False
+        self.vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        self.vectorizer = HashingTfidfVectorizer(self.dim)
+        self.vectorizer.df = np.load(os.path.join(path, 'df.npy'), mmap_mode='r')
+        self.vectorizer.df_dim = len(self.vectorizer.df)
+        self.vectorizer.n_docs = meta.get('n_docs', len(catalog))
+        with np.load(os.path.join(path, 'ivf.npz')) as ivf:
+            self.index = IVFIndex(ivf['centroids'], ivf['offsets'], ivf['ids'])
+        return True
+
+    def _candidates(self, query: np.ndarray, excluded: np.ndarray, item_filter: Optional[ItemFilter],
+                    top_n: int) -> np.ndarray:
+        """
+        Items de las listas IVF sondeadas (más todo el delta) que cumplen el filtro,
+        antes de calcular similitudes. Si el filtro deja menos de `top_n`, se sondean
+        el doble de listas (hasta recorrerlas todas) para no devolver resultados
+        vacíos en dominios pequeños.
+        """
+        n_base = len(self.vectors)
+        delta = np.arange(n_base, n_base + len(self.delta_vectors), dtype=np.int64)
+        nprobe = self.nprobe
+        while True:
+            positions = self.index.candidates(query, nprobe)
+            if len(delta):
+                positions = np.concatenate([positions.astype(np.int64), delta])
+            positions = positions[~np.isin(positions, excluded)]
+            if item_filter is None:
+                return positions
+            positions = positions[item_filter.mask(self.catalog, positions)]
+            if len(positions) >= top_n or nprobe >= self.index.nlist:
+                return positions
+            nprobe *= 2
+
+    def recommend(self, liked_indices: List[int], user_profile: Optional[Dict[str, List[str]]] = None,
+                  top_n: int = 5, item_filter: Optional[ItemFilter] = None) -> pd.DataFrame:
+        """
+        Recomienda por similitud coseno con la media de los embeddings gustados.
+        `item_filter` se aplica a los candidatos del índice IVF antes de puntuarlos.
+        """
+        if self.catalog is None or self.catalog.empty or not liked_indices:
+            return pd.DataFrame()
+        n_items = len(self.vectors) + len(self.delta_vectors)
+        liked = sorted({int(p) for p in liked_indices if 0 <= p < n_items})
+        if not liked:
+            return pd.DataFrame()
+        query = create_user_profile(list(range(len(liked))), self._vectors_at(liked)).astype(np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return pd.DataFrame()
+        query /= norm
+
+        positions = self._candidates(query, np.union1d(liked, self.catalog.deleted_positions), item_filter, top_n)
+        scores = self._vectors_at(positions) @ query
+        keep = scores > 0
+        positions, scores = positions[keep], scores[keep]
+        k = min(top_n, len(positions))
+        if k <= 0:
+            return pd.DataFrame()
+        part = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        order = part[np.lexsort((positions[part], -scores[part]))]
+
+        recs = self.catalog.to_frame(positions[order].tolist())
+        recs['score'] = np.round(scores[order].astype(float), 4)
+        return recs[['id', 'title', 'content_type', 'score', 'genres', 'keywords', 'description']]
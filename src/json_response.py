@@ -0,0 +1,34 @@
+import json
+from typing import Any, Iterable
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """JSON compacto en UTF-8: con orjson si está instalado, si no con la stdlib (mismo formato)."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_array(fragments: Iterable[bytes]) -> bytes:
+    """Array JSON a partir de elementos ya serializados, concatenando bytes."""
+    return b'[' + b','.join(fragments) + b']'
+
+
+def json_object(**fields: bytes) -> bytes:
+    """Objeto JSON cuyos valores ya están serializados."""
+    return b'{' + b','.join(dumps(key) + b':' + value for key, value in fields.items()) + b'}'
+
+
+class RawJSONResponse(Response):
+    """
+    Respuesta con el cuerpo JSON ya en bytes: FastAPI no valida ni vuelve a
+    serializar el contenido (a diferencia de devolver un dict).
+    """
+    media_type = "application/json"
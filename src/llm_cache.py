@@ -0,0 +1,205 @@
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+
+class _Flight:
+    """Llamada en curso compartida por peticiones concurrentes con la misma clave."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+class LLMCache:
+    """
+    Caché LRU con TTL de las respuestas del LLM, con almacén SQLite opcional (`db_path`).
+    Las peticiones concurrentes con la misma clave comparten una sola llamada; las respuestas vacías no se cachean.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._flights: Dict[str, _Flight] = {}
+        self._async_flights: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, system_msg: str, prompt: str) -> str:
+        digest = hashlib.sha256()
+        for part in (model, system_msg, prompt):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is None and self._db is not None:
+            value = self._load(key, now)
+        return value
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Como `get` sin bloquear el event loop: sólo la consulta a SQLite va a un hilo."""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is None and self._db is not None:
+            value = await asyncio.to_thread(self._load, key, now)
+        return value
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Como `get`, contando el acierto o el fallo (para quien no usa `get_or_compute`)."""
+        return self._count(self.get(key))
+
+    async def alookup(self, key: str) -> Optional[str]:
+        """Como `lookup` desde el event loop (ver `aget`)."""
+        return self._count(await self.aget(key))
+
+    def _count(self, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        if not value:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+        if self._db is not None:
+            self._store(key, value, now)
+
+    async def aset(self, key: str, value: str):
+        """Como `set` sin bloquear el event loop: la escritura en SQLite va a un hilo."""
+        if not value:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+        if self._db is not None:
+            await asyncio.to_thread(self._store, key, value, now)
+
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created_at, value = entry
+            if now - created_at < self.ttl:
+                self._entries.move_to_end(key)
+                return value
+            del self._entries[key]
+            return None
+
+    def _load(self, key: str, now: float) -> Optional[str]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or now - row[1] >= self.ttl:
+            return None
+        with self._lock:
+            self._remember(key, row[1], row[0])
+        return row[0]
+
+    def _store(self, key: str, value: str, created_at: float):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, created_at),
+            )
+            self._db.commit()
+
+    def _remember(self, key: str, created_at: float, value: str):
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_compute(self, key: str, compute: Callable[[], str]) -> str:
+        """Devuelve la respuesta cacheada o la calcula una sola vez por clave."""
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            self.hits += 1
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        self.misses += 1
+        try:
+            flight.result = compute()
+            self.set(key, flight.result)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def get_or_compute_async(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        """
+        Igual que `get_or_compute` para corrutinas dentro del event loop. La llamada
+        upstream corre en una tarea propia: cancelar a quien la lanzó no cancela a
+        los demás que la esperan, y su resultado se cachea igualmente.
+        """
+        value = await self.aget(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        flight = self._async_flights.get(key)
+        if flight is None:
+            self.misses += 1
+            flight = self._async_flights[key] = asyncio.ensure_future(self._compute_async(key, compute))
+            # Recoge el error aunque todos los que esperaban se hayan cancelado
+            flight.add_done_callback(lambda f: f.cancelled() or f.exception())
+        else:
+            self.hits += 1
+        return await asyncio.shield(flight)
+
+    async def _compute_async(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        try:
+            result = await compute()
+            await self.aset(key, result)
+            return result
+        finally:
+            self._async_flights.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
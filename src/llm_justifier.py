@@ -1,83 +1,123 @@
 import os
 import json
+import random
+import asyncio
+import logging
+import httpx
 import pandas as pd
 from dotenv import load_dotenv
-from typing import Optional
-from openai import OpenAI
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple, Union
+from openai import (
+    OpenAI,
+    AsyncOpenAI,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
 
-class LLMJustifier:
+from src.llm_cache import LLMCache
+from src.metrics import LLM_CALLS, PROMPT_TOKENS, record_usage, timed
+from src.prompt_fragments import (
+    LINE_OVERHEAD,
+    BuiltPrompt,
+    Fragment,
+    PromptFragments,
+    count_tokens,
+    fit_candidates,
+    json_fragment,
+    paragraph_fragment,
+)
+from src.user_porfile import LikedSummary
+
+logger = logging.getLogger(__name__)
+
+EMPTY_JSON = '{"recommendations": []}'
+PARAGRAPH_ERROR = "No se pudo generar la recomendación en este momento."
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError, asyncio.TimeoutError)
+# Marca de fin en la cola de `AsyncLLMJustifier.stream_paragraph`
+_STREAM_END = object()
+
+
+class StreamInterrupted(Exception):
+    """El stream del LLM falló después de emitir parte del párrafo."""
+
+
+def _resolve_settings(model_name: Optional[str]) -> Tuple[str, str]:
+    load_dotenv()
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY no encontrada en entorno / .env")
+    env_model = os.getenv("OPENAI_MODEL") or os.getenv("GPT_MODEL")
+    return api_key, (model_name or env_model or "gpt-4o-mini").strip()
+
+
+class _PromptBuilder:
     """
-    Genera justificaciones y recomendaciones usando la API de OpenAI.
-    Variables de entorno:
-      OPENAI_API_KEY (requerida)
-      OPENAI_MODEL o GPT_MODEL (modelo, por defecto 'gpt-4o-mini')
+    Mensajes de sistema, prompts y parseo compartidos por los justificadores sync y async.
+    Con `prompt_budget` (tokens) los prompts de selección se recortan para caber en él.
     """
 
-    def __init__(self, model_name: Optional[str] = None):
-        load_dotenv()
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY no encontrada en entorno / .env")
-        env_model = os.getenv("OPENAI_MODEL") or os.getenv("GPT_MODEL")
-        self.model = (model_name or env_model or "gpt-4o-mini").strip()
-        self.client = OpenAI(api_key=api_key)
-        print(f"Cliente OpenAI inicializado. Modelo: {self.model}")
-
-    def _chat(self, system_msg: str, user_msg: str) -> str:
-        try:
-            resp = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_msg},
-                    {"role": "user", "content": user_msg},
-                ],
-            )
-            return resp.choices[0].message.content
-        except Exception as e:
-            print(f"Error API OpenAI: {e}")
-            return ""
+    prompt_budget: Optional[int] = None
 
-    def justify(self, recommendations_df: pd.DataFrame, user_summary: str) -> str:
-        if recommendations_df.empty:
-            return "No hay recomendaciones para justificar."
-        prompt = self._build_prompt(recommendations_df, user_summary)
-        system_msg = (
+    @staticmethod
+    def _system_msg_justify() -> str:
+        return (
             "Eres un experto en contenido cultural (cine, música, eventos y productos). "
             "Explica de forma breve, amigable y convincente por qué este grupo de recomendaciones encaja "
             "con los gustos del usuario, referenciando géneros/temas relevantes."
         )
-        out = self._chat(system_msg, prompt)
-        return out or "No se pudo generar una justificación en este momento."
 
-    def recommend_json(self, candidates_df: pd.DataFrame, user_summary: str, top_n: int = 3) -> str:
-        if candidates_df.empty:
-            return '{"recommendations": []}'
-        prompt = self._build_prompt_for_json(candidates_df, user_summary, top_n)
-        system_msg = (
+    @staticmethod
+    def _system_msg_json(top_n: int) -> str:
+        return (
             "Eres un sistema que devuelve estrictamente JSON válido. "
             f"Selecciona exactamente {top_n} recomendaciones del listado de candidatos. "
             "Usa el esquema: {\"recommendations\":[{\"id\":number,\"title\":string,\"content_type\":string}]}. "
             "Responde SOLO con JSON exacto, sin texto adicional."
         )
-        out = self._chat(system_msg, prompt)
+
+    @staticmethod
+    def _system_msg_json_batch(top_n: int) -> str:
+        return (
+            "Eres un sistema que devuelve estrictamente JSON válido. "
+            f"Para cada usuario selecciona exactamente {top_n} recomendaciones de SU listado de candidatos. "
+            "Usa el esquema: {\"users\":[{\"user\":string,\"recommendations\":"
+            "[{\"id\":number,\"title\":string,\"content_type\":string}]}]}. "
+            "Incluye a todos los usuarios. Responde SOLO con JSON exacto, sin texto adicional."
+        )
+
+    @staticmethod
+    def _system_msg_paragraph(top_n: int) -> str:
+        return (
+            "Eres un experto en recomendaciones. "
+            f"Escribe UN solo párrafo (4-6 líneas) en español, nombra explícitamente {top_n} títulos elegidos del listado y explica por qué encajan."
+        )
+
+    @staticmethod
+    def _parse_json(out: str) -> str:
         try:
             parsed = json.loads(out)
             if isinstance(parsed, dict) and isinstance(parsed.get('recommendations'), list):
                 return json.dumps(parsed, ensure_ascii=False)
         except Exception:
             pass
-        return '{"recommendations": []}'
+        return EMPTY_JSON
 
-    def recommend_paragraph(self, candidates_df: pd.DataFrame, user_summary: str, top_n: int = 3) -> str:
-        if candidates_df.empty:
-            return "No hay recomendaciones disponibles."
-        prompt = self._build_prompt_for_paragraph(candidates_df, user_summary, top_n)
-        system_msg = (
-            "Eres un experto en recomendaciones. "
-            f"Escribe UN solo párrafo (4-6 líneas) en español, nombra explícitamente {top_n} títulos elegidos del listado y explica por qué encajan."
-        )
-        out = self._chat(system_msg, prompt)
-        return out or "No se pudo generar la recomendación en este momento."
+    @staticmethod
+    def _parse_json_batch(out: str) -> Dict[str, list]:
+        """{usuario: recomendaciones} de una respuesta por lotes; los usuarios ausentes se omiten."""
+        try:
+            parsed = json.loads(out)
+        except Exception:
+            return {}
+        users = parsed.get('users') if isinstance(parsed, dict) else None
+        if not isinstance(users, list):
+            return {}
+        return {
+            str(u.get('user')): u['recommendations'] for u in users
+            if isinstance(u, dict) and isinstance(u.get('recommendations'), list)
+        }
 
     def _build_prompt(self, recommendations_df: pd.DataFrame, user_summary: str) -> str:
         desc_col = 'overview' if 'overview' in recommendations_df.columns else 'description'
@@ -93,42 +133,420 @@ class LLMJustifier:
                 lines.append(f"- {title}: {desc}")
         recommended_str = "\n".join(lines)
         return (
-            f"Basado en que {user_summary.lower()}, he seleccionado estas recomendaciones para ti:\n"
+            f"Basado en que {str(user_summary).lower()}, he seleccionado estas recomendaciones para ti:\n"
             f"{recommended_str}\n\n"
             "En 4-6 líneas, explica de forma concisa por qué este conjunto tiene sentido para el usuario."
         )
 
-    def _build_prompt_for_json(self, candidates_df: pd.DataFrame, user_summary: str, top_n: int) -> str:
+    def _candidate_lines(self, kind: str, candidates_df: pd.DataFrame,
+                         fragments: Optional[PromptFragments] = None) -> List[Fragment]:
+        """
+        Líneas de candidato (texto, tokens) en orden de ranking. Con `fragments`
+        (índice del DataFrame = posiciones del catálogo) se reutilizan las
+        precalculadas de la versión; si no, se formatean al vuelo.
+        """
+        if fragments is not None:
+            return fragments.lines(kind, candidates_df.index)
         desc_col = 'overview' if 'overview' in candidates_df.columns else 'description'
-        rows = []
+        lines = []
         for _, row in candidates_df.iterrows():
-            desc = (row.get(desc_col, '') or '')
-            if len(desc) > 220:
-                desc = desc[:217] + '...'
-            rows.append(
-                f"- id: {row.get('id','')}; title: {row.get('title','')}; type: {row.get('content_type','')}; "
-                f"genres: {', '.join(row.get('genres', []))}; keywords: {', '.join(row.get('keywords', []))}; desc: {desc}"
-            )
-        candidates_str = "\n".join(rows)
-        return (
-            "Usuario: " + user_summary + "\n" +
+            desc = None if kind.endswith('_short') else (row.get(desc_col, '') or '')
+            if kind.startswith('json'):
+                text = json_fragment(row.get('id', ''), row.get('title', ''), row.get('content_type', ''),
+                                     row.get('genres', []), row.get('keywords', []), desc)
+            else:
+                text = paragraph_fragment(row.get('title', ''), row.get('content_type', ''), desc)
+            lines.append((text, count_tokens(text) + LINE_OVERHEAD))
+        return lines
+
+    def _fit_prompt(self, kind: str, candidates_df: pd.DataFrame, user_summary: Union[str, LikedSummary],
+                    top_n: int, system_msg: str, compose: Callable[[str, str], str],
+                    fragments: Optional[PromptFragments] = None, budget: Optional[int] = None) -> BuiltPrompt:
+        """
+        Arma el prompt dentro de `prompt_budget` tokens (o `budget`) recortando candidatos, resumen y descripciones.
+        Nunca quedan menos de `top_n` candidatos: si ni así cabe, se marca `over_budget`.
+        """
+        summary_text = user_summary.text if isinstance(user_summary, LikedSummary) else (lambda _=None: user_summary)
+        full = self._candidate_lines(kind, candidates_df, fragments)
+        budget = budget or self.prompt_budget
+        if not budget:
+            text = compose(summary_text(), "\n".join(t for t, _ in full))
+            return BuiltPrompt(text, count_tokens(system_msg) + count_tokens(text), len(full))
+
+        levels = user_summary.levels() if isinstance(user_summary, LikedSummary) else [None]
+        system_tokens = count_tokens(system_msg)
+        soft_floor, hard_floor = min(len(full), 2 * top_n), min(len(full), top_n)
+        lines, level, kept, compact = full, levels[-1], 0, False
+        for candidate_level in levels:
+            available = budget - system_tokens - count_tokens(compose(summary_text(candidate_level), ""))
+            kept = fit_candidates(full, available)
+            if kept >= soft_floor:
+                level = candidate_level
+                break
+        else:
+            if kept < hard_floor:
+                compact = True
+                lines = self._candidate_lines(kind + '_short', candidates_df, fragments)
+                kept = max(fit_candidates(lines, available), hard_floor)
+
+        text = compose(summary_text(level), "\n".join(t for t, _ in lines[:kept]))
+        tokens = system_tokens + count_tokens(text)
+        return BuiltPrompt(text, tokens, kept, dropped_candidates=len(full) - kept,
+                           summary_terms=level, compact=compact, over_budget=tokens > budget)
+
+    def _observe_prompt(self, kind: str, built: BuiltPrompt) -> str:
+        PROMPT_TOKENS.observe(built.tokens, kind)
+        if built.over_budget:
+            logger.warning("Prompt %s de %d tokens supera el presupuesto de %d", kind, built.tokens, self.prompt_budget)
+        elif built.dropped_candidates or built.summary_terms is not None:
+            logger.debug("Prompt %s recortado a %d tokens: %d candidatos fuera, resumen a %s términos%s",
+                         kind, built.tokens, built.dropped_candidates, built.summary_terms,
+                         ", sin descripciones" if built.compact else "")
+        return built.text
+
+    @staticmethod
+    def _compose_json(top_n: int) -> Callable[[str, str], str]:
+        return lambda summary, candidates_str: (
+            "Usuario: " + summary + "\n" +
             f"Candidatos (elige exactamente {top_n} distintos y devuelve su id/title/content_type):\n" + candidates_str + "\n" +
             "Responde SOLO con JSON válido según el esquema indicado."
         )
 
-    def _build_prompt_for_paragraph(self, candidates_df: pd.DataFrame, user_summary: str, top_n: int) -> str:
-        desc_col = 'overview' if 'overview' in candidates_df.columns else 'description'
-        rows = []
-        for _, row in candidates_df.iterrows():
-            desc = (row.get(desc_col, '') or '')
-            if len(desc) > 160:
-                desc = desc[:157] + '...'
-            rows.append(
-                f"- {row.get('title','')} [{row.get('content_type','')}]: {desc}"
-            )
-        candidates_str = "\n".join(rows)
-        return (
-            "Perfil del usuario: " + user_summary + "\n" +
+    @staticmethod
+    def _compose_paragraph(top_n: int) -> Callable[[str, str], str]:
+        return lambda summary, candidates_str: (
+            "Perfil del usuario: " + summary + "\n" +
             f"Del siguiente listado de candidatos, elige exactamente {top_n} y escribe UN párrafo en español mencionando los {top_n} títulos y por qué encajan.\n" +
             candidates_str
         )
+
+    def _fit_prompt_for_json(self, candidates_df: pd.DataFrame, user_summary: Union[str, LikedSummary], top_n: int,
+                             fragments: Optional[PromptFragments] = None) -> BuiltPrompt:
+        return self._fit_prompt('json', candidates_df, user_summary, top_n, self._system_msg_json(top_n),
+                                self._compose_json(top_n), fragments)
+
+    def _fit_prompt_for_paragraph(self, candidates_df: pd.DataFrame, user_summary: Union[str, LikedSummary],
+                                  top_n: int, fragments: Optional[PromptFragments] = None) -> BuiltPrompt:
+        return self._fit_prompt('paragraph', candidates_df, user_summary, top_n, self._system_msg_paragraph(top_n),
+                                self._compose_paragraph(top_n), fragments)
+
+    def _build_prompt_for_json(self, candidates_df: pd.DataFrame, user_summary: Union[str, LikedSummary], top_n: int,
+                               fragments: Optional[PromptFragments] = None) -> str:
+        return self._fit_prompt_for_json(candidates_df, user_summary, top_n, fragments).text
+
+    @staticmethod
+    def _compose_json_batch(top_n: int) -> Callable[[List[str]], str]:
+        return lambda blocks: (
+            f"Para cada usuario elige exactamente {top_n} candidatos distintos de su propio listado "
+            "y devuelve su id/title/content_type.\n\n" + "\n\n".join(blocks) + "\n\n" +
+            "Responde SOLO con JSON válido según el esquema indicado."
+        )
+
+    @staticmethod
+    def _compose_json_batch_block(key: str) -> Callable[[str, str], str]:
+        return lambda summary, candidates_str: f"### Usuario {key}\nPerfil: {summary}\nCandidatos:\n" + candidates_str
+
+    def _fit_prompts_for_json_batch(self, users: List[Tuple[str, Union[str, LikedSummary], pd.DataFrame]], top_n: int,
+                                    fragments: Optional[PromptFragments] = None) -> List[BuiltPrompt]:
+        """Prompts por lotes (un bloque por usuario) dentro de `prompt_budget`; más de uno sólo si algún bloque no cabe."""
+        system_msg = self._system_msg_json_batch(top_n)
+        compose = self._compose_json_batch(top_n)
+        # Lo que cuesta un prompt sin usuarios: el bloque se ajusta al resto del presupuesto
+        fixed = system_msg + "\n" + compose([])
+        overhead = count_tokens(fixed)
+        share = overhead + (self.prompt_budget - overhead) // len(users) if self.prompt_budget and users else None
+        blocks = [
+            self._fit_prompt('json', candidates_df, user_summary, top_n, fixed,
+                             self._compose_json_batch_block(key), fragments, budget=share)
+            for key, user_summary, candidates_df in users
+        ]
+
+        groups: List[List[BuiltPrompt]] = [[]]
+        used = overhead
+        for block in blocks:
+            block_tokens = block.tokens - overhead + LINE_OVERHEAD
+            if self.prompt_budget and groups[-1] and used + block_tokens > self.prompt_budget:
+                groups.append([])
+                used = overhead
+            groups[-1].append(block)
+            used += block_tokens
+
+        prompts = []
+        for group in groups:
+            text = compose([b.text for b in group])
+            tokens = count_tokens(system_msg) + count_tokens(text)
+            prompts.append(BuiltPrompt(
+                text, tokens, sum(b.candidates for b in group),
+                dropped_candidates=sum(b.dropped_candidates for b in group),
+                compact=any(b.compact for b in group),
+                over_budget=bool(self.prompt_budget) and tokens > self.prompt_budget,
+            ))
+        return prompts
+
+    def _build_prompt_for_paragraph(self, candidates_df: pd.DataFrame, user_summary: Union[str, LikedSummary],
+                                    top_n: int, fragments: Optional[PromptFragments] = None) -> str:
+        return self._fit_prompt_for_paragraph(candidates_df, user_summary, top_n, fragments).text
+
+
+class LLMJustifier(_PromptBuilder):
+    """
+    Genera justificaciones y recomendaciones usando la API de OpenAI.
+    Variables de entorno:
+      OPENAI_API_KEY (requerida)
+      OPENAI_MODEL o GPT_MODEL (modelo, por defecto 'gpt-4o-mini')
+
+    Con `cache`, las respuestas se reutilizan por (modelo, mensaje de sistema, prompt).
+    """
+
+    def __init__(self, model_name: Optional[str] = None, cache: Optional[LLMCache] = None,
+                 prompt_budget: Optional[int] = None):
+        api_key, self.model = _resolve_settings(model_name)
+        self.client = OpenAI(api_key=api_key)
+        self.cache = cache
+        self.prompt_budget = prompt_budget
+        logger.info("Cliente OpenAI inicializado. Modelo: %s", self.model)
+
+    def _chat(self, system_msg: str, user_msg: str) -> str:
+        with timed('llm'):
+            if self.cache is None:
+                return self._chat_upstream(system_msg, user_msg)
+            key = LLMCache.make_key(self.model, system_msg, user_msg)
+            return self.cache.get_or_compute(key, lambda: self._chat_upstream(system_msg, user_msg))
+
+    def _chat_upstream(self, system_msg: str, user_msg: str) -> str:
+        try:
+            resp = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_msg},
+                    {"role": "user", "content": user_msg},
+                ],
+            )
+            LLM_CALLS.inc(1, 'ok')
+            record_usage(getattr(resp, 'usage', None))
+            return resp.choices[0].message.content
+        except Exception as e:
+            logger.error("Error API OpenAI: %s", e)
+            LLM_CALLS.inc(1, 'error')
+            return ""
+
+    def justify(self, recommendations_df: pd.DataFrame, user_summary: str) -> str:
+        if recommendations_df.empty:
+            return "No hay recomendaciones para justificar."
+        with timed('prompt'):
+            prompt = self._build_prompt(recommendations_df, user_summary)
+        out = self._chat(self._system_msg_justify(), prompt)
+        return out or "No se pudo generar una justificación en este momento."
+
+    def recommend_json(self, candidates_df: pd.DataFrame, user_summary: Union[str, LikedSummary], top_n: int = 3,
+                       fragments: Optional[PromptFragments] = None) -> str:
+        if candidates_df.empty:
+            return EMPTY_JSON
+        with timed('prompt'):
+            prompt = self._observe_prompt('json', self._fit_prompt_for_json(candidates_df, user_summary, top_n, fragments))
+        return self._parse_json(self._chat(self._system_msg_json(top_n), prompt))
+
+    def recommend_paragraph(self, candidates_df: pd.DataFrame, user_summary: Union[str, LikedSummary], top_n: int = 3,
+                            fragments: Optional[PromptFragments] = None) -> str:
+        if candidates_df.empty:
+            return "No hay recomendaciones disponibles."
+        with timed('prompt'):
+            prompt = self._observe_prompt('paragraph',
+                                          self._fit_prompt_for_paragraph(candidates_df, user_summary, top_n, fragments))
+        out = self._chat(self._system_msg_paragraph(top_n), prompt)
+        return out or PARAGRAPH_ERROR
+
+
+class AsyncLLMJustifier(_PromptBuilder):
+    """
+    Variante asíncrona para el servidor: cliente compartido, timeout por petición,
+    concurrencia acotada y reintentos con backoff ante errores transitorios.
+    """
+
+    def __init__(self, model_name: Optional[str] = None, cache: Optional[LLMCache] = None,
+                 timeout: float = 30.0, max_concurrency: int = 32, max_retries: int = 2,
+                 backoff: float = 0.5, prompt_budget: Optional[int] = None):
+        api_key, self.model = _resolve_settings(model_name)
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            timeout=timeout,
+        )
+        # Los reintentos se gestionan aquí para respetar el semáforo y el backoff
+        self.client = AsyncOpenAI(api_key=api_key, http_client=self.http_client, max_retries=0)
+        self.cache = cache
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.prompt_budget = prompt_budget
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._streams: Set[asyncio.Task] = set()
+        logger.info("Cliente OpenAI asíncrono inicializado. Modelo: %s", self.model)
+
+    async def aclose(self):
+        await self.client.close()
+
+    async def _chat(self, system_msg: str, user_msg: str) -> str:
+        with timed('llm'):
+            if self.cache is None:
+                return await self._chat_upstream(system_msg, user_msg)
+            key = LLMCache.make_key(self.model, system_msg, user_msg)
+            return await self.cache.get_or_compute_async(key, lambda: self._chat_upstream(system_msg, user_msg))
+
+    async def _chat_upstream(self, system_msg: str, user_msg: str) -> str:
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    resp = await asyncio.wait_for(
+                        self.client.chat.completions.create(
+                            model=self.model,
+                            messages=[
+                                {"role": "system", "content": system_msg},
+                                {"role": "user", "content": user_msg},
+                            ],
+                        ),
+                        timeout=self.timeout,
+                    )
+                LLM_CALLS.inc(1, 'ok')
+                record_usage(getattr(resp, 'usage', None))
+                return resp.choices[0].message.content
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    logger.warning("Error API OpenAI tras %d intentos: %r", attempt + 1, e)
+                    LLM_CALLS.inc(1, 'error')
+                    return ""
+                LLM_CALLS.inc(1, 'retry')
+                await asyncio.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+            except Exception as e:
+                logger.error("Error API OpenAI: %s", e)
+                LLM_CALLS.inc(1, 'error')
+                return ""
+        return ""
+
+    async def complete(self, system_msg: str, user_msg: str) -> str:
+        """Llamada directa (sin caché) con el semáforo y los reintentos del cliente; '' si falla."""
+        return await self._chat_upstream(system_msg, user_msg)
+
+    async def justify(self, recommendations_df: pd.DataFrame, user_summary: str) -> str:
+        if recommendations_df.empty:
+            return "No hay recomendaciones para justificar."
+        with timed('prompt'):
+            prompt = self._build_prompt(recommendations_df, user_summary)
+        out = await self._chat(self._system_msg_justify(), prompt)
+        return out or "No se pudo generar una justificación en este momento."
+
+    async def recommend_json(self, candidates_df: pd.DataFrame, user_summary: Union[str, LikedSummary],
+                             top_n: int = 3, fragments: Optional[PromptFragments] = None) -> str:
+        if candidates_df.empty:
+            return EMPTY_JSON
+        with timed('prompt'):
+            prompt = self._observe_prompt('json', self._fit_prompt_for_json(candidates_df, user_summary, top_n, fragments))
+        return self._parse_json(await self._chat(self._system_msg_json(top_n), prompt))
+
+    async def recommend_json_batch(self, users: List[Tuple[str, Union[str, LikedSummary], pd.DataFrame]], top_n: int = 3,
+                                   fragments: Optional[PromptFragments] = None) -> Dict[str, list]:
+        """
+        Selección de varios usuarios (clave, resumen, candidatos) en una sola llamada, o en varias si no caben.
+        Devuelve {clave: recomendaciones} sólo para los usuarios que el modelo haya respondido correctamente.
+        """
+        users = [u for u in users if not u[2].empty]
+        if not users:
+            return {}
+        with timed('prompt'):
+            prompts = [self._observe_prompt('json_batch', built)
+                       for built in self._fit_prompts_for_json_batch(users, top_n, fragments)]
+        system_msg = self._system_msg_json_batch(top_n)
+        selected: Dict[str, list] = {}
+        # Si el lote no cabe en un prompt se reparte en varios, que se piden en paralelo
+        for out in await asyncio.gather(*(self._chat(system_msg, prompt) for prompt in prompts)):
+            selected.update(self._parse_json_batch(out))
+        return selected
+
+    async def recommend_paragraph(self, candidates_df: pd.DataFrame, user_summary: Union[str, LikedSummary],
+                                  top_n: int = 3, fragments: Optional[PromptFragments] = None) -> str:
+        if candidates_df.empty:
+            return "No hay recomendaciones disponibles."
+        with timed('prompt'):
+            prompt = self._observe_prompt('paragraph',
+                                          self._fit_prompt_for_paragraph(candidates_df, user_summary, top_n, fragments))
+        out = await self._chat(self._system_msg_paragraph(top_n), prompt)
+        return out or PARAGRAPH_ERROR
+
+    async def stream_paragraph(self, candidates_df: pd.DataFrame, user_summary: Union[str, LikedSummary], top_n: int = 3,
+                               fragments: Optional[PromptFragments] = None) -> AsyncIterator[str]:
+        """
+        Igual que `recommend_paragraph` pero emite los tokens según llegan; un párrafo cacheado se emite de una vez.
+        Si el stream falla antes del primer token se usa la llamada sin streaming; si falla a mitad, `StreamInterrupted`.
+        """
+        if candidates_df.empty:
+            yield "No hay recomendaciones disponibles."
+            return
+        system_msg = self._system_msg_paragraph(top_n)
+        with timed('prompt'):
+            prompt = self._observe_prompt('paragraph',
+                                          self._fit_prompt_for_paragraph(candidates_df, user_summary, top_n, fragments))
+        key = LLMCache.make_key(self.model, system_msg, prompt) if self.cache is not None else None
+        if key is not None:
+            cached = await self.cache.alookup(key)
+            if cached:
+                yield cached
+                return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(self._pump_stream(system_msg, prompt, key, queue))
+        # Referencia fuerte: la tarea llega al final aunque el cliente se vaya
+        self._streams.add(task)
+        task.add_done_callback(self._streams.discard)
+
+        emitted = False
+        while True:
+            item = await queue.get()
+            if item is _STREAM_END:
+                return
+            if isinstance(item, Exception):
+                if emitted:
+                    raise StreamInterrupted() from item
+                break
+            emitted = True
+            yield item
+
+        with timed('llm'):
+            out = await self._chat_upstream(system_msg, prompt)
+        if key is not None:
+            await self.cache.aset(key, out)
+        yield out or PARAGRAPH_ERROR
+
+    async def _pump_stream(self, system_msg: str, prompt: str, key: Optional[str], queue: asyncio.Queue):
+        """Lee el stream upstream con el semáforo y deja en `queue` los tokens y, al final, `_STREAM_END` o el error."""
+        parts = []
+        # Como `_chat`: incluye la espera del semáforo y termina con el último token
+        with timed('llm'):
+            try:
+                async with self._semaphore:
+                    stream = await asyncio.wait_for(
+                        self.client.chat.completions.create(
+                            model=self.model,
+                            messages=[
+                                {"role": "system", "content": system_msg},
+                                {"role": "user", "content": prompt},
+                            ],
+                            stream=True,
+                            # El último chunk trae el `usage` para contar tokens
+                            stream_options={"include_usage": True},
+                        ),
+                        timeout=self.timeout,
+                    )
+                    async for chunk in stream:
+                        record_usage(getattr(chunk, 'usage', None))
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            parts.append(delta)
+                            queue.put_nowait(delta)
+            except Exception as e:
+                logger.warning("Error en streaming OpenAI: %r", e)
+                LLM_CALLS.inc(1, 'error')
+                queue.put_nowait(e)
+                return
+        LLM_CALLS.inc(1, 'ok')
+        if key is not None:
+            await self.cache.aset(key, ''.join(parts))
+        queue.put_nowait(_STREAM_END)
@@ -0,0 +1,187 @@
+import math
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+# Segundos: de 0,5 ms (hash lookups) a 30 s (timeout del LLM)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Contador monótono con etiquetas (formato de texto de Prometheus)."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *labels: str):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos, como `prometheus_client.Histogram`."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [contador por bucket..., suma, total]
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {_format_value(cumulative)}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series[-2])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {_format_value(series[-1])}"
+
+
+class Gauge:
+    """Valor instantáneo calculado al exponer las métricas (p. ej. ratio de aciertos de caché)."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def samples(self) -> Iterator[str]:
+        try:
+            value = float(self.read())
+        except Exception:
+            return
+        yield f"{self.name} {_format_value(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        # Registrar con el mismo nombre sustituye (p. ej. al reiniciar la app)
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'recommender_stage_seconds', 'Duración de cada etapa del pipeline de recomendación', ('stage',)))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'recommender_request_seconds', 'Duración total de la petición HTTP', ('route', 'status')))
+LLM_CALLS = REGISTRY.register(Counter(
+    'recommender_llm_calls_total', 'Llamadas upstream al LLM por resultado', ('outcome',)))
+LLM_TOKENS = REGISTRY.register(Counter(
+    'recommender_llm_tokens_total', 'Tokens consumidos en el LLM', ('kind',)))
+PROMPT_TOKENS = REGISTRY.register(Histogram(
+    'recommender_prompt_tokens', 'Tokens de cada prompt enviado al LLM (estimados)', ('kind',),
+    buckets=(128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)))
+SCORING_QUEUE_SECONDS = REGISTRY.register(Histogram(
+    'recommender_scoring_queue_seconds', 'Espera de cada consulta en la cola del micro-batching de puntuación',
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)))
+SCORING_BATCH_SIZE = REGISTRY.register(Histogram(
+    'recommender_scoring_batch_size', 'Consultas puntuadas juntas en cada lote del micro-batching',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)))
+
+
+# Etapas de la petición en curso (sólo si alguien las recoge, p. ej. el log de peticiones)
+_request_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar('request_stages', default=None)
+
+
+@contextmanager
+def timed(stage: str):
+    """Mide la duración de una etapa en `recommender_stage_seconds{stage=...}`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0.0) + elapsed
+
+
+@contextmanager
+def collect_stages() -> Iterator[Dict[str, float]]:
+    """
+    Acumula en un dict (etapa -> segundos) las etapas medidas con `timed` dentro
+    de este contexto. Las tareas y `asyncio.to_thread` lanzados desde él comparten el dict.
+    """
+    stages: Dict[str, float] = {}
+    token = _request_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _request_stages.reset(token)
+
+
+def record_usage(usage):
+    """Acumula los tokens de un `usage` de OpenAI (si la respuesta lo trae)."""
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, 'prompt_tokens', 0) or 0, 'prompt')
+    LLM_TOKENS.inc(getattr(usage, 'completion_tokens', 0) or 0, 'completion')
@@ -1,4 +1,15 @@
+import logging
 import pandas as pd
+from typing import Iterator
+
+from src.catalog import Catalog
+
+logger = logging.getLogger(__name__)
+
+
+def _join_terms(x) -> str:
+    return ' '.join(x) if isinstance(x, list) else ''
+
 
 def create_feature_soup(df: pd.DataFrame) -> pd.Series:
     """
@@ -7,18 +18,34 @@ def create_feature_soup(df: pd.DataFrame) -> pd.Series:
 
     Args:
         df (pd.DataFrame): DataFrame con la información de las películas.
-                           Debe contener 'title', 'overview', 'genres', y 'keywords'.
+                           Debe contener 'title', 'genres', 'keywords' y 'overview'
+                           (o 'description' en el catálogo unificado).
 
     Returns:
         pd.Series: Una serie de Pandas donde cada elemento es la cadena de texto combinada
                    para cada película.
     """
-    # Asegurarse de que las columnas de listas se traten como tales y se unan en strings
-    df['genres'] = df['genres'].apply(lambda x: ' '.join(x) if isinstance(x, list) else '')
-    df['keywords'] = df['keywords'].apply(lambda x: ' '.join(x) if isinstance(x, list) else '')
+    # Unir las listas en strings sin modificar el DataFrame original
+    genres = df['genres'].apply(_join_terms)
+    keywords = df['keywords'].apply(_join_terms)
+    text_col = 'overview' if 'overview' in df.columns else 'description'
 
     # Combinar todas las características en una sola cadena (soup)
-    soup = df['title'] + ' ' + df['overview'] + ' ' + df['genres'] + ' ' + df['keywords']
-    
-    print("Creada la 'feature soup' para cada película.")
+    soup = df['title'].fillna('') + ' ' + df[text_col].fillna('') + ' ' + genres + ' ' + keywords
+
+    logger.debug("Creada la 'feature soup' para cada película.")
     return soup
+
+
+def catalog_feature_soup(catalog: Catalog, start: int = 0) -> Iterator[str]:
+    """
+    Misma 'soup' que `create_feature_soup`, generada en streaming sobre el catálogo
+    compacto (desde la posición `start`, p. ej. sólo las filas nuevas).
+    """
+    for pos in range(start, len(catalog)):
+        yield ' '.join((
+            catalog.titles[pos],
+            catalog.descriptions[pos],
+            ' '.join(catalog.genres_of(pos)),
+            ' '.join(catalog.keywords_of(pos)),
+        ))
@@ -0,0 +1,109 @@
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.catalog import Catalog
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken es opcional
+    _ENCODING = None
+
+
+JSON_DESC_CHARS = 220
+PARAGRAPH_DESC_CHARS = 160
+# Salto de línea que une cada fragmento al prompt
+LINE_OVERHEAD = 1
+
+Fragment = Tuple[str, int]
+
+
+def count_tokens(text: str) -> int:
+    """Tokens del texto con tiktoken si está instalado; si no, ~4 caracteres por token."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+
+def _truncate(text: str, limit: int) -> str:
+    text = text or ''
+    return text[:limit - 3] + '...' if len(text) > limit else text
+
+
+def json_fragment(item_id, title: str, content_type: str, genres: Sequence[str], keywords: Sequence[str],
+                  description: Optional[str]) -> str:
+    head = (f"- id: {item_id}; title: {title}; type: {content_type}; "
+            f"genres: {', '.join(genres)}; keywords: {', '.join(keywords)}")
+    return head if description is None else f"{head}; desc: {_truncate(description, JSON_DESC_CHARS)}"
+
+
+def paragraph_fragment(title: str, content_type: str, description: Optional[str]) -> str:
+    head = f"- {title} [{content_type}]"
+    return head if description is None else f"{head}: {_truncate(description, PARAGRAPH_DESC_CHARS)}"
+
+
+class PromptFragments:
+    """
+    Líneas de candidato de los prompts por item (completa y compacta) con su número de tokens, calculadas al primer uso.
+    Las versiones con actualizaciones incrementales comparten con la base los fragmentos anteriores a `start`.
+    """
+
+    KINDS = ('json', 'json_short', 'paragraph', 'paragraph_short')
+
+    def __init__(self, catalog: Catalog, max_cached: int = 200_000):
+        self.catalog = catalog
+        self.max_cached = max_cached
+        self._cache: Dict[Tuple[str, int], Fragment] = {}
+        self._lock = threading.Lock()
+
+    def with_catalog(self, catalog: Catalog, start: int) -> 'PromptFragments':
+        fragments = PromptFragments(catalog, self.max_cached)
+        with self._lock:
+            fragments._cache = {key: value for key, value in self._cache.items() if key[1] < start}
+        return fragments
+
+    def _render(self, kind: str, pos: int) -> str:
+        catalog = self.catalog
+        description = catalog.descriptions[pos] if not kind.endswith('_short') else None
+        if kind.startswith('json'):
+            return json_fragment(int(catalog.ids[pos]), catalog.titles[pos], catalog.content_type(pos),
+                                 catalog.genres_of(pos), catalog.keywords_of(pos), description)
+        return paragraph_fragment(catalog.titles[pos], catalog.content_type(pos), description)
+
+    def get(self, kind: str, pos: int) -> Fragment:
+        key = (kind, pos)
+        fragment = self._cache.get(key)
+        if fragment is None:
+            text = self._render(kind, pos)
+            fragment = (text, count_tokens(text) + LINE_OVERHEAD)
+            if len(self._cache) < self.max_cached:
+                with self._lock:
+                    self._cache[key] = fragment
+        return fragment
+
+    def lines(self, kind: str, positions: Sequence[int]) -> List[Fragment]:
+        return [self.get(kind, int(pos)) for pos in positions]
+
+
+@dataclass
+class BuiltPrompt:
+    """Prompt final con su tamaño y cuánto se recortó para respetar el presupuesto."""
+    text: str
+    tokens: int
+    candidates: int
+    dropped_candidates: int = 0
+    summary_terms: Optional[int] = None
+    compact: bool = False
+    over_budget: bool = False
+
+
+def fit_candidates(lines: List[Fragment], available: int) -> int:
+    """Cuántas líneas (en orden de score) caben en `available` tokens."""
+    used = kept = 0
+    for _, tokens in lines:
+        if used + tokens > available:
+            break
+        used += tokens
+        kept += 1
+    return kept
@@ -1,45 +1,473 @@
+import logging
+import numpy as np
 import pandas as pd
-from typing import List, Dict
+import scipy.sparse as sp
+from typing import List, Dict, Optional, Sequence, Tuple, Union
+
+from src.catalog import Catalog, ItemFilter, TermColumn
+
+logger = logging.getLogger(__name__)
+
+
+class TermIndex:
+    """
+    Índice invertido término -> posiciones del catálogo (la transpuesta de las columnas CSR).
+    `delta` indexa aparte las filas añadidas por actualizaciones; `rows` restringe a una partición.
+
+    """
+
+    def __init__(self, catalog: Catalog, start: int = 0, rows: Optional[np.ndarray] = None):
+        n_terms = len(catalog.vocab)
+        self.genre_offsets, self.genre_postings = self._invert(catalog.genres, n_terms, start, rows)
+        self.keyword_offsets, self.keyword_postings = self._invert(catalog.keywords, n_terms, start, rows)
+        self.delta: Optional[TermIndex] = None
+        # Estructuras derivadas de los arrays; se comparten con los índices de `with_delta`
+        self._derived: Dict[str, sp.csr_matrix] = {}
+
+    @classmethod
+    def from_arrays(cls, genre_offsets: np.ndarray, genre_postings: np.ndarray,
+                    keyword_offsets: np.ndarray, keyword_postings: np.ndarray) -> 'TermIndex':
+        """Reconstruye el índice a partir de arrays ya calculados (p. ej. un snapshot mapeado)."""
+        index = cls.__new__(cls)
+        index.genre_offsets, index.genre_postings = genre_offsets, genre_postings
+        index.keyword_offsets, index.keyword_postings = keyword_offsets, keyword_postings
+        index.delta = None
+        index._derived = {}
+        return index
+
+    def with_delta(self, catalog: Catalog, start: int = 0, rows: Optional[np.ndarray] = None) -> 'TermIndex':
+        """Índice que comparte este como base y añade las filas `catalog[start:]` (o `rows`)."""
+        index = TermIndex.from_arrays(self.genre_offsets, self.genre_postings,
+                                      self.keyword_offsets, self.keyword_postings)
+        index._derived = self._derived
+        index.delta = TermIndex(catalog, start=start, rows=rows)
+        return index
+
+    @staticmethod
+    def _invert(column: TermColumn, n_terms: int, start: int = 0,
+                rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        row_ids, values = column.entries(start, rows)
+        order = np.argsort(values, kind='stable')
+        offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(values, minlength=n_terms))
+        return offsets, row_ids[order]
+
+    @property
+    def n_terms(self) -> int:
+        return len(self.genre_offsets) - 1
+
+    def term_matrix(self) -> sp.csr_matrix:
+        """
+        Posting lists como matriz CSR (2 * términos) x items con los pesos de `score`;
+        se construye una vez y la comparten las versiones con este índice como base.
+
+        """
+        matrix = self._derived.get('term_matrix')
+        if matrix is None:
+            n_items = int(max(self.genre_postings.max(initial=-1), self.keyword_postings.max(initial=-1))) + 1
+            matrix = self._derived['term_matrix'] = sp.vstack([
+                sp.csr_matrix((np.full(len(postings), weight, dtype=np.int32), postings, offsets),
+                              shape=(self.n_terms, n_items))
+                for offsets, postings, weight in ((self.genre_offsets, self.genre_postings, 2),
+                                                  (self.keyword_offsets, self.keyword_postings, 1))
+            ], format='csr')
+        return matrix
+
+    def score(self, genre_ids: np.ndarray, keyword_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Acumula `g_overlap * 2 + k_overlap` sólo para items con algún término en común.
+        Devuelve (posiciones ordenadas, scores).
+        """
+        parts, weights = [], []
+        for segment in (self, self.delta):
+            if segment is None:
+                continue
+            for ids, offsets, postings, weight in (
+                (genre_ids, segment.genre_offsets, segment.genre_postings, 2),
+                (keyword_ids, segment.keyword_offsets, segment.keyword_postings, 1),
+            ):
+                for t in ids.tolist():
+                    # Términos añadidos después de construir el segmento no tienen postings
+                    if t + 1 >= len(offsets):
+                        continue
+                    posting = postings[offsets[t]:offsets[t + 1]]
+                    parts.append(posting)
+                    weights.append(np.full(len(posting), weight, dtype=np.int64))
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        positions, inverse = np.unique(np.concatenate(parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights)).astype(np.int64)
+        return positions.astype(np.int64), scores
+
+
+class SparseTermMatrix:
+    """
+    Géneros y keywords como matrices CSR item-término (géneros pesan 2, keywords 1)
+    para puntuar el catálogo completo o un lote de usuarios con productos dispersos.
+
+    """
+
+    def __init__(self, catalog: Catalog):
+        self.n_terms = len(catalog.vocab)
+        self.genres = self._to_csr(catalog.genres, self.n_terms)
+        self.keywords = self._to_csr(catalog.keywords, self.n_terms)
+        # Binaria (item tiene el término) y ponderada (contribución al score)
+        self.items = sp.hstack([self.genres, self.keywords], format='csr')
+        self.weighted = sp.hstack([self.genres * 2, self.keywords], format='csr')
+        self.weighted_t = self.weighted.T.tocsr()
+
+    @staticmethod
+    def _to_csr(column: TermColumn, n_terms: int) -> sp.csr_matrix:
+        data = np.ones(len(column.values), dtype=np.int32)
+        return sp.csr_matrix((data, column.values, column.offsets), shape=(len(column), n_terms))
+
+    @property
+    def n_items(self) -> int:
+        return self.items.shape[0]
+
+    def profile_vector(self, genre_ids: np.ndarray, keyword_ids: np.ndarray) -> np.ndarray:
+        """Vector binario denso del perfil en el espacio de términos."""
+        vec = np.zeros(self.items.shape[1], dtype=np.int32)
+        vec[genre_ids] = 1
+        vec[self.n_terms + keyword_ids] = 1
+        return vec
+
+    def score(self, profile: np.ndarray) -> np.ndarray:
+        """Un único producto matriz-vector puntúa todo el catálogo."""
+        return self.weighted @ profile
+
+    def score_batch(self, liked_positions: List[np.ndarray]) -> np.ndarray:
+        """
+        Scores de un lote de usuarios (perfil = unión de términos de sus gustados) con un
+        único producto disperso; los items gustados quedan con score 0.
+
+        """
+        n_users = len(liked_positions)
+        indptr = np.zeros(n_users + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(p) for p in liked_positions])
+        indices = np.concatenate(liked_positions).astype(np.int32) if n_users else np.empty(0, dtype=np.int32)
+        liked = sp.csr_matrix(
+            (np.ones(len(indices), dtype=np.int32), indices, indptr), shape=(n_users, self.n_items)
+        )
+        profiles = liked @ self.items
+        profiles.data[:] = 1
+        scores = (profiles @ self.weighted_t).toarray()
+        rows = np.repeat(np.arange(n_users), np.diff(indptr))
+        scores[rows, indices] = 0
+        return scores
+
+
+def top_n_positions(scores: np.ndarray, top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-N por fila de una matriz (usuarios x items) de scores, en el orden del sort estable
+    original. Devuelve (posiciones, scores); las entradas sin score positivo valen -1 / 0.
+
+    """
+    scores = np.atleast_2d(scores).astype(np.int64)
+    n_items = scores.shape[1]
+    k = min(top_n, n_items)
+    if k <= 0:
+        empty = np.empty((scores.shape[0], 0), dtype=np.int64)
+        return empty, empty
+    keys = scores * n_items + (n_items - 1 - np.arange(n_items))
+    part = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(keys, part, axis=1), axis=1)
+    positions = np.take_along_axis(part, order, axis=1)
+    top_scores = np.take_along_axis(scores, positions, axis=1)
+    positions = np.where(top_scores > 0, positions, -1)
+    return positions, np.where(top_scores > 0, top_scores, 0)
+
+
+def top_n_sparse(positions: np.ndarray, scores: np.ndarray, top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-N sobre pares (posición, score) de los items tocados por el índice."""
+    keep = scores > 0
+    positions, scores = positions[keep], scores[keep]
+    k = min(top_n, len(positions))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    # Misma clave que `top_n_positions`: score descendente y posición ascendente
+    n = int(positions.max()) + 1
+    keys = scores * n + (n - 1 - positions)
+    part = np.argpartition(-keys, k - 1)[:k] if k < len(keys) else np.arange(len(keys))
+    order = part[np.argsort(-keys[part])]
+    return positions[order], scores[order]
+
 
 class Recommender:
     """
     Recomendador simple basado en solapamiento de géneros y keywords.
     Funciona con catálogos multi-dominio (movies, songs, merch, theater, concerts).
+
     """
 
-    def __init__(self):
-        self.catalog_df = None
-        print("Recomendador inicializado")
+    # 'index': índice invertido (por defecto); 'sparse': matrices CSR item-término
+    ENGINES = ('index', 'sparse')
+    BATCH_CELLS = 1 << 24
+
+    def __init__(self, engine: str = 'index'):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Motor desconocido: {engine}. Opciones: {', '.join(self.ENGINES)}")
+        self.engine = engine
+        self.catalog = None
+        self.index = None
+        self.matrix = None
+        self._partitions: Dict[str, object] = {}
+        self._base: Optional[Recommender] = None
+        self._start = 0
+        logger.debug("Recomendador inicializado")
+
+    def load(self, catalog: Union[Catalog, pd.DataFrame], index: Optional[TermIndex] = None):
+        """
+        Carga el catálogo unificado de contenido y construye el índice del motor.
+        `index` permite reutilizar un índice invertido precalculado.
+        """
+        if isinstance(catalog, pd.DataFrame):
+            catalog = Catalog.from_frame(catalog)
+        # El catálogo es inmutable por versión: se comparte sin copiarlo
+        self.catalog = catalog
+        self.index = None
+        self.matrix = None
+        self._partitions = {}
+        self._base = None
+        self._start = 0
+        if not catalog.empty:
+            if self.engine == 'sparse':
+                self.matrix = SparseTermMatrix(catalog)
+            else:
+                self.index = index or TermIndex(catalog)
+        logger.debug("Catálogo cargado: %d items.", len(self.catalog))
+
+    def with_catalog(self, catalog: Catalog, start: int) -> 'Recommender':
+        """
+        Recomendador para una versión actualizada incrementalmente (mismas filas hasta `start`):
+        reutiliza el índice base y sólo indexa `catalog[start:]`.
+
+        """
+        recommender = Recommender.__new__(Recommender)
+        recommender.engine = self.engine
+        recommender.catalog = catalog
+        recommender.index = None
+        recommender.matrix = None
+        recommender._partitions = {}
+        recommender._base = None
+        recommender._start = 0
+        if self.engine == 'sparse':
+            recommender.matrix = SparseTermMatrix(catalog)
+        elif self.index is not None:
+            recommender.index = self.index.with_delta(catalog, start)
+            # Las particiones por dominio también se apoyan en las de la versión base
+            recommender._base = self._base or self
+            recommender._start = start
+        elif not catalog.empty:
+            recommender.index = TermIndex(catalog)
+        return recommender
+
+    def _partition_index(self, content_type: str) -> TermIndex:
+        """Índice invertido de un dominio: base compartida + filas nuevas de ese dominio."""
+        index = self._partitions.get(content_type)
+        if index is None:
+            rows = self.catalog.partition(content_type)
+            if self._base is None:
+                index = TermIndex(self.catalog, rows=rows)
+            else:
+                index = self._base._partition_index(content_type).with_delta(
+                    self.catalog, rows=rows[rows >= self._start])
+            index = self._partitions.setdefault(content_type, index)
+        return index
+
+    def _partition_matrix(self, content_type: str) -> Tuple[np.ndarray, sp.csr_matrix]:
+        """(posiciones, filas ponderadas de la matriz) de un dominio."""
+        partition = self._partitions.get(content_type)
+        if partition is None:
+            rows = self.catalog.partition(content_type)
+            partition = self._partitions.setdefault(content_type, (rows, self.matrix.weighted[rows]))
+        return partition
+
+    def _liked_positions(self, liked_indices: List[int]) -> np.ndarray:
+        positions = np.asarray(list(liked_indices), dtype=np.int64)
+        return np.unique(positions[(positions >= 0) & (positions < len(self.catalog))])
+
+    def _excluded(self, liked: np.ndarray) -> np.ndarray:
+        """Posiciones que nunca se recomiendan: las gustadas y las dadas de baja."""
+        deleted = self.catalog.deleted_positions
+        return np.union1d(liked, deleted) if len(deleted) else liked
+
+    def to_frame(self, positions: List[int], scores: List[int]) -> pd.DataFrame:
+        """DataFrame de candidatos (esquema de `recommend`) para posiciones ya puntuadas."""
+        recs = self.catalog.to_frame(positions)
+        recs['score'] = scores
+        return recs[['id', 'title', 'content_type', 'score', 'genres', 'keywords', 'description']]
+
+    def rank(self, liked_indices: List[int], user_profile: Dict[str, List[str]],
+             top_n: int = 5, item_filter: Optional[ItemFilter] = None) -> Tuple[List[int], List[int]]:
+        """Top-N como listas (posiciones, scores); es la parte de CPU de `recommend`."""
+        if self.catalog is None or self.catalog.empty:
+            return [], []
 
-    def load(self, catalog_df: pd.DataFrame):
-        """Carga el DataFrame unificado de contenido."""
-        self.catalog_df = catalog_df.copy()
-        print(f"Catálogo cargado: {len(self.catalog_df)} items.")
+        vocab = self.catalog.vocab
+        genre_ids = vocab.lookup(user_profile.get('genres', []))
+        keyword_ids = vocab.lookup(user_profile.get('keywords', []))
+        excluded = self._excluded(self._liked_positions(liked_indices))
+        content_type = item_filter.content_type if item_filter is not None else None
+        predicates = item_filter is not None and item_filter.has_predicates
 
-    def recommend(self, liked_indices: List[int], user_profile: Dict[str, List[str]], top_n: int = 5) -> pd.DataFrame:
-        """Recomienda por coincidencia de géneros/keywords (géneros pesan 2x)."""
-        if self.catalog_df is None or self.catalog_df.empty:
+        if self.engine == 'sparse':
+            profile = self.matrix.profile_vector(genre_ids, keyword_ids)
+            if content_type is None:
+                rows, scores = None, self.matrix.score(profile)
+                scores[excluded] = 0
+            else:
+                rows, weighted = self._partition_matrix(content_type)
+                scores = weighted @ profile
+                scores[np.isin(rows, excluded)] = 0
+            if predicates:
+                scores[~item_filter.mask(self.catalog, rows)] = 0
+            positions, top_scores = top_n_positions(scores, top_n)
+            keep = positions[0] >= 0
+            positions = positions[0][keep] if rows is None else rows[positions[0][keep]]
+            return positions.tolist(), top_scores[0][keep].tolist()
+
+        index = self.index if content_type is None else self._partition_index(content_type)
+        positions, scores = index.score(genre_ids, keyword_ids)
+        scores[np.isin(positions, excluded)] = 0
+        if predicates:
+            scores[~item_filter.mask(self.catalog, positions)] = 0
+        # Mayor score primero; a igualdad, orden del catálogo (como el sort estable original)
+        positions, scores = top_n_sparse(positions, scores, top_n)
+        return positions.tolist(), scores.tolist()
+
+    def recommend(self, liked_indices: List[int], user_profile: Dict[str, List[str]], top_n: int = 5,
+                  item_filter: Optional[ItemFilter] = None) -> pd.DataFrame:
+        """
+        Recomienda por coincidencia de géneros/keywords (géneros pesan 2x).
+        `item_filter` restringe los candidatos (dominio, fecha, disponibilidad).
+        """
+        if self.catalog is None or self.catalog.empty:
             return pd.DataFrame()
+        return self.to_frame(*self.rank(liked_indices, user_profile, top_n, item_filter))
+
+    def rank_batch(self, queries: Sequence[Tuple[List[int], Dict[str, List[str]], int, Optional[ItemFilter]]]
+                   ) -> List[Tuple[List[int], List[int]]]:
+        """
+        Varias consultas `(liked_indices, user_profile, top_n, item_filter)` de `rank` con un
+        producto disperso por índice; cada resultado coincide con el de `rank`.
+
+        """
+        if self.catalog is None or self.catalog.empty:
+            return [([], []) for _ in queries]
+        vocab = self.catalog.vocab
+        profiles = [(vocab.lookup(user_profile.get('genres', [])), vocab.lookup(user_profile.get('keywords', [])))
+                    for _, user_profile, _, _ in queries]
+        return self._rank_profiles(queries, profiles)
+
+    def _rank_profiles(self, queries: Sequence[tuple], profiles: List[Tuple[np.ndarray, np.ndarray]]
+                       ) -> List[Tuple[List[int], List[int]]]:
+        """`rank_batch` con los perfiles ya como ids de término `(genre_ids, keyword_ids)`."""
+        if self.engine == 'sparse':
+            hits = self._score_profiles(self.matrix.n_terms, self.matrix.weighted_t, profiles)
+        else:
+            groups: Dict[Optional[str], List[int]] = {}
+            for i, (_, _, _, item_filter) in enumerate(queries):
+                groups.setdefault(item_filter.content_type if item_filter is not None else None, []).append(i)
+            hits = [None] * len(queries)
+            for content_type, members in groups.items():
+                index = self.index if content_type is None else self._partition_index(content_type)
+                # Las posiciones del delta son posteriores a las del base: basta con concatenar
+                parts = [self._score_profiles(segment.n_terms, segment.term_matrix(), [profiles[i] for i in members])
+                         for segment in (index, index.delta) if segment is not None]
+                for j, i in enumerate(members):
+                    hits[i] = tuple(np.concatenate([part[j][k] for part in parts]) for k in (0, 1))
+
+        results = []
+        for (liked_indices, _, top_n, item_filter), (positions, row) in zip(queries, hits):
+            row[np.isin(positions, self._excluded(self._liked_positions(liked_indices)))] = 0
+            if item_filter is not None:
+                row[~item_filter.mask(self.catalog, positions)] = 0
+            positions, row = top_n_sparse(positions, row, top_n)
+            results.append((positions.tolist(), row.tolist()))
+        return results
+
+    @staticmethod
+    def _score_profiles(n_terms: int, term_items: sp.csr_matrix,
+                        profiles: List[Tuple[np.ndarray, np.ndarray]]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """(posiciones, scores) por perfil con un único producto perfiles x `term_items`."""
+        indptr, indices = [0], []
+        for genre_ids, keyword_ids in profiles:
+            # Términos posteriores a la matriz no puntúan (como en `TermIndex.score`)
+            indices.append(genre_ids[genre_ids < n_terms])
+            indices.append(keyword_ids[keyword_ids < n_terms] + n_terms)
+            indptr.append(indptr[-1] + len(indices[-2]) + len(indices[-1]))
+        columns = np.concatenate(indices).astype(np.int32) if indices else np.empty(0, dtype=np.int32)
+        matrix = sp.csr_matrix((np.ones(len(columns), dtype=np.int32), columns, np.asarray(indptr, dtype=np.int64)),
+                               shape=(len(profiles), 2 * n_terms))
+        scores = matrix @ term_items
+        return [
+            (scores.indices[scores.indptr[i]:scores.indptr[i + 1]].astype(np.int64),
+             scores.data[scores.indptr[i]:scores.indptr[i + 1]].astype(np.int64))
+            for i in range(len(profiles))
+        ]
+
+    def recommend_batch(self, list_of_liked_indices: List[List[int]], top_n: int = 5) -> List[pd.DataFrame]:
+        """
+        Recomienda para muchos usuarios a la vez (perfil = unión de términos de sus gustados);
+        el ranking coincide con `recommend`.
 
-        df = self.catalog_df.copy()
-        df['genres'] = df['genres'].apply(lambda x: x if isinstance(x, list) else [])
-        df['keywords'] = df['keywords'].apply(lambda x: x if isinstance(x, list) else [])
+        """
+        results = []
+        for positions, top_scores in self.top_n_batch(list_of_liked_indices, top_n):
+            keep = positions >= 0
+            results.append(self.to_frame(positions[keep].tolist(), top_scores[keep].tolist()))
+        return results
 
-        liked_set = set(liked_indices)
-        user_genres = set(user_profile.get('genres', []))
-        user_keywords = set(user_profile.get('keywords', []))
+    def top_n_batch(self, list_of_liked_indices: List[List[int]], top_n: int = 5):
+        """
+        Versión de bajo nivel de `recommend_batch`: genera por usuario arrays (posiciones, scores)
+        de longitud `top_n` rellenos con -1 / 0, procesando los usuarios en bloques.
 
-        scores = []
-        for idx, row in df.iterrows():
-            if idx in liked_set:
+        """
+        if self.catalog is None or self.catalog.empty:
+            for _ in list_of_liked_indices:
+                yield np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+            return
+        catalog = self.catalog
+        chunk = max(1, self.BATCH_CELLS // len(catalog))
+        width = min(top_n, len(catalog))
+        for start in range(0, len(list_of_liked_indices), chunk):
+            liked = [self._liked_positions(l) for l in list_of_liked_indices[start:start + chunk]]
+            if self.engine == 'sparse':
+                scores = self.matrix.score_batch(liked)
+                scores[:, catalog.deleted_positions] = 0
+                yield from zip(*top_n_positions(scores, top_n))
                 continue
-            g_overlap = len(user_genres.intersection(row['genres']))
-            k_overlap = len(user_keywords.intersection(row['keywords']))
-            score = g_overlap * 2 + k_overlap
-            scores.append((idx, score))
-
-        scores.sort(key=lambda x: x[1], reverse=True)
-        top = [i for i, s in scores if s > 0][:top_n]
-        recs = df.loc[top].copy()
-        recs['score'] = [dict(scores)[i] for i in top]
-        return recs[['id', 'title', 'content_type', 'score', 'genres', 'keywords', 'description']]
+            profiles = [(np.unique(catalog.genres.rows(p.tolist())), np.unique(catalog.keywords.rows(p.tolist())))
+                        for p in liked]
+            for positions, scores in self._rank_profiles([(p, None, top_n, None) for p in liked], profiles):
+                top_positions = np.full(width, -1, dtype=np.int64)
+                top_scores = np.zeros(width, dtype=np.int64)
+                top_positions[:len(positions)] = positions
+                top_scores[:len(scores)] = scores
+                yield top_positions, top_scores
+
+
+def diverse_order(scores: List[float], types: List[str], top_n: int, type_penalty: float = 0.5) -> List[int]:
+    """
+    Índices de `top_n` candidatos (en orden de ranking) diversificados por content_type:
+    greedy sobre `score * type_penalty ** k`, con k los ya elegidos de su tipo.
+
+    """
+    remaining = list(range(len(scores)))
+    chosen, per_type = [], {}
+    while remaining and len(chosen) < top_n:
+        best = max(remaining, key=lambda i: (scores[i] * type_penalty ** per_type.get(types[i], 0), -i))
+        chosen.append(best)
+        remaining.remove(best)
+        per_type[types[best]] = per_type.get(types[best], 0) + 1
+    return chosen
+
+
+def rerank_diverse(candidates_df: pd.DataFrame, top_n: int, type_penalty: float = 0.5) -> pd.DataFrame:
+    """`diverse_order` sobre un DataFrame de candidatos (columnas `score` y `content_type`)."""
+    if candidates_df.empty or top_n <= 0:
+        return candidates_df.iloc[:0]
+    chosen = diverse_order(candidates_df['score'].tolist(), candidates_df['content_type'].tolist(), top_n, type_penalty)
+    return candidates_df.iloc[chosen]
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+FILE_PREFIX = 'requests-'
+FILE_SUFFIX = '.jsonl'
+
+
+class RequestLogger:
+    """
+    Registro muestreado de peticiones en JSONL rotativos; `log()` sólo encola y `run` escribe por lotes en un hilo.
+    Si el buffer (`max_buffer`) se llena se descartan registros (`dropped`) en lugar de frenar las peticiones.
+    """
+
+    def __init__(self, directory: str, sample_rate: float = 1.0, max_bytes: int = 64 << 20, backups: int = 10,
+                 flush_interval: float = 1.0, batch_size: int = 1000, max_buffer: int = 100_000):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self._buffer: List[dict] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._path: Optional[str] = None
+        self._size = 0
+        self._seq = 0
+        # Un volcado en un hilo puede seguir en curso cuando `run` hace el último
+        self._write_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def log(self, record: dict):
+        """Encola un registro sin hacer E/S."""
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self):
+        """Tarea de fondo: vuelca el buffer periódicamente (y al cancelarse)."""
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                await self.flush()
+        finally:
+            # Último volcado síncrono: al apagar no queda event loop para esperar. Si se
+            # canceló un `flush`, su hilo puede seguir escribiendo: `_write` espera al lock
+            self._write(self._take())
+
+    async def flush(self):
+        records = self._take()
+        if records:
+            await asyncio.to_thread(self._write, records)
+
+    def _take(self) -> List[dict]:
+        records, self._buffer = self._buffer, []
+        return records
+
+    def _write(self, records: List[dict]):
+        if not records:
+            return
+        lines = [json.dumps(r, ensure_ascii=False, separators=(',', ':')) + '\n' for r in records]
+        sizes = [len(line.encode('utf-8')) for line in lines]
+        start = 0
+        with self._write_lock:
+            try:
+                while start < len(lines):
+                    # Tantas líneas como quepan en el fichero actual (al menos una)
+                    room = self.max_bytes - self._current_size()
+                    end, used = start + 1, sizes[start]
+                    while end < len(lines) and used + sizes[end] <= room:
+                        used += sizes[end]
+                        end += 1
+                    if used > room and self._size > 0:
+                        self._rotate()
+                        continue
+                    with open(self._path, 'a', encoding='utf-8') as f:
+                        f.write(''.join(lines[start:end]))
+                    self._size += used
+                    self.written += end - start
+                    start = end
+            except OSError as e:
+                self.dropped += len(lines) - start
+                logger.warning("No se pudo escribir el log de peticiones en %s: %s", self.directory, e)
+
+    def _current_size(self) -> int:
+        if self._path is None:
+            self._rotate()
+        return self._size
+
+    def _rotate(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # El número de secuencia desempata rotaciones dentro del mismo segundo
+        self._seq += 1
+        name = f"{FILE_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._seq:04d}{FILE_SUFFIX}"
+        self._path = os.path.join(self.directory, name)
+        self._size = 0
+        self._prune()
+
+    def _prune(self):
+        files = log_files(self.directory)
+        for path in files[:max(0, len(files) - self.backups)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def log_files(directory: str) -> List[str]:
+    """Ficheros de log de un directorio, del más antiguo al más reciente."""
+    if not os.path.isdir(directory):
+        return []
+    paths = [os.path.join(directory, name) for name in os.listdir(directory)
+             if name.startswith(FILE_PREFIX) and name.endswith(FILE_SUFFIX)]
+    return sorted(paths, key=lambda p: (os.path.getmtime(p), p))
+
+
+def read_records(paths: Iterable[str]) -> Iterator[Dict]:
+    """Registros de uno o varios ficheros o directorios de log; ignora líneas corruptas."""
+    for path in paths:
+        files = log_files(path) if os.path.isdir(path) else [path]
+        for filepath in files:
+            with open(filepath, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(record, dict):
+                        yield record
@@ -0,0 +1,168 @@
+import os
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from src.binary_snapshot import open_snapshot
+from src.catalog import ItemFilter
+from src.catalog_store import CatalogSnapshot, CatalogStore
+from src.metrics import SCORING_BATCH_SIZE, SCORING_QUEUE_SECONDS, timed
+from src.recommender import Recommender
+
+
+class StaleSnapshot(Exception):
+    """El snapshot binario en disco ya no es el que usa el proceso principal."""
+
+
+# Estado por proceso del pool: recomendador sobre el snapshot mapeado vigente
+_worker: Dict[str, object] = {}
+
+
+def _worker_recommender(source_file: Tuple[str, float]) -> Recommender:
+    if _worker.get('source_file') != source_file:
+        path, built_at = source_file
+        snapshot_file = open_snapshot(path)
+        if snapshot_file.built_at != built_at:
+            raise StaleSnapshot(path)
+        recommender = Recommender()
+        recommender.load(snapshot_file.catalog, index=snapshot_file.index)
+        _worker['source_file'] = source_file
+        _worker['recommender'] = recommender
+    return _worker['recommender']
+
+
+def _rank(source_file: Tuple[str, float], liked_indices: List[int], user_profile: Dict[str, List[str]],
+          top_n: int, item_filter: Optional[ItemFilter] = None) -> Tuple[List[int], List[int]]:
+    return _worker_recommender(source_file).rank(liked_indices, user_profile, top_n, item_filter)
+
+
+class ScoringPool:
+    """
+    Pool de procesos para la puntuación por géneros/keywords; los procesos abren con `mmap` el snapshot binario.
+    Las versiones con actualizaciones incrementales no están en disco y se puntúan en el proceso principal.
+    """
+
+    def __init__(self, processes: int):
+        # 'spawn': no se hereda el estado del event loop ni hilos del servidor
+        self.executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+
+    @staticmethod
+    def accepts(snapshot: CatalogSnapshot) -> bool:
+        return snapshot.source_file is not None
+
+    async def rank(self, snapshot: CatalogSnapshot, liked_indices: List[int], user_profile: Dict[str, List[str]],
+                   top_n: int, item_filter: Optional[ItemFilter] = None) -> Tuple[List[int], List[int]]:
+        """(posiciones, scores) calculados en el pool; si el fichero cambió, en este proceso."""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, _rank, snapshot.source_file,
+                                              list(liked_indices), user_profile, top_n, item_filter)
+        except StaleSnapshot:
+            return snapshot.recommender.rank(liked_indices, user_profile, top_n, item_filter)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+@dataclass
+class _PendingRank:
+    recommender: Recommender
+    query: tuple
+    future: asyncio.Future
+    enqueued: float
+
+
+def _rank_batch(recommender: Recommender, queries: List[tuple]) -> List[Tuple[List[int], List[int]]]:
+    with timed("scoring_batch"):
+        return recommender.rank_batch(queries)
+
+
+class ScoringBatcher:
+    """
+    Micro-batching de la puntuación: las consultas de una ventana corta (o hasta `max_batch`) se puntúan juntas
+    con `Recommender.rank_batch` en un hilo, y cada corrutina recibe su resultado.
+    """
+
+    def __init__(self, window_ms: float = 2.0, max_batch: int = 32):
+        self.window = max(0.0, window_ms) / 1000
+        self.max_batch = max(1, max_batch)
+        self._queue: Optional[asyncio.Queue] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def rank(self, recommender: Recommender, liked_indices: List[int], user_profile: Dict[str, List[str]],
+                   top_n: int, item_filter: Optional[ItemFilter] = None) -> Tuple[List[int], List[int]]:
+        """Como `Recommender.rank`, pero puntuado junto con las consultas concurrentes."""
+        if self._task is None:
+            self._queue, self._full = asyncio.Queue(), asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_PendingRank(recommender, (list(liked_indices), user_profile, top_n, item_filter),
+                                            future, time.perf_counter()))
+        # La primera consulta del lote ya salió de la cola
+        if self._queue.qsize() >= self.max_batch - 1:
+            self._full.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            remaining = batch[0].enqueued + self.window - time.perf_counter()
+            if remaining > 0 and self._queue.qsize() + 1 < self.max_batch:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            started = time.perf_counter()
+            for pending in batch:
+                SCORING_QUEUE_SECONDS.observe(started - pending.enqueued)
+            SCORING_BATCH_SIZE.observe(len(batch))
+            await self._score(batch)
+
+    async def _score(self, batch: List[_PendingRank]):
+        loop = asyncio.get_running_loop()
+        # Tras un cambio de versión del catálogo un lote puede mezclar recomendadores
+        groups: Dict[int, List[_PendingRank]] = {}
+        for pending in batch:
+            # Las peticiones canceladas (cliente desconectado) no se puntúan
+            if not pending.future.done():
+                groups.setdefault(id(pending.recommender), []).append(pending)
+        for group in groups.values():
+            try:
+                results = await loop.run_in_executor(None, _rank_batch, group[0].recommender,
+                                                     [pending.query for pending in group])
+            except Exception as e:
+                for pending in group:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                continue
+            for pending, result in zip(group, results):
+                if not pending.future.done():
+                    pending.future.set_result(result)
+
+    def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            while not self._queue.empty():
+                self._queue.get_nowait().future.cancel()
+
+
+def prepare_shared_catalog(data_dir: str, snapshot_path: str, semantic: bool = False,
+                           embeddings_path: Optional[str] = None) -> CatalogSnapshot:
+    """Construye en el proceso padre el snapshot binario (y los embeddings) que los workers abren con `mmap`."""
+    store = CatalogStore(data_dir, snapshot_path=snapshot_path, semantic=semantic, embeddings_path=embeddings_path)
+    snapshot = store.load()
+    if snapshot.source_file is None:
+        raise RuntimeError(f"No se pudo generar el snapshot compartido en {snapshot_path}")
+    return snapshot
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
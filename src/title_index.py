@@ -0,0 +1,360 @@
+import bisect
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src.catalog import Catalog, StringColumn, stable_hash
+from src.json_response import dumps
+
+
+def normalize_title(title: str) -> str:
+    """Normaliza para comparar: sin acentos, casefold y espacios colapsados."""
+    if not isinstance(title, str):
+        return ''
+    decomposed = unicodedata.normalize('NFKD', title)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(stripped.casefold().split())
+
+
+def trigrams(text: str) -> Set[str]:
+    """Trigramas de un texto normalizado, con relleno de espacios como pg_trgm."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _trigram_code(trigram: str) -> int:
+    """Trigrama como entero (21 bits por carácter): ordenable y buscable con numpy."""
+    return (ord(trigram[0]) << 42) | (ord(trigram[1]) << 21) | ord(trigram[2])
+
+
+class TitleSearchIndex:
+    """
+    Búsqueda aproximada sobre títulos normalizados únicos: trigramas (similitud tipo Jaccard)
+    y prefijos de palabra (autocompletado). Todo son arrays, guardables en el snapshot binario.
+
+    """
+
+    MAX_CANDIDATES = 256
+    COMMON_FRACTION = 0.05
+
+    def __init__(self, keys: StringColumn, trigram_codes: np.ndarray, offsets: np.ndarray, postings: np.ndarray,
+                 prefix_keys: np.ndarray, prefix_starts: np.ndarray):
+        self.keys = keys
+        # Códigos de trigrama ordenados; `postings[offsets[t]:offsets[t + 1]]` son sus key_ids
+        self.trigram_codes = trigram_codes
+        self.offsets = offsets
+        self.postings = postings
+        # (key_id, offset en caracteres) de cada inicio de palabra, ordenado por el sufijo
+        self.prefix_keys = prefix_keys
+        self.prefix_starts = prefix_starts
+        self.common_limit = max(1000, int(len(keys) * self.COMMON_FRACTION))
+
+    @classmethod
+    def build(cls, keys: List[str]) -> 'TitleSearchIndex':
+        rows = [[_trigram_code(t) for t in trigrams(key)] for key in keys]
+        lengths = np.fromiter((len(r) for r in rows), dtype=np.int64, count=len(rows))
+        codes = np.fromiter((c for r in rows for c in r), dtype=np.int64, count=int(lengths.sum()))
+        key_ids = np.repeat(np.arange(len(keys), dtype=np.int32), lengths)
+        trigram_codes, values = np.unique(codes, return_inverse=True)
+        order = np.argsort(values, kind='stable')
+        offsets = np.zeros(len(trigram_codes) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(values, minlength=len(trigram_codes)))
+
+        starts = []
+        for key_id, key in enumerate(keys):
+            offset = 0
+            for word in key.split(' '):
+                starts.append((key_id, offset))
+                offset += len(word) + 1
+        starts.sort(key=lambda e: keys[e[0]][e[1]:])
+        return cls(
+            StringColumn.from_strings(keys), trigram_codes, offsets, key_ids[order],
+            np.fromiter((e[0] for e in starts), dtype=np.int32, count=len(starts)),
+            np.fromiter((e[1] for e in starts), dtype=np.int32, count=len(starts)),
+        )
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            'keys.data': self.keys.data,
+            'keys.offsets': self.keys.offsets,
+            'trigram_codes': self.trigram_codes,
+            'trigram_offsets': self.offsets,
+            'trigram_postings': self.postings,
+            'prefix_keys': self.prefix_keys,
+            'prefix_starts': self.prefix_starts,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'TitleSearchIndex':
+        return cls(StringColumn(arrays['keys.data'], arrays['keys.offsets']), arrays['trigram_codes'],
+                   arrays['trigram_offsets'], arrays['trigram_postings'],
+                   arrays['prefix_keys'], arrays['prefix_starts'])
+
+    def similar(self, query: str, threshold: float = 0.0, limit: int = 10) -> List[Tuple[int, float]]:
+        """(key_id, similitud) de los títulos más parecidos, de mayor a menor similitud."""
+        query = normalize_title(query)
+        query_trigrams = trigrams(query)
+        if not query or not len(self.trigram_codes):
+            return []
+        codes = np.fromiter((_trigram_code(t) for t in query_trigrams), dtype=np.int64, count=len(query_trigrams))
+        found = np.minimum(np.searchsorted(self.trigram_codes, codes), len(self.trigram_codes) - 1)
+        ids = found[self.trigram_codes[found] == codes].tolist()
+        if not ids:
+            return []
+        rare = [t for t in ids if self.offsets[t + 1] - self.offsets[t] <= self.common_limit] or ids
+        candidates = np.concatenate([self.postings[self.offsets[t]:self.offsets[t + 1]] for t in rare])
+        key_ids, hits = np.unique(candidates, return_counts=True)
+        if len(key_ids) > self.MAX_CANDIDATES:
+            top = np.argsort(-hits, kind='stable')[:self.MAX_CANDIDATES]
+            key_ids = key_ids[np.sort(top)]
+
+        scored = []
+        for key_id in key_ids.tolist():
+            key_trigrams = trigrams(self.keys[key_id])
+            common = len(query_trigrams & key_trigrams)
+            similarity = common / (len(query_trigrams) + len(key_trigrams) - common)
+            if similarity >= threshold:
+                scored.append((key_id, similarity))
+        scored.sort(key=lambda e: (-e[1], e[0]))
+        return scored[:limit]
+
+    def prefixed(self, prefix: str, limit: int = 10) -> List[int]:
+        """key_ids con alguna palabra que empieza por `prefix`; primero los que empiezan el título."""
+        prefix = normalize_title(prefix)
+        if not prefix:
+            return []
+        keys, prefix_keys, prefix_starts = self.keys, self.prefix_keys, self.prefix_starts
+        start = bisect.bisect_left(range(len(prefix_keys)), prefix,
+                                   key=lambda i: keys[prefix_keys[i]][prefix_starts[i]:])
+        title_starts, word_starts, seen = [], [], set()
+        for i in range(start, len(prefix_keys)):
+            key_id, offset = int(prefix_keys[i]), int(prefix_starts[i])
+            if not keys[key_id].startswith(prefix, offset):
+                break
+            if key_id in seen:
+                continue
+            seen.add(key_id)
+            (title_starts if offset == 0 else word_starts).append(key_id)
+            if len(title_starts) >= limit or len(seen) >= limit * 20:
+                break
+        return (sorted(title_starts) + sorted(word_starts))[:limit]
+
+
+class TitleIndex:
+    """
+    Índices de títulos y de (content_type, id) -> posición, construidos una vez por versión.
+    Tras actualizaciones sólo cubre `catalog[start:]` y delega el resto en `base`.
+
+    """
+
+    MAX_CACHED_JSON = 200_000
+
+    def __init__(self, catalog: Catalog, image_url: str = '', match_threshold: float = 0.45,
+                 start: int = 0, base: Optional['TitleIndex'] = None):
+        self._setup(catalog, image_url, match_threshold, start, base, self.build_arrays(catalog, start))
+
+    @classmethod
+    def from_arrays(cls, catalog: Catalog, arrays: Dict[str, np.ndarray], image_url: str = '',
+                    match_threshold: float = 0.45) -> 'TitleIndex':
+        """Índice de un catálogo completo a partir de `to_arrays` (p. ej. de un snapshot mapeado)."""
+        index = cls.__new__(cls)
+        index._setup(catalog, image_url, match_threshold, 0, None, arrays)
+        return index
+
+    def _setup(self, catalog: Catalog, image_url: str, match_threshold: float, start: int,
+               base: Optional['TitleIndex'], arrays: Dict[str, np.ndarray]):
+        self.catalog = catalog
+        self.image_url = image_url
+        self.match_threshold = match_threshold
+        self.start = start
+        self.base = base
+        self.categories = {str(c): code for code, c in enumerate(catalog.content_types.categories)}
+        # key_id -> posiciones (CSR) y hashes de los títulos ordenados para buscarlos
+        self.key_offsets = arrays['key_offsets']
+        self.key_positions = arrays['key_positions']
+        self.key_hashes = arrays['key_hashes']
+        self.key_order = arrays['key_order']
+        # Posiciones ordenadas por (código de content_type, id)
+        self.item_codes = arrays['item_codes']
+        self.item_ids = arrays['item_ids']
+        self.item_positions = arrays['item_positions']
+        self.search = TitleSearchIndex.from_arrays(arrays)
+        self.title_keys = self.search.keys
+        # Payloads serializados a JSON la primera vez que se responden (por versión)
+        self._payload_json: Dict[int, bytes] = {}
+
+    @staticmethod
+    def build_arrays(catalog: Catalog, start: int = 0) -> Dict[str, np.ndarray]:
+        """Arrays del índice sobre las filas vivas de `catalog[start:]`."""
+        keys: Dict[str, int] = {}
+        positions = np.arange(start, len(catalog), dtype=np.int64)
+        deleted = catalog.deleted_positions
+        if len(deleted):
+            positions = np.setdiff1d(positions, deleted[deleted >= start], assume_unique=True)
+        titles = catalog.titles
+        key_of = np.fromiter((keys.setdefault(normalize_title(titles[pos]), len(keys)) for pos in positions.tolist()),
+                             dtype=np.int32, count=len(positions))
+        order = np.argsort(key_of, kind='stable')
+        key_offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        key_offsets[1:] = np.cumsum(np.bincount(key_of, minlength=len(keys)))
+        hashes = np.fromiter((stable_hash(key) for key in keys), dtype=np.int64, count=len(keys))
+        key_order = np.argsort(hashes, kind='stable').astype(np.int32)
+
+        codes = np.asarray(catalog.content_types.codes[positions], dtype=np.int8)
+        ids = np.asarray(catalog.ids[positions], dtype=np.int64)
+        by_item = np.lexsort((ids, codes))
+        arrays = {
+            'key_offsets': key_offsets,
+            'key_positions': positions[order],
+            'key_hashes': hashes[key_order],
+            'key_order': key_order,
+            'item_codes': codes[by_item],
+            'item_ids': ids[by_item],
+            'item_positions': positions[by_item],
+        }
+        arrays.update(TitleSearchIndex.build(list(keys)).to_arrays())
+        return arrays
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {
+            'key_offsets': self.key_offsets,
+            'key_positions': self.key_positions,
+            'key_hashes': self.key_hashes,
+            'key_order': self.key_order,
+            'item_codes': self.item_codes,
+            'item_ids': self.item_ids,
+            'item_positions': self.item_positions,
+        }
+        arrays.update(self.search.to_arrays())
+        return arrays
+
+    def with_catalog(self, catalog: Catalog, start: int) -> 'TitleIndex':
+        """Índice para una versión actualizada: indexa `catalog[start:]` sobre el índice base."""
+        return TitleIndex(catalog, self.image_url, self.match_threshold, start=start, base=self.base or self)
+
+    def _layers(self) -> List['TitleIndex']:
+        # Las filas más recientes primero
+        return [self, self.base] if self.base is not None else [self]
+
+    def _live(self, positions: Iterable[int]) -> List[int]:
+        is_live = self.catalog.is_live
+        return [pos for pos in positions if is_live(pos)]
+
+    def _positions(self, key_id: int) -> List[int]:
+        return self.key_positions[self.key_offsets[key_id]:self.key_offsets[key_id + 1]].tolist()
+
+    def _exact(self, key: str) -> List[int]:
+        """Posiciones (de esta capa) con título normalizado `key`."""
+        h = stable_hash(key)
+        lo, hi = np.searchsorted(self.key_hashes, h, 'left'), np.searchsorted(self.key_hashes, h, 'right')
+        for key_id in self.key_order[lo:hi].tolist():
+            if self.title_keys[key_id] == key:
+                return self._positions(key_id)
+        return []
+
+    def resolve(self, titles: Iterable[str], fuzzy: bool = True) -> List[int]:
+        """
+        Posiciones de los títulos dados (sin distinguir mayúsculas ni acentos). Con `fuzzy`, un
+        título sin coincidencia exacta se resuelve al mejor parecido de todas las capas.
+
+        """
+        found = set()
+        layers = self._layers()
+        for title in titles:
+            key = normalize_title(title)
+            exact = self._live(pos for layer in layers for pos in layer._exact(key))
+            if exact:
+                found.update(exact)
+            elif fuzzy:
+                best, best_rank = [], None
+                for layer in layers:
+                    match = layer.best_match(title)
+                    if match is None or (best_rank is not None and match[1] >= best_rank):
+                        continue
+                    matched = self._live(layer._positions(match[0]))
+                    if matched:
+                        best, best_rank = matched, match[1]
+                found.update(best)
+        return sorted(found)
+
+    def best_match(self, title: str) -> Optional[Tuple[int, Tuple[int, float]]]:
+        """
+        Mejor título de esta capa para una consulta sin coincidencia exacta, como (key_id, rango)
+        o None; menor rango es mejor (prefijo antes que parecido por trigramas).
+
+        """
+        query = normalize_title(title)
+        # Prefijo del título completo que termina en límite de palabra
+        prefixed = [k for k in self.search.prefixed(query, limit=10)
+                    if self.title_keys[k].startswith(query + ' ')]
+        if prefixed:
+            key_id = min(prefixed, key=lambda k: (len(self.title_keys[k]), k))
+            return key_id, (0, len(self.title_keys[key_id]))
+        similar = self.search.similar(title, threshold=self.match_threshold, limit=1)
+        if not similar:
+            return None
+        key_id, similarity = similar[0]
+        return key_id, (1, -similarity)
+
+    def autocomplete(self, query: str, limit: int = 10) -> List[int]:
+        """
+        Posiciones sugeridas: prefijos de todas las capas y después títulos parecidos.
+
+        """
+        prefix = normalize_title(query)
+        layers = self._layers()
+        prefixed = [layer.search.prefixed(query, limit=limit) for layer in layers]
+        hits = []
+        for layer, key_ids in zip(layers, prefixed):
+            for key_id in key_ids:
+                positions = self._live(layer._positions(key_id))
+                if positions:
+                    hits.append((not layer.title_keys[key_id].startswith(prefix), positions[0], positions))
+        ranked = sorted(hits, key=lambda hit: hit[:2])
+        if sum(len(hit[2]) for hit in hits) < limit:
+            similar = []
+            for layer, key_ids in zip(layers, prefixed):
+                seen = set(key_ids)
+                for key_id, similarity in layer.search.similar(query, threshold=0.2, limit=limit):
+                    positions = self._live(layer._positions(key_id)) if key_id not in seen else []
+                    if positions:
+                        similar.append((-similarity, positions[0], positions))
+            ranked += sorted(similar, key=lambda hit: hit[:2])
+        return list(dict.fromkeys(pos for hit in ranked for pos in hit[2]))[:limit]
+
+    def lookup(self, content_type: str, item_id) -> Optional[int]:
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            return None
+        code = self.categories.get(content_type)
+        if code is None:
+            return None
+        for layer in self._layers():
+            lo = np.searchsorted(layer.item_codes, code, 'left')
+            hi = np.searchsorted(layer.item_codes, code, 'right')
+            ids = layer.item_ids[lo:hi]
+            first, last = np.searchsorted(ids, item_id, 'left'), np.searchsorted(ids, item_id, 'right')
+            for pos in layer.item_positions[lo + first:lo + last].tolist():
+                if self.catalog.is_live(pos):
+                    return pos
+        return None
+
+    def payload(self, pos: int) -> dict:
+        return {"name": self.catalog.titles[pos], "description": self.catalog.descriptions[pos],
+                "image": self.image_url}
+
+    def payload_json(self, pos: int) -> bytes:
+        """
+        `payload` ya serializado, calculado una vez por item (como mucho `MAX_CACHED_JSON` por capa).
+
+        """
+        if pos < self.start:
+            return self.base.payload_json(pos)
+        data = self._payload_json.get(pos)
+        if data is None:
+            data = dumps(self.payload(pos))
+            if len(self._payload_json) < self.MAX_CACHED_JSON:
+                self._payload_json[pos] = data
+        return data
@@ -1,28 +1,37 @@
+import logging
 import numpy as np
 import pandas as pd
-from typing import List, Dict
+from dataclasses import dataclass
+from typing import List, Dict, Optional
 
-def create_user_profile(liked_movies_indices: List[int], movie_embeddings: np.ndarray, movies_df: pd.DataFrame) -> np.ndarray:
+from src.catalog import Catalog
+
+logger = logging.getLogger(__name__)
+
+def create_user_profile(liked_movies_indices: List[int], movie_embeddings: np.ndarray,
+                        movies_df: Optional[pd.DataFrame] = None) -> np.ndarray:
     """
     Crea un perfil de usuario promediando los embeddings de las películas que le han gustado.
 
     Args:
         liked_movies_indices (List[int]): Lista de índices de las películas que le han gustado al usuario.
         movie_embeddings (np.ndarray): Array de NumPy con todos los embeddings de películas.
-        movies_df (pd.DataFrame): DataFrame con los datos de las películas.
+        movies_df (pd.DataFrame, opcional): DataFrame con los datos de las películas; sólo
+            se usa para registrar los títulos en el log de depuración.
 
     Returns:
         np.ndarray: El vector de perfil de usuario.
     """
     if not liked_movies_indices:
-        print("Advertencia: No se proporcionaron películas gustadas para crear el perfil.")
+        logger.warning("No se proporcionaron películas gustadas para crear el perfil.")
         return np.zeros(movie_embeddings.shape[1])
 
     liked_embeddings = movie_embeddings[liked_movies_indices]
     user_profile_vector = np.mean(liked_embeddings, axis=0)
 
-    liked_titles = movies_df.loc[liked_movies_indices, 'title'].tolist()
-    print(f"Perfil de usuario creado a partir de las películas: {', '.join(liked_titles)}")
+    if movies_df is not None and logger.isEnabledFor(logging.DEBUG):
+        liked_titles = movies_df.loc[liked_movies_indices, 'title'].tolist()
+        logger.debug("Perfil de usuario creado a partir de las películas: %s", ', '.join(liked_titles))
     
     return user_profile_vector
 
@@ -64,25 +73,76 @@ def create_fake_user_profile(liked_movies_indices: List[int], movies_df: pd.Data
     keywords = sorted(set(k for lst in liked_movies_df['keywords'] for k in lst))
     return {"genres": genres, "keywords": keywords}
 
-def create_multi_domain_user_profile(liked_indices: List[int], catalog_df: pd.DataFrame) -> Dict[str, List[str]]:
+def create_multi_domain_user_profile(liked_indices: List[int], catalog: Catalog) -> Dict[str, List[str]]:
     """Agrega géneros y keywords de cualquier tipo de contenido gustado."""
     if not liked_indices:
         return {"genres": [], "keywords": []}
-    liked_df = catalog_df.loc[liked_indices]
-    genres = sorted(set(g for lst in liked_df['genres'] for g in lst))
-    keywords = sorted(set(k for lst in liked_df['keywords'] for k in lst))
+    vocab = catalog.vocab
+    genres = sorted(vocab.decode(np.unique(catalog.genres.rows(liked_indices))))
+    keywords = sorted(vocab.decode(np.unique(catalog.keywords.rows(liked_indices))))
     return {"genres": genres, "keywords": keywords}
 
 
-def get_user_liked_summary_multi(liked_indices: List[int], catalog_df: pd.DataFrame) -> str:
+def get_user_liked_summary_multi(liked_indices: List[int], catalog: Catalog) -> str:
     """Genera resumen incluyendo tipos de contenido."""
     if not liked_indices:
         return "El usuario aún no ha marcado contenidos favoritos."
-    liked_df = catalog_df.loc[liked_indices]
-    types = ', '.join(sorted(liked_df['content_type'].unique()))
-    genres = ', '.join(sorted(set(g for lst in liked_df['genres'] for g in lst)))
-    keywords = ', '.join(sorted(set(k for lst in liked_df['keywords'] for k in lst)))
+    profile = create_multi_domain_user_profile(liked_indices, catalog)
+    types = ', '.join(sorted({catalog.content_type(pos) for pos in liked_indices}))
+    genres = ', '.join(profile['genres'])
+    keywords = ', '.join(profile['keywords'])
     return (
         f"El usuario ha mostrado interés en tipos: {types}. Géneros frecuentes: {genres}. "
         f"Temas/keywords: {keywords}."
-    )
\ No newline at end of file
+    )
+
+
+@dataclass(frozen=True)
+class LikedSummary:
+    """
+    Resumen de gustos estructurado: géneros y keywords ordenados por peso (en
+    cuántos items gustados aparecen), para poder recortarlo a un presupuesto de
+    tokens conservando los términos más representativos.
+    """
+    types: List[str]
+    genres: List[str]
+    keywords: List[str]
+
+    def text(self, max_terms: Optional[int] = None) -> str:
+        if not self.types:
+            return "El usuario aún no ha marcado contenidos favoritos."
+        genres = ', '.join(self.genres[:max_terms])
+        keywords = ', '.join(self.keywords[:max_terms])
+        return (
+            f"El usuario ha mostrado interés en tipos: {', '.join(self.types)}. Géneros frecuentes: {genres}. "
+            f"Temas/keywords: {keywords}."
+        )
+
+    def levels(self) -> List[Optional[int]]:
+        """Límites de términos de más a menos detalle: completo y luego a la mitad hasta 1."""
+        levels: List[Optional[int]] = [None]
+        n = max(len(self.genres), len(self.keywords)) // 2
+        while n >= 1:
+            levels.append(n)
+            n //= 2
+        return levels
+
+    def __str__(self) -> str:
+        return self.text()
+
+
+def _ranked_terms(term_ids: np.ndarray, catalog: Catalog) -> List[str]:
+    ids, counts = np.unique(term_ids, return_counts=True)
+    terms = catalog.vocab.decode(ids)
+    return [term for _, term in sorted(zip(-counts, terms))]
+
+
+def summarize_liked_multi(liked_indices: List[int], catalog: Catalog) -> LikedSummary:
+    """Como `get_user_liked_summary_multi`, con los términos ordenados por peso."""
+    if not liked_indices:
+        return LikedSummary([], [], [])
+    return LikedSummary(
+        types=sorted({catalog.content_type(pos) for pos in liked_indices}),
+        genres=_ranked_terms(catalog.genres.rows(liked_indices), catalog),
+        keywords=_ranked_terms(catalog.keywords.rows(liked_indices), catalog),
+    )
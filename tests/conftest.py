@@ -0,0 +1,72 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Los módulos se importan como `src.x`, igual que desde api.py
+sys.path.insert(0, ROOT)
+
+from src.data_loader import load_catalog  # noqa: E402
+
+DATA_DIR = os.path.join(ROOT, 'Data')
+
+
+@pytest.fixture
+def catalog():
+    """Catálogo de ejemplo de `Data/` (cinco dominios, 25 items)."""
+    return load_catalog(DATA_DIR)
+
+
+@pytest.fixture(scope='session')
+def synthetic_dir(tmp_path_factory):
+    """Directorio con un catálogo sintético de unos miles de items."""
+    from benchmarks.synthetic_catalog import generate
+
+    path = str(tmp_path_factory.mktemp('synthetic'))
+    generate(5000, path, seed=1)
+    return path
+
+
+class FakeJustifier:
+    """
+    Sustituye al LLM: cada párrafo es distinto y la selección JSON elige los
+    últimos candidatos tras `delay` segundos.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.calls = 0
+        self.completed = 0
+        self.delay = delay
+
+    async def recommend_json(self, candidates_df, user_summary, top_n=3, fragments=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        self.completed += 1
+        picks = candidates_df.tail(top_n)
+        return json.dumps({'recommendations': [{'id': int(item_id), 'content_type': content_type}
+                                               for item_id, content_type in zip(picks['id'], picks['content_type'])]})
+
+    async def recommend_paragraph(self, candidates_df, user_summary, top_n=3, fragments=None):
+        self.calls += 1
+        return f'Párrafo {self.calls}.'
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """API sobre el catálogo de `Data/`, sin snapshot ni precalentado y con `FakeJustifier` como LLM."""
+    import api
+
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    monkeypatch.setattr(api, 'DATA_DIR', DATA_DIR)
+    monkeypatch.setattr(api, 'CATALOG_SNAPSHOT', None)
+    monkeypatch.setattr(api, 'CANDIDATE_WARM_TOP_K', 0)
+    with TestClient(api.app) as client:
+        client.app.state.justifier = FakeJustifier()
+        yield client
@@ -0,0 +1,78 @@
+import time
+
+import numpy as np
+
+from src.binary_snapshot import is_fresh, open_snapshot, write_snapshot
+from src.catalog import StringColumn
+from src.catalog_store import CatalogStore
+from src.data_loader import load_catalog
+from src.recommender import TermIndex
+from src import title_index
+
+
+def test_round_trip(catalog, tmp_path):
+    path = str(tmp_path / 'catalog.snap')
+    write_snapshot(catalog, path, sources={'movies.json': 1.0})
+    snapshot = open_snapshot(path)
+    opened = snapshot.catalog
+
+    assert is_fresh(path, {'movies.json': 1.0})
+    assert not is_fresh(path, {'movies.json': 2.0})
+    assert len(opened) == len(catalog)
+    np.testing.assert_array_equal(opened.ids, catalog.ids)
+    np.testing.assert_array_equal(opened.dates, catalog.dates)
+    np.testing.assert_array_equal(opened.available, catalog.available)
+    assert list(opened.titles) == list(catalog.titles)
+    assert list(opened.descriptions) == list(catalog.descriptions)
+    assert opened.vocab.terms == catalog.vocab.terms
+    for pos in range(len(catalog)):
+        assert opened.content_type(pos) == catalog.content_type(pos)
+        assert opened.genres_of(pos) == catalog.genres_of(pos)
+        assert opened.keywords_of(pos) == catalog.keywords_of(pos)
+
+    index = TermIndex(catalog)
+    np.testing.assert_array_equal(snapshot.index.genre_postings, index.genre_postings)
+    np.testing.assert_array_equal(snapshot.index.keyword_offsets, index.keyword_offsets)
+
+    terms = catalog.genres_of(0) + ['no existe']
+    assert opened.vocab.lookup(terms).tolist() == catalog.vocab.lookup(terms).tolist()
+
+
+def test_title_index_from_snapshot_matches_rebuild(catalog, tmp_path):
+    path = str(tmp_path / 'catalog.snap')
+    write_snapshot(catalog, path)
+    snapshot = open_snapshot(path)
+    opened = title_index.TitleIndex.from_arrays(snapshot.catalog, snapshot.title_arrays)
+    rebuilt = title_index.TitleIndex(catalog)
+
+    for query in ['Interstellar', 'inter', 'the', 'matriz', 'zzz']:
+        assert opened.resolve([query]) == rebuilt.resolve([query])
+        assert opened.autocomplete(query, 5) == rebuilt.autocomplete(query, 5)
+    for pos in range(len(catalog)):
+        assert opened.lookup(catalog.content_type(pos), catalog.ids[pos]) == pos
+        assert opened.payload_json(pos) == rebuilt.payload_json(pos)
+
+
+def test_startup_from_snapshot_does_no_per_item_work(synthetic_dir, tmp_path, monkeypatch):
+    """
+    Abrir un snapshot vigente no recorre el catálogo en Python: ni decodifica
+    cadenas ni normaliza títulos, así que el arranque no crece con el catálogo.
+    """
+    path = str(tmp_path / 'catalog.snap')
+    store = CatalogStore(synthetic_dir, snapshot_path=path)
+    write_snapshot(load_catalog(synthetic_dir), path, sources=store.scan_mtimes())
+
+    decoded = []
+    getitem = StringColumn.__getitem__
+    monkeypatch.setattr(StringColumn, '__getitem__', lambda self, pos: decoded.append(pos) or getitem(self, pos))
+    normalize = title_index.normalize_title
+    monkeypatch.setattr(title_index, 'normalize_title', lambda text: decoded.append(text) or normalize(text))
+
+    start = time.perf_counter()
+    snapshot = CatalogStore(synthetic_dir, snapshot_path=path).load()
+    elapsed = time.perf_counter() - start
+
+    assert snapshot.source_file is not None
+    assert len(snapshot.catalog) >= 5000
+    assert decoded == []
+    assert elapsed < 0.1
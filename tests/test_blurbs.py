@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from src.blurbs import (GENRE, ITEM, Blurbs, BlurbStore, compose_paragraph, generate_blurbs, genre_tasks,
+                        item_tasks, stub_chat)
+from src.user_porfile import LikedSummary
+
+
+def _tasks(catalog):
+    return list(genre_tasks(catalog)) + list(item_tasks(catalog))
+
+
+def _generate(tasks, store, chat=stub_chat, **kwargs):
+    return asyncio.run(generate_blurbs(iter(tasks), store, chat, concurrency=4, **kwargs))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = BlurbStore(str(tmp_path / 'blurbs.db'))
+    yield store
+    store.close()
+
+
+def test_generate_blurbs_resumes_where_it_stopped(catalog, store):
+    tasks = _tasks(catalog)
+    first = _generate(tasks, store, limit=10, commit_every=3)
+    assert first == {'generated': 10, 'failed': 0, 'skipped': 0}
+
+    second = _generate(tasks, store)
+    assert second == {'generated': len(tasks) - 10, 'failed': 0, 'skipped': 10}
+    blurbs = store.load()
+    assert len(blurbs) == len(tasks)
+    assert blurbs.item('movie', 1)
+
+    assert _generate(tasks, store) == {'generated': 0, 'failed': 0, 'skipped': len(tasks)}
+
+
+def test_empty_answers_count_as_failed_and_are_retried(catalog, store):
+    tasks = _tasks(catalog)
+    songs = {t.key for t in tasks if t.kind == ITEM and t.key.startswith('song:')}
+
+    async def flaky_chat(system_msg, prompt):
+        # El LLM devuelve '' cuando la llamada falla
+        if 'Tipo: canción' in prompt and 'Título:' in prompt:
+            return '  '
+        return await stub_chat(system_msg, prompt)
+
+    stats = _generate(tasks, store, chat=flaky_chat)
+    assert stats == {'generated': len(tasks) - len(songs), 'failed': len(songs), 'skipped': 0}
+    assert not songs & store.keys(ITEM)
+
+    stats = _generate(tasks, store)
+    assert stats == {'generated': len(songs), 'failed': 0, 'skipped': len(tasks) - len(songs)}
+    assert songs <= store.keys(ITEM)
+
+
+def test_generated_blurbs_are_kept_when_the_job_is_interrupted(catalog, store):
+    tasks = _tasks(catalog)
+    calls = 0
+
+    async def broken_chat(system_msg, prompt):
+        nonlocal calls
+        calls += 1
+        if calls > 3:
+            raise RuntimeError('conexión perdida')
+        return await stub_chat(system_msg, prompt)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(generate_blurbs(iter(tasks), store, broken_chat, concurrency=1))
+    assert len(store.keys(GENRE)) + len(store.keys(ITEM)) == 3
+
+
+def _sentence(paragraph, title):
+    return next(s for s in paragraph.split('«')[1:] if s.startswith(title + '»'))
+
+
+def test_compose_paragraph_falls_back_from_item_to_genre_to_description(catalog):
+    candidates = catalog.to_frame([0, 1, 3, 5])
+    candidates['score'] = [8, 7, 6, 5]
+    summary = LikedSummary(types=['movie'], genres=['Drama', 'Crime'], keywords=['joker'])
+    blurbs = Blurbs(
+        items={'movie:1': 'Blurb de Inception.'},
+        genres={'movie:action': 'Acción sin pausa.', 'movie:drama': 'Drama intenso.',
+                'movie:thriller': 'Tensión constante.'},
+    )
+    paragraph = compose_paragraph(candidates, summary, top_n=4, blurbs=blurbs)
+
+    assert paragraph.startswith('Como te gustan drama y crime y temas como joker, te proponemos:')
+    # El blurb del item gana a los de sus géneros
+    assert _sentence(paragraph, 'Inception').startswith('Inception» (película): Blurb de Inception.')
+    # Después, el del género del usuario que mejor casa, antes que el primero del item (Action)
+    assert _sentence(paragraph, 'The Dark Knight').startswith('The Dark Knight» (película): Drama intenso.')
+    assert 'Encaja con tu gusto por drama, crime y joker.' in _sentence(paragraph, 'The Dark Knight')
+    # Sin blurb de los géneros del usuario (crime), cualquiera de los del item
+    assert _sentence(paragraph, 'Pulp Fiction').startswith('Pulp Fiction» (película): Tensión constante.')
+    # Sin blurbs, la primera frase de la descripción
+    assert _sentence(paragraph, 'Echoes of Time').startswith(
+        'Echoes of Time» (canción): Aurora Skies - Celestial Dreams (2022).')
+
+
+def test_compose_paragraph_without_blurbs_uses_descriptions(catalog):
+    candidates = catalog.to_frame([0])
+    candidates['score'] = [1]
+    paragraph = compose_paragraph(candidates, LikedSummary([], [], []), top_n=1)
+    assert paragraph == ('Te proponemos: «Inception» (película): A thief who steals corporate secrets through '
+                         'the use of dream-sharing technology is given the inverse task of planting an idea '
+                         'into the mind of a C.E.O.')
@@ -0,0 +1,58 @@
+from src.catalog import ItemFilter
+from src.candidate_cache import CandidateCache
+from src.catalog_updates import CatalogUpdate
+
+
+def test_key_ignores_order_case_accents_and_duplicates():
+    key = CandidateCache.make_key(['Sueños en Papel', 'Inception', ''], 10, 'tags', ItemFilter('movie'))
+    assert key == CandidateCache.make_key(['inception', 'SUENOS EN PAPEL', 'Inception'], 10, 'tags',
+                                          ItemFilter('movie'))
+    assert key != CandidateCache.make_key(['Inception', 'Sueños en Papel'], 10, 'tags')
+    assert key != CandidateCache.make_key(['Inception', 'Sueños en Papel'], 10, 'semantic', ItemFilter('movie'))
+
+
+def test_new_version_drops_entries_and_stale_results_are_ignored():
+    cache = CandidateCache()
+    key = CandidateCache.make_key(['Inception'], 10, 'tags')
+    cache.put(1, key, ('v1',))
+    assert cache.get(1, key) == ('v1',)
+
+    # Una versión nueva descarta todo lo anterior
+    assert cache.get(2, key) is None
+    assert len(cache) == 0
+    # Un resultado calculado sobre la versión 1 ya no se guarda ni se sirve
+    cache.put(1, key, ('v1',))
+    assert len(cache) == 0 and cache.get(1, key) is None
+    cache.put(2, key, ('v2',))
+    assert cache.get(2, key) == ('v2',)
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_lru_and_hot_profiles():
+    cache = CandidateCache(max_entries=2)
+    keys = [CandidateCache.make_key([title], 10, 'tags') for title in ('a', 'b', 'c')]
+    for key in keys:
+        cache.put(1, key, (key,))
+    assert cache.get(1, keys[0]) is None and len(cache) == 2
+    for _ in range(3):
+        cache.get(1, keys[2])
+    cache.get(1, keys[1], record=False)
+    assert cache.hot(2) == [keys[2], keys[0]]
+
+
+def test_catalog_update_invalidates_cached_candidates(client):
+    url = '/recommendations/movies?mode=fast&liked_titles=Inception&top_n=5'
+    cache = client.app.state.candidate_cache
+    first = [item['name'] for item in client.get(url).json()['recommendations']]
+    assert client.get(url).json()['recommendations']
+    assert cache.hits == 1
+
+    store = client.app.state.catalog_store
+    snapshot = store.current()
+    removed = first[0]
+    pos = snapshot.title_index.resolve([removed], fuzzy=False)[0]
+    store.apply_updates([CatalogUpdate('delete', 'movie', int(snapshot.catalog.ids[pos]))])
+
+    second = [item['name'] for item in client.get(url).json()['recommendations']]
+    assert removed not in second
+    assert cache.misses == 2
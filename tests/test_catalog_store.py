@@ -0,0 +1,115 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+
+import pytest
+
+from src.catalog_store import CatalogStore
+
+from tests.conftest import DATA_DIR
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    path = tmp_path / 'data'
+    shutil.copytree(DATA_DIR, path)
+    return path
+
+
+def _write(path, text, bump=10):
+    """Reescribe un fichero de datos con un mtime posterior (los sistemas de ficheros redondean el mtime)."""
+    mtime = os.stat(path).st_mtime + bump
+    path.write_text(text, encoding='utf-8')
+    os.utime(path, (mtime, mtime))
+
+
+def _rename_movie(data_dir, old, new, bump=10):
+    path = data_dir / 'movies.json'
+    movies = json.loads(path.read_text(encoding='utf-8'))
+    for movie in movies:
+        if movie['title'] == old:
+            movie['title'] = new
+    _write(path, json.dumps(movies), bump)
+
+
+def _titles(store):
+    catalog = store.current().catalog
+    return set(catalog.titles.take(range(len(catalog))))
+
+
+@pytest.mark.parametrize('snapshot', [False, True])
+def test_refresh_swaps_only_when_a_file_changes(data_dir, tmp_path, snapshot):
+    store = CatalogStore(str(data_dir), snapshot_path=str(tmp_path / 'catalog.snap') if snapshot else None)
+    first = store.load()
+    assert not store.refresh()
+    assert store.current() is first
+
+    _rename_movie(data_dir, 'Inception', 'Origen')
+    assert store.refresh()
+    second = store.current()
+    assert second.version == first.version + 1
+    assert second.tag != first.tag
+    assert second.title_index.resolve(['Origen'], fuzzy=False) == first.title_index.resolve(['Inception'])
+    # El snapshot anterior no cambia: las peticiones en curso siguen leyéndolo
+    assert 'Inception' in set(first.catalog.titles.take(range(len(first.catalog))))
+    assert not store.refresh()
+
+
+def test_failed_reload_keeps_the_previous_snapshot(data_dir):
+    store = CatalogStore(str(data_dir))
+    first = store.load()
+    text = (data_dir / 'songs.json').read_text(encoding='utf-8')
+
+    # Fichero a medio escribir: no se sustituye el catálogo por uno sin canciones
+    _write(data_dir / 'songs.json', text[:len(text) // 2])
+    with pytest.raises(ValueError):
+        store.refresh()
+    assert store.current() is first
+
+    # Cuando el fichero se completa, el siguiente ciclo recarga
+    _write(data_dir / 'songs.json', text, bump=20)
+    assert store.refresh()
+    assert store.current().version == first.version + 1
+    assert _titles(store) == set(first.catalog.titles.take(range(len(first.catalog))))
+
+
+def test_broken_file_at_startup_only_drops_its_rows(data_dir, catalog):
+    _write(data_dir / 'songs.json', '[{"id": 401, "title": "Echoes')
+    loaded = CatalogStore(str(data_dir)).load().catalog
+    assert len(loaded) == len(catalog) - len(catalog.partition('song'))
+
+
+def test_watch_reloads_and_survives_failed_reloads(data_dir, caplog):
+    caplog.set_level(logging.ERROR, logger='src.catalog_store')
+    store = CatalogStore(str(data_dir), poll_interval=0.01)
+    first = store.load()
+    movies = (data_dir / 'movies.json').read_text(encoding='utf-8')
+
+    async def wait_for(condition):
+        for _ in range(500):
+            if condition():
+                return True
+            await asyncio.sleep(0.01)
+        return False
+
+    async def scenario():
+        task = asyncio.create_task(store.watch())
+        try:
+            _rename_movie(data_dir, 'Inception', 'Origen')
+            assert await wait_for(lambda: store.current().version == first.version + 1)
+            assert 'Origen' in _titles(store)
+
+            # El bucle registra el error y sigue con el snapshot vigente
+            _write(data_dir / 'movies.json', movies[:100], bump=20)
+            assert await wait_for(lambda: 'No se pudo recargar' in caplog.text)
+            assert store.current().version == first.version + 1
+
+            _write(data_dir / 'movies.json', movies, bump=30)
+            assert await wait_for(lambda: store.current().version == first.version + 2)
+        finally:
+            task.cancel()
+
+    asyncio.run(scenario())
+    assert 'Inception' in _titles(store)
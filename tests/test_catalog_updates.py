@@ -0,0 +1,218 @@
+import json
+import os
+import random
+
+import numpy as np
+import pandas as pd
+
+from src.catalog import ItemFilter
+from src.catalog_store import CatalogStore
+from src.catalog_updates import CatalogUpdate
+from src.data_loader import DOMAIN_SCHEMAS
+from src.recommender import TermIndex
+from src.user_porfile import create_multi_domain_user_profile
+
+from tests.conftest import DATA_DIR
+
+
+def _updates(catalog, rng, n_upserts=8, n_deletes=3):
+    updates = []
+    for k in range(n_upserts):
+        pos = rng.randrange(len(catalog))
+        record = {'id': 900 + k, 'title': f'Nuevo {k}', 'genres': catalog.genres_of(pos) + ['Género nuevo'],
+                  'keywords': catalog.keywords_of(pos)}
+        updates.append(CatalogUpdate('upsert', 'movie', 900 + k, record))
+    for pos in rng.sample(range(len(catalog)), n_deletes):
+        updates.append(CatalogUpdate('delete', catalog.content_type(pos), int(catalog.ids[pos])))
+    return updates
+
+
+def _movie(item_id, title, genres=('Sci-Fi',), keywords=('space',)):
+    record = {'id': item_id, 'title': title, 'genres': list(genres), 'keywords': list(keywords)}
+    return CatalogUpdate('upsert', 'movie', item_id, record)
+
+
+def _apply_batches(store, n_batches=3, seed=0):
+    rng = random.Random(seed)
+    snapshot = store.current()
+    for _ in range(n_batches):
+        snapshot = store.apply_updates(_updates(snapshot.catalog, rng))
+    return snapshot
+
+
+def test_updates_keep_base_columns_and_match_a_flat_catalog():
+    store = CatalogStore(DATA_DIR)
+    base = store.load().catalog
+    snapshot = _apply_batches(store)
+    updated = snapshot.catalog
+
+    # Las columnas base se comparten: sólo el delta crece con cada lote
+    assert updated.segments[0] is base
+    assert len(updated.segments[1]) == len(updated) - len(base)
+
+    flat = base._concat(updated.segments[1])
+    pd.testing.assert_frame_equal(updated.to_frame(), flat.to_frame())
+    for content_type in list(flat.content_types.categories) + ['desconocido']:
+        assert updated.partition(content_type).tolist() == flat.partition(content_type).tolist()
+    item_filter = ItemFilter('concert', date_from=0, available=True)
+    assert item_filter.mask(updated).tolist() == item_filter.mask(flat).tolist()
+    assert updated.find_titles(['Nuevo 1', 'Inception']) == flat.find_titles(['Nuevo 1', 'Inception'])
+    positions = np.arange(len(updated))
+    assert updated.ids[positions].tolist() == flat.ids.tolist()
+    assert np.array_equal(np.asarray(updated.genres.values), flat.genres.values)
+
+
+def test_upserts_replace_and_deletes_hide_items():
+    store = CatalogStore(DATA_DIR)
+    snapshot = store.load()
+    inception = snapshot.title_index.resolve(['Inception'])
+    snapshot = store.apply_updates([
+        _movie(1, 'Inception (Extended Cut)', genres=['Sci-Fi', 'Thriller']),
+        CatalogUpdate('delete', 'song', 401),
+        _movie(999, 'Nebula Drift'),
+    ])
+    catalog, titles = snapshot.catalog, snapshot.title_index
+
+    assert not catalog.is_live(inception[0])
+    assert titles.lookup('movie', 1) == len(catalog) - 2
+    assert titles.lookup('song', 401) is None
+    assert titles.resolve(['Echoes of Time'], fuzzy=False) == []
+    assert catalog.titles[titles.resolve(['nebula drift'])[0]] == 'Nebula Drift'
+    assert catalog.live_count == len(catalog) - 2
+
+
+def test_compact_drops_deleted_rows_and_keeps_results():
+    store = CatalogStore(DATA_DIR)
+    store.load()
+    updated = _apply_batches(store, seed=2)
+    live = np.setdiff1d(np.arange(len(updated.catalog)), updated.catalog.deleted_positions)
+    liked_keys = [(updated.catalog.content_type(pos), int(updated.catalog.ids[pos])) for pos in live[:2]]
+
+    def ranked(snapshot):
+        catalog = snapshot.catalog
+        liked = [snapshot.title_index.lookup(content_type, item_id) for content_type, item_id in liked_keys]
+        df = snapshot.recommender.recommend(liked, create_multi_domain_user_profile(liked, catalog), top_n=10)
+        return list(zip(df['content_type'], df['id'], df['score']))
+
+    before = ranked(updated)
+    assert store.compact()
+    compacted = store.current()
+
+    assert compacted.catalog.segments is None and compacted.catalog.deleted is None
+    assert len(compacted.catalog) == len(live)
+    expected = updated.catalog.to_frame(live).reset_index(drop=True)
+    pd.testing.assert_frame_equal(compacted.catalog.to_frame().reset_index(drop=True), expected)
+    assert compacted.tag == updated.tag
+    assert ranked(compacted) == before
+
+
+def test_term_index_with_delta_matches_full_rebuild():
+    store = CatalogStore(DATA_DIR)
+    base = store.load()
+    updated = _apply_batches(store, seed=3)
+    catalog = updated.catalog
+    incremental = base.recommender.index.with_delta(catalog, updated.base_size)
+    full = TermIndex(catalog)
+
+    rng = random.Random(3)
+    for _ in range(20):
+        liked = rng.sample(range(len(catalog)), 2)
+        genre_ids = np.unique(catalog.genres.rows(liked))
+        keyword_ids = np.unique(catalog.keywords.rows(liked))
+        for got, want in zip(incremental.score(genre_ids, keyword_ids), full.score(genre_ids, keyword_ids)):
+            assert got.tolist() == want.tolist()
+
+    # Particiones por dominio: base compartida + filas nuevas del dominio
+    rows = catalog.partition('movie')
+    partition = TermIndex(base.catalog, rows=base.catalog.partition('movie')).with_delta(
+        catalog, rows=rows[rows >= updated.base_size])
+    genre_ids = np.unique(catalog.genres.rows(rows.tolist()))
+    for got, want in zip(partition.score(genre_ids, genre_ids[:0]),
+                         TermIndex(catalog, rows=rows).score(genre_ids, genre_ids[:0])):
+        assert got.tolist() == want.tolist()
+
+
+def test_fuzzy_resolve_compares_best_match_across_layers():
+    store = CatalogStore(DATA_DIR)
+    store.load()
+    # El delta tiene un parecido más débil que el de la base: no debe ganar por ser más reciente
+    snapshot = store.apply_updates([_movie(998, 'The Interstelar')])
+    catalog = snapshot.catalog
+    assert [catalog.titles[pos] for pos in snapshot.title_index.resolve(['Interstelar'])] == ['Interstellar']
+
+    # Un título que empieza por la consulta gana a cualquier parecido por trigramas
+    snapshot = store.apply_updates([_movie(997, 'Interstelar Odyssey')])
+    catalog = snapshot.catalog
+    assert [catalog.titles[pos] for pos in snapshot.title_index.resolve(['Interstelar'])] == ['Interstelar Odyssey']
+
+
+def test_autocomplete_ranks_prefixes_before_fuzzy_matches_across_layers():
+    store = CatalogStore(DATA_DIR)
+    store.load()
+    snapshot = store.apply_updates([_movie(996, 'Intrstellar'), _movie(995, 'Interstellar Redux')])
+    catalog, titles = snapshot.catalog, snapshot.title_index
+
+    def suggest(query, limit):
+        return [catalog.titles[pos] for pos in titles.autocomplete(query, limit=limit)]
+
+    # El prefijo de la base no queda desplazado por el parecido del delta
+    assert suggest('interstel', 2) == ['Interstellar', 'Interstellar Redux']
+    assert suggest('interstel', 3) == ['Interstellar', 'Interstellar Redux', 'Intrstellar']
+
+
+def _rebuild_from_files(tmp_path, updates):
+    """Aplica las actualizaciones a copias de los ficheros de `Data/` y carga un catálogo nuevo desde cero."""
+    files = {schema.content_type: schema.source for schema in DOMAIN_SCHEMAS}
+    records = {}
+    for content_type, source in files.items():
+        with open(os.path.join(DATA_DIR, source + '.json'), encoding='utf-8') as f:
+            records[content_type] = {int(r['id']): r for r in json.load(f)}
+    for update in updates:
+        items = records[update.content_type]
+        items.pop(update.item_id, None)
+        if update.op == 'upsert':
+            items[update.item_id] = update.record
+    for content_type, source in files.items():
+        with open(tmp_path / (source + '.json'), 'w', encoding='utf-8') as f:
+            json.dump(list(records[content_type].values()), f)
+    return CatalogStore(str(tmp_path)).load()
+
+
+def test_batches_and_compaction_match_a_full_rebuild(tmp_path):
+    store = CatalogStore(DATA_DIR)
+    store.load()
+    rng = random.Random(5)
+    applied = []
+    for _ in range(4):
+        batch = _updates(store.current().catalog, rng, n_upserts=4, n_deletes=2)
+        # Cambia un item que ya estaba en el delta de un lote anterior
+        batch.append(_movie(900, 'Nuevo 0 (revisado)', genres=['Sci-Fi', 'Drama'], keywords=['space', 'dream']))
+        store.apply_updates(batch)
+        applied.extend(batch)
+    full = _rebuild_from_files(tmp_path, applied)
+
+    def keys(snapshot, positions):
+        return [(snapshot.catalog.content_type(pos), int(snapshot.catalog.ids[pos])) for pos in positions]
+
+    def state(snapshot):
+        catalog, titles = snapshot.catalog, snapshot.title_index
+        live = [pos for pos in range(len(catalog)) if catalog.is_live(pos)]
+        found = {key: catalog.titles[titles.lookup(*key)] if titles.lookup(*key) is not None else None
+                 for key in keys(full, range(len(full.catalog))) + [('movie', 900 + k) for k in range(4)]}
+        resolved = {title: keys(snapshot, titles.resolve([title], fuzzy=False))
+                    for title in full.catalog.titles.take(range(len(full.catalog)))}
+        scores = []
+        for liked_key in [('movie', 1), ('song', 402), ('movie', 900)]:
+            liked = [titles.lookup(*liked_key)]
+            if liked[0] is None:
+                continue
+            positions, ranked = snapshot.recommender.rank(
+                liked, create_multi_domain_user_profile(liked, catalog), len(catalog))
+            scores.append(sorted(zip(keys(snapshot, positions), ranked)))
+        return len(live), found, resolved, scores
+
+    expected = state(full)
+    assert state(store.current()) == expected
+    assert store.compact()
+    assert store.current().catalog.segments is None
+    assert state(store.current()) == expected
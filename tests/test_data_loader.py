@@ -0,0 +1,63 @@
+import json
+import shutil
+
+import pytest
+
+from src.data_loader import iter_json_records, load_catalog
+
+from tests.conftest import DATA_DIR
+
+RECORDS = [
+    {'id': 1, 'title': 'Inception', 'genres': ['Sci-Fi'], 'keywords': ['dream', 'heist']},
+    {'id': 2, 'title': 'Café «Ñandú»', 'genres': [], 'keywords': ['ü' * 40]},
+    {'id': 3, 'title': 'Interstellar', 'tickets': {'available': 0}},
+    12345,
+    'suelto',
+]
+
+
+def _write(path, text):
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 16, 1 << 20])
+def test_json_array_records_span_chunk_boundaries(tmp_path, chunk_size):
+    path = _write(tmp_path / 'movies.json', '﻿ \n' + json.dumps(RECORDS, ensure_ascii=False, indent=2))
+    assert list(iter_json_records(path, chunk_size=chunk_size)) == RECORDS
+
+
+def test_jsonl_reads_one_record_per_line(tmp_path):
+    lines = [json.dumps(r, ensure_ascii=False) for r in RECORDS[:3]]
+    path = _write(tmp_path / 'movies.jsonl', '\n'.join([lines[0], '', lines[1], '   ', lines[2]]) + '\n')
+    assert list(iter_json_records(path, chunk_size=4)) == RECORDS[:3]
+
+
+@pytest.mark.parametrize('text', [
+    '{"id": 1}',
+    '[{"id": 1}, {"id": 2',
+    '[{"id": 1}, {"id": 2}, "sin cerr',
+    '[{"id": 1}, {"id": 2}',
+    '[{"id": 1}, {"id": 2} {"id": 3]',
+])
+def test_malformed_or_truncated_json_raises_after_valid_records(tmp_path, text):
+    path = _write(tmp_path / 'movies.json', text)
+    records = iter_json_records(path, chunk_size=3)
+    with pytest.raises(ValueError):
+        for record in records:
+            assert record in ({'id': 1}, {'id': 2})
+
+
+def test_load_catalog_drops_only_the_rows_of_a_broken_file(tmp_path, catalog):
+    for name in ('movies', 'merch', 'theater_events', 'concerts'):
+        shutil.copy(f'{DATA_DIR}/{name}.json', tmp_path / f'{name}.json')
+    songs = json.load(open(f'{DATA_DIR}/songs.json', encoding='utf-8'))
+    lines = [json.dumps(song) for song in songs]
+    # La última canción queda truncada: el fichero entero se descarta
+    _write(tmp_path / 'songs.jsonl', '\n'.join(lines[:-1] + [lines[-1][:20]]))
+
+    loaded = load_catalog(str(tmp_path))
+    assert 'song' not in set(loaded.content_types)
+    expected = catalog.to_frame()
+    expected = expected[expected['content_type'] != 'song'].reset_index(drop=True)
+    assert loaded.to_frame().equals(expected)
@@ -0,0 +1,94 @@
+import numpy as np
+
+from src import embeddings
+from src.catalog import Catalog, ItemFilter
+from src.catalog_store import CatalogStore
+from src.catalog_updates import CatalogUpdate
+from src.embeddings import EmbeddingRecommender
+
+from tests.conftest import DATA_DIR
+
+SOURCES = {'movies': 1.0, 'songs': 2.0}
+
+
+def _recommend(recommender, liked, top_n=10, item_filter=None):
+    df = recommender.recommend(liked, top_n=top_n, item_filter=item_filter)
+    return list(zip(df.index, df['score'])) if not df.empty else []
+
+
+def test_saved_embeddings_are_reopened_only_for_the_same_sources(tmp_path, catalog, monkeypatch):
+    path = str(tmp_path / 'embeddings')
+    computed = EmbeddingRecommender()
+    computed.load(catalog, path=path, sources=SOURCES)
+
+    builds = []
+    original_build = embeddings.IVFIndex.build
+    monkeypatch.setattr(embeddings.IVFIndex, 'build', lambda *a, **kw: builds.append(1) or original_build(*a, **kw))
+    reopened = EmbeddingRecommender()
+    reopened.load(catalog, path=path, sources=SOURCES)
+    assert not builds
+    assert isinstance(reopened.vectors, np.memmap)
+    assert np.array_equal(reopened.vectors, computed.vectors)
+    for liked in ([0], [1, 5], [10, 20, 22]):
+        assert _recommend(reopened, liked) == _recommend(computed, liked)
+
+    # Otros ficheros de origen u otro catálogo: se recalcula (y se sobrescribe)
+    EmbeddingRecommender().load(catalog, path=path, sources={'movies': 3.0})
+    EmbeddingRecommender().load(Catalog.from_frame(catalog.to_frame(range(20))), path=path, sources={'movies': 3.0})
+    assert len(builds) == 2
+    EmbeddingRecommender().load(catalog, path=path, sources=SOURCES)
+    assert len(builds) == 3
+
+
+def test_upserted_rows_are_retrievable_after_with_catalog():
+    store = CatalogStore(DATA_DIR, semantic=True)
+    snapshot = store.load()
+    interstellar = snapshot.title_index.resolve(['Interstellar'])[0]
+    record = {'id': 990, 'title': 'Interstellar Redux', 'overview': snapshot.catalog.descriptions[interstellar],
+              'genres': snapshot.catalog.genres_of(interstellar), 'keywords': snapshot.catalog.keywords_of(interstellar)}
+    updated = store.apply_updates([
+        CatalogUpdate('upsert', 'movie', 990, record),
+        CatalogUpdate('upsert', 'song', 401, {'id': 401, 'title': 'Echoes of Time', 'genres': ['Ambient'],
+                                              'keywords': ['space']}),
+    ])
+    catalog, semantic = updated.catalog, updated.semantic
+    assert len(semantic.delta_vectors) == 2
+    redux = updated.title_index.resolve(['Interstellar Redux'])[0]
+    song = updated.title_index.lookup('song', 401)
+
+    # El item nuevo (sólo en el delta, fuera del índice IVF) es el más parecido a su original
+    assert _recommend(semantic, [interstellar], top_n=1)[0][0] == redux
+    assert _recommend(semantic, [redux], top_n=1)[0][0] == interstellar
+    ranked = [pos for pos, _ in _recommend(semantic, [song], top_n=len(catalog))]
+    # La versión antigua de la canción está dada de baja: nunca se recomienda
+    old_song = snapshot.title_index.lookup('song', 401)
+    assert old_song not in ranked and all(catalog.is_live(pos) for pos in ranked)
+    assert _recommend(semantic, [song], item_filter=ItemFilter('song'))
+    # Los vectores base se comparten entre versiones
+    assert semantic.vectors is snapshot.semantic.vectors
+
+
+def test_filtered_search_doubles_nprobe_until_enough_candidates(synthetic_dir, monkeypatch):
+    store = CatalogStore(synthetic_dir)
+    catalog = store.load().catalog
+    recommender = EmbeddingRecommender(nprobe=1)
+    recommender.load(catalog)
+    probes = []
+    original = recommender.index.candidates
+
+    def candidates(query, nprobe):
+        probes.append(nprobe)
+        return original(query, nprobe)
+    monkeypatch.setattr(recommender.index, 'candidates', candidates)
+
+    liked = catalog.partition('movie')[:2].tolist()
+    assert len(_recommend(recommender, liked, top_n=5)) == 5
+    assert probes == [1]
+
+    probes.clear()
+    item_filter = ItemFilter('concert', available=True)
+    top_n = 50
+    result = _recommend(recommender, liked, top_n=top_n, item_filter=item_filter)
+    assert probes[:3] == [1, 2, 4] and probes == [2 ** i for i in range(len(probes))]
+    assert len(result) == top_n
+    assert all(item_filter.mask(catalog, [pos])[0] for pos, _ in result)
@@ -0,0 +1,38 @@
+import pytest
+
+
+@pytest.mark.parametrize('url', [
+    '/titles/autocomplete?q=the',
+    '/recommendations/json?mode=fast&liked_titles=Inception',
+    '/recommendations/text?mode=fast&liked_titles=Inception',
+    '/recommendations/movie?mode=fast&liked_titles=Inception',
+])
+def test_deterministic_get_revalidates_with_304(client, url):
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers['etag']
+    assert first.headers['cache-control'].startswith('public')
+
+    second = client.get(url, headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.headers['etag'] == etag
+    assert second.content == b''
+
+
+def test_etag_ignores_liked_titles_order_and_case(client):
+    a = client.get('/recommendations/json?mode=fast&liked_titles=Inception,Interstellar')
+    b = client.get('/recommendations/json?liked_titles=interstellar,inception&mode=fast')
+    assert a.headers['etag'] == b.headers['etag']
+
+
+def test_llm_responses_are_not_cached(client):
+    url = '/recommendations/text?mode=llm&liked_titles=Inception'
+    first = client.get(url)
+    assert first.status_code == 200
+    assert 'etag' not in first.headers
+    assert first.headers['cache-control'] == 'no-store'
+
+    # Sin ETag no hay 304 posible: cada petición vuelve a generar el párrafo
+    second = client.get(url, headers={'If-None-Match': '*'})
+    assert second.status_code == 200
+    assert client.app.state.justifier.calls == 2
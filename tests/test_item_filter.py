@@ -0,0 +1,102 @@
+import random
+from datetime import date
+
+import numpy as np
+import pytest
+
+from src.catalog import ItemFilter, date_to_days
+from src.catalog_store import CatalogStore
+from src.catalog_updates import CatalogUpdate
+from src.recommender import Recommender
+from src.user_porfile import create_multi_domain_user_profile
+
+from tests.test_catalog_updates import _updates
+
+SUMMER = (date_to_days(date(2025, 6, 1)), date_to_days(date(2025, 9, 30)))
+
+FILTERS = [
+    ItemFilter('concert'),
+    ItemFilter('concert', date_from=SUMMER[0], available=True),
+    ItemFilter('theater_event', date_from=SUMMER[0], date_to=SUMMER[1]),
+    ItemFilter('merch', available=True),
+    ItemFilter(date_to=SUMMER[1]),
+    ItemFilter(available=True),
+    ItemFilter('movie', date_from=SUMMER[0]),
+]
+
+
+def _post_filtered(recommender, liked, profile, top_n, item_filter):
+    """Ranking sin filtro sobre todo el catálogo, filtrado después."""
+    catalog = recommender.catalog
+    positions, scores = recommender.rank(liked, profile, len(catalog))
+    keep = item_filter.mask(catalog, np.asarray(positions, dtype=np.int64))
+    return [(pos, score) for pos, score, ok in zip(positions, scores, keep) if ok][:top_n]
+
+
+def _check_filtered_rankings(recommender, rng, n_users=8):
+    catalog = recommender.catalog
+    queries = []
+    for _ in range(n_users):
+        liked = rng.sample(range(len(catalog)), 3)
+        profile = create_multi_domain_user_profile(liked, catalog)
+        for item_filter in FILTERS:
+            top_n = rng.choice([1, 5, 20])
+            expected = _post_filtered(recommender, liked, profile, top_n, item_filter)
+            assert list(zip(*recommender.rank(liked, profile, top_n, item_filter))) == expected
+            queries.append(((liked, profile, top_n, item_filter), expected))
+    batch = recommender.rank_batch([query for query, _ in queries])
+    assert [list(zip(*result)) for result in batch] == [expected for _, expected in queries]
+
+
+@pytest.mark.parametrize('engine', Recommender.ENGINES)
+def test_filtered_ranking_equals_post_filtered_ranking(engine, synthetic_dir):
+    store = CatalogStore(synthetic_dir)
+    recommender = Recommender(engine)
+    recommender.load(store.load().catalog)
+    _check_filtered_rankings(recommender, random.Random(0))
+
+
+@pytest.mark.parametrize('engine', Recommender.ENGINES)
+def test_partitions_stay_correct_after_incremental_updates(engine, synthetic_dir):
+    rng = random.Random(1)
+    store = CatalogStore(synthetic_dir)
+    snapshot = store.load()
+    recommender = Recommender(engine)
+    recommender.load(snapshot.catalog)
+    # Las particiones de la versión base ya están construidas al actualizar
+    _check_filtered_rankings(recommender, rng, n_users=2)
+
+    catalog = snapshot.catalog
+    for _ in range(2):
+        updates = _updates(catalog, rng, n_upserts=20, n_deletes=20)
+        concert = catalog.partition('concert')[0]
+        updates.append(CatalogUpdate('upsert', 'concert', int(catalog.ids[concert]), {
+            'id': int(catalog.ids[concert]), 'artist': 'Nueva', 'tour_name': 'Gira', 'date': '2025-07-15',
+            'genres': catalog.genres_of(concert), 'keywords': catalog.keywords_of(concert),
+            'tickets': {'available': 0}}))
+        updated = store.apply_updates(updates)
+        recommender = recommender.with_catalog(updated.catalog, updated.base_size)
+        catalog = updated.catalog
+        _check_filtered_rankings(recommender, rng)
+
+
+def test_domain_endpoint_applies_date_and_availability(client):
+    store = client.app.state.catalog_store
+    # 305 se agota: ya no es recomendable con `available`
+    store.apply_updates([CatalogUpdate('upsert', 'concert', 305, {
+        'id': 305, 'artist': 'City Pulse', 'tour_name': 'Downtown Nights', 'date': '2025-10-11',
+        'genres': ['Synthwave', 'Electronic'], 'keywords': ['retro', 'lights', 'energy'],
+        'tickets': {'available': 0}})])
+    base = '/recommendations/concerts?mode=fast&top_n=5&liked_titles=Echoes of Time,Pulse Reactor,Neon Rush'
+
+    def names(query):
+        response = client.get(base + query)
+        assert response.status_code == 200
+        return [item['name'] for item in response.json()['recommendations']]
+
+    assert set(names('')) == {'Aurora Skies - Celestial Nights Tour', 'Binary Drift - Codewave Live',
+                              'City Pulse - Downtown Nights'}
+    assert set(names('&date_from=2025-07-01')) == {'Binary Drift - Codewave Live', 'City Pulse - Downtown Nights'}
+    assert names('&date_from=2025-07-01&available=true') == ['Binary Drift - Codewave Live']
+    assert names('&date_to=2025-06-30&available=true') == ['Aurora Skies - Celestial Nights Tour']
+    assert client.get('/recommendations/unknown?mode=fast').status_code == 404
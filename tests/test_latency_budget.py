@@ -0,0 +1,87 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from src.llm_cache import LLMCache
+from src.llm_justifier import AsyncLLMJustifier
+
+from tests.conftest import FakeJustifier
+
+BODY = {'liked_titles': ['Inception', 'Interstellar'], 'top_n': 3, 'top_candidates': 10}
+
+
+def _names(response):
+    return [item['name'] for item in response.json()['recommendations']]
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_llm_selection_within_budget(client):
+    fast = _names(client.post('/recommendations/json', json={**BODY, 'mode': 'fast'}))
+    response = client.post('/recommendations/json', json=BODY)
+    # FakeJustifier elige los últimos candidatos, no los de la selección local
+    assert _names(response) != fast
+    assert 'cache-control' not in response.headers
+    assert client.app.state.justifier.calls == 1
+
+
+def test_over_budget_falls_back_to_local_selection_and_llm_keeps_running(client):
+    justifier = client.app.state.justifier = FakeJustifier(delay=0.3)
+    fast = _names(client.post('/recommendations/json', json={**BODY, 'mode': 'fast'}))
+
+    response = client.post('/recommendations/json', json={**BODY, 'budget_ms': 20})
+    assert _names(response) == fast
+    # La respuesta local no es la definitiva: no se cachea
+    assert response.headers['cache-control'] == 'no-store'
+    assert justifier.completed == 0
+    # La llamada al LLM no se cancela al agotar el presupuesto
+    assert _wait_for(lambda: justifier.completed == 1)
+
+
+def test_background_llm_call_fills_the_cache(client, monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'sk-test')
+    justifier = AsyncLLMJustifier(cache=LLMCache())
+    keys = []
+
+    async def upstream(system_msg, user_msg):
+        keys.append(LLMCache.make_key(justifier.model, system_msg, user_msg))
+        await asyncio.sleep(0.3)
+        return json.dumps({'recommendations': [{'id': 2, 'content_type': 'movie'}]})
+
+    monkeypatch.setattr(justifier, '_chat_upstream', upstream)
+    client.app.state.justifier = justifier
+    body = {**BODY, 'budget_ms': 20}
+
+    first = client.post('/recommendations/json', json=body)
+    assert first.headers['cache-control'] == 'no-store'
+    assert _wait_for(lambda: keys and justifier.cache.get(keys[0]) is not None)
+
+    # La misma petición se sirve de la caché dentro del presupuesto
+    second = client.post('/recommendations/json', json=body)
+    assert _names(second) == ['The Dark Knight']
+    assert 'cache-control' not in second.headers
+    assert len(keys) == 1
+
+
+@pytest.mark.parametrize('method, url, body', [
+    ('post', '/recommendations/json', {**BODY, 'mode': 'fast'}),
+    ('get', '/recommendations/json?mode=fast&liked_titles=Inception', None),
+    ('post', '/recommendations/text', {**BODY, 'mode': 'fast'}),
+    ('get', '/recommendations/text?mode=fast&liked_titles=Inception', None),
+    ('post', '/recommendations/text/stream', {**BODY, 'mode': 'fast'}),
+    ('post', '/recommendations/movie', {**BODY, 'mode': 'fast'}),
+    ('get', '/recommendations/movies?mode=fast&liked_titles=Inception', None),
+    ('post', '/recommendations/batch', {'users': [{'liked_titles': ['Inception']}], 'mode': 'fast'}),
+])
+def test_fast_mode_never_calls_the_llm(client, method, url, body):
+    response = client.request(method.upper(), url, json=body)
+    assert response.status_code == 200
+    assert response.content
+    assert client.app.state.justifier.calls == 0
@@ -0,0 +1,178 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src import llm_cache
+from src.llm_cache import LLMCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, 'time', clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = LLMCache(ttl=10)
+    cache.set('k', 'respuesta')
+    clock.now += 9.9
+    assert cache.get('k') == 'respuesta'
+    clock.now += 0.1
+    assert cache.get('k') is None
+
+
+def test_sqlite_store_survives_restarts_and_respects_ttl(tmp_path, clock):
+    path = str(tmp_path / 'llm.db')
+    LLMCache(ttl=10, db_path=path).set('k', 'respuesta')
+    assert LLMCache(ttl=10, db_path=path).get('k') == 'respuesta'
+    clock.now += 10
+    assert LLMCache(ttl=10, db_path=path).get('k') is None
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LLMCache(max_entries=2)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    cache.get('a')
+    cache.set('c', '3')
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == ('1', None, '3')
+
+
+def test_empty_answers_are_not_cached():
+    cache = LLMCache()
+    assert cache.get_or_compute('k', lambda: '') == ''
+    assert cache.get('k') is None
+
+
+def test_single_flight_threads_share_one_call():
+    cache = LLMCache()
+    calls = 0
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        nonlocal calls
+        calls += 1
+        started.set()
+        release.wait(5)
+        return 'respuesta'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+                 for _ in range(4)]
+    for t in followers:
+        t.start()
+    # Los seguidores esperan a la llamada en curso en lugar de repetirla
+    deadline = time.monotonic() + 5
+    while cache.hits < 4 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for t in [leader] + followers:
+        t.join(5)
+
+    assert calls == 1
+    assert results == ['respuesta'] * 5
+    assert (cache.hits, cache.misses) == (4, 1)
+
+
+def test_single_flight_async_shares_result_and_error():
+    cache = LLMCache()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return 'respuesta'
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError('upstream caído')
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_compute_async('k', compute) for _ in range(5)))
+        errors = await asyncio.gather(*(cache.get_or_compute_async('e', failing) for _ in range(3)),
+                                      return_exceptions=True)
+        return results, errors
+
+    results, errors = asyncio.run(main())
+    assert results == ['respuesta'] * 5 and calls == 1
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    # Un error no se cachea: la siguiente petición vuelve a llamar
+    assert cache.get('e') is None
+
+
+def test_cancelling_the_leader_does_not_cancel_followers():
+    cache = LLMCache()
+    calls = 0
+    release = asyncio.Event()
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return 'respuesta'
+
+    async def main():
+        leader = asyncio.create_task(cache.get_or_compute_async('k', compute))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_compute_async('k', compute))
+        await asyncio.sleep(0)
+        # Como un cliente que se desconecta o un `wait_for` que vence
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == 'respuesta'
+    assert calls == 1
+    # La llamada terminó aunque su iniciador se cancelara: la respuesta queda cacheada
+    assert cache.get('k') == 'respuesta'
+
+
+def test_async_access_keeps_sqlite_off_the_event_loop(tmp_path, monkeypatch):
+    path = str(tmp_path / 'llm.db')
+    LLMCache(db_path=path).set('guardada', 'de disco')
+    cache = LLMCache(db_path=path)
+    threads = []
+    for name in ('_load', '_store'):
+        original = getattr(cache, name)
+
+        def spy(*args, original=original):
+            threads.append(threading.get_ident())
+            return original(*args)
+        monkeypatch.setattr(cache, name, spy)
+
+    async def compute():
+        return 'nueva'
+
+    async def main():
+        loop_thread = threading.get_ident()
+        assert await cache.alookup('guardada') == 'de disco'
+        assert await cache.get_or_compute_async('k', compute) == 'nueva'
+        n_sqlite = len(threads)
+        # Los aciertos en memoria no tocan SQLite
+        assert await cache.aget('guardada') == 'de disco'
+        assert await cache.get_or_compute_async('k', compute) == 'nueva'
+        return loop_thread, n_sqlite
+
+    loop_thread, n_sqlite = asyncio.run(main())
+    assert n_sqlite == len(threads) == 3
+    assert loop_thread not in threads
+    assert LLMCache(db_path=path).get('k') == 'nueva'
@@ -0,0 +1,87 @@
+from src.llm_justifier import _PromptBuilder
+from src.prompt_fragments import PromptFragments
+from src.user_porfile import summarize_liked_multi
+
+
+def _builder(budget):
+    builder = _PromptBuilder()
+    builder.prompt_budget = budget
+    return builder
+
+
+def _users(catalog, n_users, n_candidates=10):
+    return [
+        (f"u{i}", summarize_liked_multi([i], catalog), catalog.to_frame(range(i, i + n_candidates)))
+        for i in range(n_users)
+    ]
+
+
+def test_json_batch_without_budget_is_one_prompt(catalog):
+    prompts = _builder(None)._fit_prompts_for_json_batch(_users(catalog, 4), top_n=3)
+    assert len(prompts) == 1
+    assert prompts[0].text.count('### Usuario') == 4
+    assert prompts[0].candidates == 40
+
+
+def test_json_batch_respects_budget(catalog):
+    users = _users(catalog, 6)
+    for budget in (350, 600, 1200):
+        prompts = _builder(budget)._fit_prompts_for_json_batch(users, top_n=3)
+        assert all(p.tokens <= budget and not p.over_budget for p in prompts)
+        # Cada usuario aparece exactamente una vez y conserva al menos top_n candidatos
+        text = '\n'.join(p.text for p in prompts)
+        assert [text.count(f'### Usuario u{i}\n') for i in range(6)] == [1] * 6
+        assert sum(p.candidates for p in prompts) >= 6 * 3
+
+
+def test_json_batch_keeps_one_prompt_when_blocks_fit(catalog):
+    prompts = _builder(1200)._fit_prompts_for_json_batch(_users(catalog, 3), top_n=2)
+    assert len(prompts) == 1
+
+
+def _paragraph_args(catalog):
+    candidates = catalog.to_frame(range(len(catalog)))
+    candidates['score'] = range(len(catalog), 0, -1)
+    return candidates, summarize_liked_multi([0, 1, 2, 5, 6, 20], catalog)
+
+
+def test_fit_prompt_without_budget_keeps_everything(catalog):
+    candidates, summary = _paragraph_args(catalog)
+    built = _builder(None)._fit_prompt_for_paragraph(candidates, summary, top_n=3)
+    assert built.candidates == len(candidates)
+    assert built.summary_terms is None and not built.compact and not built.over_budget
+    assert summary.text() in built.text
+
+
+def test_fit_prompt_trims_in_order_and_stays_within_budget(catalog):
+    candidates, summary = _paragraph_args(catalog)
+    top_n, full = 3, _builder(None)._fit_prompt_for_paragraph(candidates, summary, top_n=3).tokens
+    fragments = PromptFragments(catalog)
+    for budget in range(full + 100, 0, -25):
+        builder = _builder(budget)
+        built = builder._fit_prompt_for_paragraph(candidates, summary, top_n)
+        # Los fragmentos precalculados dan exactamente el mismo prompt
+        assert builder._fit_prompt_for_paragraph(candidates, summary, top_n, fragments).text == built.text
+        assert built.candidates >= top_n
+        assert built.dropped_candidates == len(candidates) - built.candidates
+        if not built.over_budget:
+            assert built.tokens <= budget
+        # 1. primero se descartan candidatos; el resumen sólo se recorta por debajo de 2 * top_n
+        if built.summary_terms is None:
+            assert built.candidates >= 2 * top_n
+        # 2-4. las descripciones se quitan sólo con el resumen al mínimo
+        if built.compact:
+            assert built.summary_terms == summary.levels()[-1]
+        if built.over_budget:
+            assert built.compact and built.candidates == top_n
+
+    tiny = _builder(10)._fit_prompt_for_paragraph(candidates, summary, top_n)
+    assert tiny.over_budget and tiny.candidates == top_n
+
+
+def test_fit_prompt_explicit_budget_overrides_prompt_budget(catalog):
+    candidates, summary = _paragraph_args(catalog)
+    builder = _builder(None)
+    built = builder._fit_prompt('paragraph', candidates, summary, 3, builder._system_msg_paragraph(3),
+                                builder._compose_paragraph(3), budget=400)
+    assert built.tokens <= 400 and built.candidates < len(candidates)
@@ -0,0 +1,110 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.llm_cache import LLMCache
+from src.llm_justifier import PARAGRAPH_ERROR, AsyncLLMJustifier, StreamInterrupted
+from src.user_porfile import summarize_liked_multi
+
+
+class FakeCompletions:
+    """`chat.completions` de OpenAI con un stream de `tokens` que puede fallar en `fail_at`."""
+
+    def __init__(self, tokens, fail_at=None):
+        self.tokens = tokens
+        self.fail_at = fail_at
+        self.calls = 0
+
+    async def create(self, model, messages, stream=False, **kwargs):
+        self.calls += 1
+        if not stream:
+            message = SimpleNamespace(content='párrafo completo')
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+        async def chunks():
+            for i, token in enumerate(self.tokens):
+                if i == self.fail_at:
+                    raise RuntimeError('conexión cortada')
+                await asyncio.sleep(0)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))], usage=None)
+        return chunks()
+
+
+def _justifier(monkeypatch, completions, cache=None):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    justifier = AsyncLLMJustifier(cache=cache, max_concurrency=1, max_retries=0)
+    justifier.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return justifier
+
+
+def _args(catalog):
+    return catalog.to_frame(range(5)), summarize_liked_multi([0, 1], catalog)
+
+
+async def _collect(stream):
+    return [token async for token in stream]
+
+
+def test_semaphore_released_before_client_reads_tokens(monkeypatch, catalog):
+    justifier = _justifier(monkeypatch, FakeCompletions(['Uno ', 'dos ', 'tres.']))
+    candidates_df, summary = _args(catalog)
+
+    async def scenario():
+        stream = justifier.stream_paragraph(candidates_df, summary)
+        first = await stream.__anext__()
+        # El cliente aún no ha leído el resto, pero el upstream ya terminó y liberó el semáforo
+        await asyncio.gather(*justifier._streams)
+        assert not justifier._semaphore.locked()
+        return [first] + await _collect(stream)
+
+    assert asyncio.run(scenario()) == ['Uno ', 'dos ', 'tres.']
+
+
+def test_mid_stream_failure_raises(monkeypatch, catalog):
+    cache = LLMCache()
+    justifier = _justifier(monkeypatch, FakeCompletions(['Uno ', 'dos ', 'tres.'], fail_at=2), cache)
+    candidates_df, summary = _args(catalog)
+
+    async def scenario():
+        tokens = []
+        with pytest.raises(StreamInterrupted):
+            async for token in justifier.stream_paragraph(candidates_df, summary):
+                tokens.append(token)
+        return tokens
+
+    assert asyncio.run(scenario()) == ['Uno ', 'dos ']
+    # Un párrafo truncado no se cachea
+    assert not cache._entries
+
+
+def test_failure_before_first_token_falls_back(monkeypatch, catalog):
+    completions = FakeCompletions(['Uno'], fail_at=0)
+    justifier = _justifier(monkeypatch, completions)
+    candidates_df, summary = _args(catalog)
+    assert asyncio.run(_collect(justifier.stream_paragraph(candidates_df, summary))) == ['párrafo completo']
+    assert completions.calls == 2
+
+
+def test_cached_paragraph_counts_through_cache(monkeypatch, catalog):
+    cache = LLMCache()
+    completions = FakeCompletions(['Uno ', 'dos.'])
+    justifier = _justifier(monkeypatch, completions, cache)
+    candidates_df, summary = _args(catalog)
+
+    assert asyncio.run(_collect(justifier.stream_paragraph(candidates_df, summary))) == ['Uno ', 'dos.']
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert asyncio.run(_collect(justifier.stream_paragraph(candidates_df, summary))) == ['Uno dos.']
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert completions.calls == 1
+
+
+def test_sse_error_event_on_interrupted_stream(monkeypatch, catalog):
+    import api
+
+    justifier = _justifier(monkeypatch, FakeCompletions(['Uno ', 'dos'], fail_at=1))
+    candidates_df, summary = _args(catalog)
+    events = asyncio.run(_collect(api._paragraph_events(justifier, candidates_df, summary, 3)))
+    assert events[0].startswith('data: ')
+    assert events[-1].startswith('event: error\n') and PARAGRAPH_ERROR in events[-1]
+    assert not any(e.startswith('event: done') for e in events)
@@ -0,0 +1,80 @@
+import re
+
+from src.llm_cache import LLMCache
+from src.metrics import Counter, Gauge, Histogram, Registry
+
+from tests.conftest import FakeJustifier
+from tests.test_llm_stream import FakeCompletions, _justifier
+
+BODY = {'liked_titles': ['Inception', 'Interstellar'], 'top_n': 3, 'top_candidates': 10}
+
+
+def test_render_uses_prometheus_text_format():
+    registry = Registry()
+    calls = registry.register(Counter('calls_total', 'Llamadas', ('outcome',)))
+    latency = registry.register(Histogram('latency_seconds', 'Latencia', ('stage',), buckets=(0.1, 1.0)))
+    registry.register(Gauge('ratio', 'Ratio', lambda: 0.25))
+    registry.register(Gauge('broken', 'Sin valor', lambda: 1 / 0))
+    calls.inc(1, 'ok')
+    calls.inc(2, 'ok')
+    calls.inc(1, 'er"ror\n')
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, 'llm')
+
+    assert registry.render() == '\n'.join([
+        '# HELP calls_total Llamadas',
+        '# TYPE calls_total counter',
+        'calls_total{outcome="ok"} 3',
+        'calls_total{outcome="er\\"ror\\n"} 1',
+        '# HELP latency_seconds Latencia',
+        '# TYPE latency_seconds histogram',
+        'latency_seconds_bucket{stage="llm",le="0.1"} 2',
+        'latency_seconds_bucket{stage="llm",le="1"} 3',
+        'latency_seconds_bucket{stage="llm",le="+Inf"} 4',
+        'latency_seconds_sum{stage="llm"} 3.65',
+        'latency_seconds_count{stage="llm"} 4',
+        '# HELP ratio Ratio',
+        '# TYPE ratio gauge',
+        'ratio 0.25',
+        # Un gauge que no se puede leer no emite muestra, pero no rompe la exposición
+        '# HELP broken Sin valor',
+        '# TYPE broken gauge',
+    ]) + '\n'
+
+
+def _stage_count(client, stage):
+    response = client.get('/metrics')
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    match = re.search(rf'^recommender_stage_seconds_count{{stage="{stage}"}} (\d+)$', response.text, re.M)
+    return int(match.group(1)) if match else 0
+
+
+def test_metrics_endpoint_exposes_request_and_cache_series(client):
+    client.post('/recommendations/json', json={**BODY, 'mode': 'fast'})
+    text = client.get('/metrics').text
+    assert '# TYPE recommender_stage_seconds histogram' in text
+    assert 'recommender_request_seconds_count{route="/recommendations/json",status="200"}' in text
+    assert re.search(r'^recommender_catalog_items 25$', text, re.M)
+    assert re.search(r'^recommender_llm_cache_hit_ratio \S+$', text, re.M)
+
+
+def test_stage_histograms_record_each_request(client, monkeypatch):
+    justifier = _justifier(monkeypatch, FakeCompletions(['Uno ', 'dos.']), LLMCache())
+    # El cliente falso no tiene conexiones que cerrar al parar la app
+    monkeypatch.setattr(justifier, 'aclose', FakeJustifier().aclose)
+    client.app.state.justifier = justifier
+    stages = ('scoring', 'prompt', 'llm', 'batch_scoring')
+    before = {stage: _stage_count(client, stage) for stage in stages}
+
+    body = client.post('/recommendations/text/stream', json=BODY).text
+    assert '"token": "Uno "' in body and 'event: done' in body
+    after_stream = {stage: _stage_count(client, stage) for stage in stages}
+    # El stream upstream cuenta como etapa 'llm', igual que las llamadas sin streaming
+    assert {stage: after_stream[stage] - before[stage] for stage in stages} == \
+        {'scoring': 1, 'prompt': 1, 'llm': 1, 'batch_scoring': 0}
+
+    client.post('/recommendations/batch', json={'users': [{'liked_titles': ['Inception']}] * 3})
+    after_batch = {stage: _stage_count(client, stage) for stage in stages}
+    assert {stage: after_batch[stage] - after_stream[stage] for stage in stages} == \
+        {'scoring': 0, 'prompt': 0, 'llm': 0, 'batch_scoring': 1}
+
@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from src.catalog import ItemFilter
+from src.catalog_store import CatalogStore
+from src.recommender import Recommender
+from src.user_porfile import create_multi_domain_user_profile
+
+from tests.conftest import DATA_DIR
+from tests.test_catalog_updates import _updates
+
+
+def _queries(catalog, rng, n=40):
+    filters = [None, ItemFilter('movie'), ItemFilter('concert', available=True), ItemFilter(date_from=0),
+               ItemFilter('desconocido')]
+    queries = []
+    for _ in range(n):
+        liked = rng.sample(range(len(catalog)), 2)
+        queries.append((liked, create_multi_domain_user_profile(liked, catalog), rng.choice([3, 10]),
+                        rng.choice(filters)))
+    return queries
+
+
+@pytest.mark.parametrize('engine', Recommender.ENGINES)
+def test_rank_batch_matches_rank_across_incremental_versions(engine):
+    rng = random.Random(0)
+    store = CatalogStore(DATA_DIR)
+    snapshot = store.load()
+    recommender = Recommender(engine)
+    recommender.load(snapshot.catalog)
+    updated = store.apply_updates(_updates(snapshot.catalog, rng))
+    delta_recommender = recommender.with_catalog(updated.catalog, updated.base_size)
+
+    for rec, catalog in ((recommender, snapshot.catalog), (delta_recommender, updated.catalog)):
+        queries = _queries(catalog, rng)
+        assert rec.rank_batch(queries) == [rec.rank(*query) for query in queries]
+
+
+def test_rank_batch_reuses_base_index_after_updates():
+    rng = random.Random(1)
+    store = CatalogStore(DATA_DIR)
+    snapshot = store.load()
+    snapshot.recommender.rank_batch(_queries(snapshot.catalog, rng, n=4))
+    base_matrix = snapshot.recommender.index.term_matrix()
+
+    updated = store.apply_updates(_updates(snapshot.catalog, rng))
+    updated.recommender.rank_batch(_queries(updated.catalog, rng, n=4))
+    # No se construye una matriz del catálogo completo por versión: el base se reutiliza
+    assert updated.recommender.matrix is None
+    assert updated.recommender.index.term_matrix() is base_matrix
+    assert updated.recommender.index.delta.term_matrix().shape[1] == len(updated.catalog)
+
+
+def test_top_n_batch_matches_sparse_engine_and_reuses_base_index():
+    rng = random.Random(2)
+    store = CatalogStore(DATA_DIR)
+    snapshot = store.load()
+    base_matrix = snapshot.recommender.index.term_matrix()
+    updated = store.apply_updates(_updates(snapshot.catalog, rng))
+    sparse = Recommender('sparse')
+    sparse.load(updated.catalog)
+
+    users = [rng.sample(range(len(updated.catalog)), 2) for _ in range(30)] + [[]]
+    for top_n in (3, 10, 100):
+        got = list(updated.recommender.top_n_batch(users, top_n))
+        want = list(sparse.top_n_batch(users, top_n))
+        assert [(p.tolist(), s.tolist()) for p, s in got] == [(p.tolist(), s.tolist()) for p, s in want]
+    assert updated.recommender.matrix is None
+    assert updated.recommender.index.term_matrix() is base_matrix
+
+
+def _reference_ranking(catalog, liked, user_profile, top_n):
+    """Ranking original: `g_overlap * 2 + k_overlap`, sort estable por score (empates por posición)."""
+    user_genres, user_keywords = set(user_profile['genres']), set(user_profile['keywords'])
+    scores = []
+    for pos in range(len(catalog)):
+        if pos in liked:
+            continue
+        score = 2 * len(user_genres.intersection(catalog.genres_of(pos))) + \
+            len(user_keywords.intersection(catalog.keywords_of(pos)))
+        scores.append((pos, score))
+    scores.sort(key=lambda x: x[1], reverse=True)
+    return [(pos, score) for pos, score in scores if score > 0][:top_n]
+
+
+@pytest.mark.parametrize('engine', Recommender.ENGINES)
+@pytest.mark.parametrize('source', ['data', 'synthetic'])
+def test_rankings_match_the_reference_overlap_score(engine, source, synthetic_dir):
+    store = CatalogStore(DATA_DIR if source == 'data' else synthetic_dir)
+    catalog = store.load().catalog
+    recommender = Recommender(engine)
+    recommender.load(catalog)
+    rng = random.Random(4)
+
+    users = [rng.sample(range(len(catalog)), rng.choice([1, 2, 3])) for _ in range(12)] + [[]]
+    for top_n in (1, 5, 50):
+        expected = [_reference_ranking(catalog, set(liked), create_multi_domain_user_profile(liked, catalog), top_n)
+                    for liked in users]
+        got = [list(zip(*recommender.rank(liked, create_multi_domain_user_profile(liked, catalog), top_n)))
+               for liked in users]
+        assert got == expected
+        batch = [list(zip(df.index.tolist(), df['score'].tolist()))
+                 for df in recommender.recommend_batch(users, top_n)]
+        assert batch == expected
+    # Los empates se resuelven por posición en el catálogo
+    assert any(a[1] == b[1] for ranking in expected for a, b in zip(ranking, ranking[1:]))
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.replay import load_requests, replay
+from src.request_log import RequestLogger, log_files, read_records
+
+from tests.conftest import DATA_DIR
+
+
+def _records(n, start=0):
+    return [{'ts': float(i), 'path': '/recommendations/json', 'query': f'liked_titles=título-{i}'}
+            for i in range(start, start + n)]
+
+
+def _write(request_log, records):
+    for record in records:
+        request_log.log(record)
+    asyncio.run(request_log.flush())
+
+
+def test_rotates_by_size_without_splitting_lines(tmp_path):
+    request_log = RequestLogger(str(tmp_path), max_bytes=300, backups=100)
+    records = _records(20)
+    _write(request_log, records[:7])
+    _write(request_log, records[7:])
+
+    files = log_files(str(tmp_path))
+    assert len(files) > 2
+    assert all(os.path.getsize(path) <= 300 for path in files)
+    assert list(read_records([str(tmp_path)])) == records
+    assert (request_log.written, request_log.dropped) == (20, 0)
+
+
+def test_keeps_only_the_newest_backups(tmp_path):
+    request_log = RequestLogger(str(tmp_path), max_bytes=300, backups=2)
+    records = _records(40)
+    _write(request_log, records)
+
+    files = log_files(str(tmp_path))
+    # El fichero actual más `backups` anteriores
+    assert len(files) == 3
+    assert files[-1] == request_log._path
+    kept = list(read_records(files))
+    assert kept == records[-len(kept):]
+
+
+def test_cancelled_flush_and_final_write_do_not_overlap(tmp_path, monkeypatch):
+    request_log = RequestLogger(str(tmp_path), flush_interval=0.01)
+    in_write = threading.Event()
+    active, overlaps = [], []
+    original = request_log._current_size
+
+    def slow_current_size():
+        # Disco lento: el volcado en el hilo sigue en curso al cancelar `run`
+        if active:
+            overlaps.append(threading.get_ident())
+        active.append(threading.get_ident())
+        try:
+            in_write.set()
+            time.sleep(0.05)
+            return original()
+        finally:
+            active.pop()
+    monkeypatch.setattr(request_log, '_current_size', slow_current_size)
+
+    async def scenario():
+        task = asyncio.create_task(request_log.run())
+        for record in _records(5):
+            request_log.log(record)
+        while not in_write.is_set():
+            await asyncio.sleep(0.001)
+        for record in _records(5, start=5):
+            request_log.log(record)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert not overlaps
+    assert list(read_records([str(tmp_path)])) == _records(10)
+    assert request_log.written == 10
+
+
+def test_replay_reproduces_logged_traffic(tmp_path, monkeypatch):
+    import api
+
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    monkeypatch.setattr(api, 'DATA_DIR', DATA_DIR)
+    monkeypatch.setattr(api, 'CATALOG_SNAPSHOT', None)
+    monkeypatch.setattr(api, 'CANDIDATE_WARM_TOP_K', 0)
+    monkeypatch.setattr(api, 'REQUEST_LOG_DIR', str(tmp_path))
+    with TestClient(api.app) as client:
+        client.get('/recommendations/json?mode=fast&liked_titles=Inception')
+        client.post('/recommendations/text', json={'liked_titles': ['Interstellar'], 'mode': 'fast'})
+        client.get('/titles/autocomplete?q=inter')
+        client.get('/recommendations/unknown?mode=fast')
+        # Fuera de REQUEST_LOG_PATHS: no se registran
+        client.get('/health')
+        client.get('/metrics')
+
+    records = load_requests([str(tmp_path)])
+    assert [(r['method'], r['route'], r['status']) for r in records] == [
+        ('GET', '/recommendations/json', 200),
+        ('POST', '/recommendations/text', 200),
+        ('GET', '/titles/autocomplete', 200),
+        ('GET', '/recommendations/{content_type}', 404),
+    ]
+    assert records[1]['body']['liked_titles'] == ['Interstellar']
+    assert 'scoring' in records[0]['stages']
+
+    # `stubbed_app` configura la app por entorno: que no quede para las demás pruebas
+    for name in ('DATA_DIR', 'REQUEST_LOG_DIR'):
+        monkeypatch.setenv(name, '')
+    monkeypatch.setenv('OPENAI_API_KEY', 'stub')
+    monkeypatch.setattr(api, 'REQUEST_LOG_DIR', None)
+    report = asyncio.run(replay(DATA_DIR, records, speed=0, concurrency=2, llm_latency_ms=0))
+    assert report['requests'] == 4
+    assert (report['errors'], report['status_changed']) == (0, 0)
+    assert set(report['routes']) == {r['route'] for r in records}
+    assert report['routes']['/recommendations/json']['original']
@@ -0,0 +1,68 @@
+import asyncio
+import json
+import os
+import shutil
+
+import pytest
+
+from src.catalog_store import CatalogStore
+from src.serving import ScoringPool, StaleSnapshot, _worker_recommender
+from src.user_porfile import create_multi_domain_user_profile
+
+from tests.conftest import DATA_DIR
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    path = tmp_path / 'data'
+    shutil.copytree(DATA_DIR, path)
+    return path
+
+
+def _touch_movies(data_dir, genres):
+    """Cambia los géneros de Interstellar y adelanta el mtime para forzar la recarga."""
+    path = data_dir / 'movies.json'
+    movies = json.loads(path.read_text(encoding='utf-8'))
+    for movie in movies:
+        if movie['title'] == 'Interstellar':
+            movie['genres'] = genres
+    path.write_text(json.dumps(movies), encoding='utf-8')
+    mtime = os.stat(path).st_mtime + 10
+    os.utime(path, (mtime, mtime))
+
+
+def _query(snapshot, titles):
+    liked = snapshot.title_index.resolve(titles)
+    return liked, create_multi_domain_user_profile(liked, snapshot.catalog), 10
+
+
+def test_pool_scores_on_the_shared_snapshot_and_recovers_from_swaps(data_dir, tmp_path):
+    store = CatalogStore(str(data_dir), snapshot_path=str(tmp_path / 'catalog.snap'))
+    first = store.load()
+    assert ScoringPool.accepts(first)
+    pool = ScoringPool(1)
+    try:
+        def rank(snapshot, query):
+            return asyncio.run(pool.rank(snapshot, *query))
+
+        query = _query(first, ['Inception'])
+        assert rank(first, query) == first.recommender.rank(*query)
+
+        _touch_movies(data_dir, ['Sci-Fi', 'Action', 'Thriller'])
+        assert store.refresh()
+        second = store.current()
+        assert second.source_file != first.source_file
+        # El worker reabre el fichero nuevo en cuanto recibe la versión nueva
+        assert rank(second, query) == second.recommender.rank(*query)
+        assert rank(second, query) != first.recommender.rank(*query)
+
+        # Una petición que aún tiene la versión anterior: el fichero en disco ya no
+        # es el suyo, así que se puntúa en este proceso sobre su propio catálogo
+        assert rank(first, query) == first.recommender.rank(*query)
+        # Y el worker sigue sirviendo la versión vigente
+        assert rank(second, query) == second.recommender.rank(*query)
+    finally:
+        pool.shutdown()
+
+    with pytest.raises(StaleSnapshot):
+        _worker_recommender(first.source_file)